@@ -2,12 +2,25 @@ import face_recognition
 import cv2
 import numpy as np
 import time
-import requests
-import serial
 import threading
 import json
 import os
 import config  # <--- นำเข้าไฟล์ตั้งค่า
+from face_gallery import FaceGallery
+from encoding_cache import EncodingCache
+from capture_pipeline import CapturePipeline
+from frame_scheduler import AdaptiveFrameScheduler
+from face_tracker import KLTFaceTracker
+from face_detectors import create_face_detector
+from offline_queue import OfflineLogQueue
+from http_client import get_client
+from esp32_driver import Esp32Driver
+from metrics import get_metrics
+from session_recorder import RecordingCapture, SessionRecorder
+from camera_service import get_camera_service
+from scan_view import CvWindowDisplay, KEY_QUIT
+from frame_buffers import BufferPool, FramePreprocessor
+from ui_overlay import Layer, OverlayCache, Tint, render_sprite
 
 class FaceVerifier:
     def __init__(
@@ -22,40 +35,117 @@ class FaceVerifier:
         face_id: str = config.FACE_ID,
         serial_port: str | None = config.SERIAL_PORT,
         serial_baudrate: int = config.SERIAL_BAUDRATE,
-        scan_timeout: float = config.SCAN_TIMEOUT
+        scan_timeout: float = config.SCAN_TIMEOUT,
+        state_store=None,
+        camera_service=None
     ):
         self.known_image_path = known_image_path
         self.known_name = known_name
+        self.state_store = state_store
         self.tolerance = tolerance
         self.hold_seconds = hold_seconds
         self.camera_index = camera_index
+        # กล้องตัวเดียวที่แชร์กับหน้าลงทะเบียน (เปิดค้างไว้ ไม่เปิด/ปิดใหม่ทุกการสแกน)
+        self.camera = camera_service or get_camera_service(camera_index)
         self.scan_timeout = scan_timeout
 
         self.webapp_url = webapp_url
         self.sheet_name = sheet_name
         self.face_id = face_id
         
-        # ใช้ชื่อไฟล์ Offline Log จาก config
+        # ใช้ชื่อไฟล์ Offline Log จาก config (Journal แบบ JSON Lines)
         self.offline_file = config.OFFLINE_LOG_FILE
+        self.offline_queue = OfflineLogQueue(
+            self.offline_file,
+            legacy_path=config.OFFLINE_LEGACY_FILE,
+            fsync_policy=config.OFFLINE_FSYNC_POLICY,
+            compact_bytes=config.OFFLINE_COMPACT_BYTES,
+        )
+        self._retry_lock = threading.Lock()
+        self.batch_size = config.WEBAPP_BATCH_SIZE
+        self._batch_supported = True
 
         # ====== Serial ไปยัง ESP32 ======
         self.serial_port = serial_port
         self.serial_baudrate = serial_baudrate
-        self.ser = None
+        self.esp32 = None
 
         if self.serial_port is not None:
-            try:
-                self.ser = serial.Serial(self.serial_port, self.serial_baudrate, timeout=1)
-                time.sleep(2)
-                print(f"✅ เปิดพอร์ต Serial ไป ESP32 ที่ {self.serial_port} เรียบร้อย")
-            except Exception as e:
-                print("❌ เปิดพอร์ต Serial ไป ESP32 ไม่สำเร็จ:", e)
-                self.ser = None
-
-        self.known_face_encodings, self.known_face_names = self._load_known_faces()
+            # เปิดพอร์ต / รอบอร์ดบูต / ต่อใหม่เมื่อหลุด ทำใน I/O Thread ของไดรเวอร์ ไม่บล็อกตรงนี้
+            self.esp32 = Esp32Driver(
+                self.serial_port,
+                self.serial_baudrate,
+                port_candidates=config.SERIAL_PORT_CANDIDATES,
+                command_timeout=config.ESP32_COMMAND_TIMEOUT,
+                queue_timeout=config.ESP32_QUEUE_TIMEOUT,
+            ).start()
+
+        # ====== Gallery ผู้ป่วยหลายคน (Matrix เดียว) ======
+        self.gallery = FaceGallery(config.GALLERY_PATH)
+        self.encoding_cache = EncodingCache(
+            config.ENCODING_CACHE_DIR,
+            model=config.FACE_ENCODING_MODEL,
+            upsample=config.FACE_UPSAMPLE,
+        )
+        self.last_patient_distances = {}
+        self.last_known_distance = None   # ระยะล่าสุดของผู้ป่วยปัจจุบัน (บันทึกลง Dose Ledger ตอนยืนยัน)
+        self.match_mode = config.MATCH_MODE
+        self._load_known_faces()
         self.hold_start_time = None
         self.verified = False
         self.video_capture = None
+        self.pipeline = None
+        # ถ้ามี: ถูกเรียก (จาก Recognition Worker) ทันทีที่ยืนยันตัวตน แทนการสั่งจ่ายยา / ส่ง Log เอง
+        # Main ใช้ส่งต่อให้ DoseOrchestrator
+        self.on_verified = None
+        # นาฬิกาของการนับถือค้าง / Timeout (ตอนเล่นซ้ำ Session ใช้ ReplayClock แทน)
+        self.clock = time.time
+
+        # ====== Buffer ที่จองไว้ล่วงหน้า (ไม่จอง Array ใหม่ทุกเฟรม) ======
+        self.preprocessor = FramePreprocessor(scale=0.25)   # ใช้บน Recognition Worker
+        self.display_pool = BufferPool()                     # ใช้บนลูปแสดงผล
+        self.overlays = OverlayCache(config.UI_THEME)        # Layer ของนิ่งบนหน้าจอสแกน
+
+        # ====== Track-then-Verify ======
+        self.tracking_mode = config.TRACKING_MODE
+        self.tracker = KLTFaceTracker(
+            max_drift=config.TRACK_MAX_DRIFT,
+            min_confidence=config.TRACK_MIN_CONFIDENCE,
+            reverify_seconds=config.TRACK_REVERIFY_SECONDS,
+        )
+        self.hold_track_id = None
+        self.encode_count = 0
+        self.track_count = 0
+
+        # ====== Face Detector (เลือก Backend จาก config) ======
+        self.detector = create_face_detector(config.FACE_DETECTOR)
+
+        # ====== ROI Detection ======
+        self.roi_mode = config.ROI_MODE
+        self.roi_padding = config.ROI_PADDING
+        self.last_face_box = None
+        self.roi_hits = 0
+        self.roi_misses = 0
+
+        # ====== Adaptive Frame Skip ======
+        self.scheduler = AdaptiveFrameScheduler(
+            target_fps=config.TARGET_DISPLAY_FPS,
+            min_every_n=config.SCHED_MIN_EVERY_N,
+            max_every_n=config.SCHED_MAX_EVERY_N,
+            idle_seconds=config.SCHED_IDLE_SECONDS,
+            smoothing=config.SCHED_LATENCY_SMOOTHING,
+        )
+
+        # ====== Metrics (NullMetrics ถ้าปิดใน config) ======
+        self.metrics = get_metrics()
+        self.metrics.describe("scan_stage_seconds", "Latency of each scan stage")
+        self.metrics.describe("offline_queue_depth", "Logs waiting in the offline journal")
+        self.metrics.gauge_fn("offline_queue_depth", lambda: len(self.offline_queue))
+
+        # ====== State Store: เปลี่ยนผู้ป่วยแล้วอัปเดตตัวเองทันที (ไม่ต้อง reload config) ======
+        self._unsubscribe_state = None
+        if state_store is not None:
+            self._unsubscribe_state = state_store.subscribe(self._on_state_changed)
 
     # ========================================================
     # 🟢 [NEW] ฟังก์ชันสำหรับอัปเดตข้อมูลผู้ป่วยใหม่ (แก้ Memory Leak)
@@ -73,7 +163,7 @@ class FaceVerifier:
         self.known_image_path = new_image_path
         
         # 2. โหลด Encoding ใบหน้าใหม่ (เฉพาะส่วนนี้ที่ต้องคำนวณใหม่)
-        self.known_face_encodings, self.known_face_names = self._load_known_faces()
+        self._load_known_faces()
         
         # 3. รีเซ็ตสถานะการสแกน
         self.hold_start_time = None
@@ -81,28 +171,46 @@ class FaceVerifier:
         
         print(f"✅ อัปเดตเรียบร้อย! พร้อมสำหรับผู้ป่วย: {self.known_name} (Sheet: {self.sheet_name})")
 
+    def _on_state_changed(self, changes):
+        """Callback จาก StateStore: สนใจเฉพาะค่าที่เกี่ยวกับตัวผู้ป่วย"""
+        if not changes.keys() & {"sheet_name", "known_name", "known_image_path", "registered_at"}:
+            return
+        new_values = {k: new for k, (_, new) in changes.items()}
+        self.update_settings(
+            new_sheet_name=new_values.get("sheet_name", self.sheet_name),
+            new_known_name=new_values.get("known_name", self.known_name),
+            new_image_path=new_values.get("known_image_path", self.known_image_path),
+        )
+
     # ---------- Send Google Sheet (System Offline Support) ----------
     def send_log_to_sheet(self, note: str = "Face verified"):
-        """เรียกใช้งานใน Thread แยก เพื่อไม่ให้โปรแกรมหลักสะดุด"""
-        threading.Thread(target=self._send_log_worker, args=(note,), daemon=True).start()
+        """เรียกใช้งานบน Thread Pool กลาง เพื่อไม่ให้โปรแกรมหลักสะดุด"""
+        get_client().submit(self.send_log, note)
 
-    def _send_log_worker(self, note):
-        """ฟังก์ชันเบื้องหลังสำหรับจัดการการส่งข้อมูล"""
-        # 1. เตรียมข้อมูล Payload
-        payload = {
-            "sheet": self.sheet_name,
+    def _log_payload(self, note, name=None, sheet=None):
+        return {
+            "sheet": sheet or self.sheet_name,
             "data": {
                 "Date": "", # Google Script จะใส่เวลาให้
                 "Time": "",
-                "Name": self.known_name,
+                "Name": name or self.known_name,
                 "FaceID": self.face_id,
                 "Status": "Verified",
                 "Note": note
             }
         }
 
+    def queue_log(self, note, name=None, sheet=None):
+        """เก็บ Log ลง Offline Journal อย่างเดียว (ส่งตอนส่งย้อนหลังรอบถัดไป)"""
+        self._save_offline_log(self._log_payload(note, name, sheet))
+
+    def send_log(self, note):
+        """ส่ง Log แบบรอผล (บล็อก ใช้จาก Thread เบื้องหลัง) คืน True ถ้าส่งขึ้น Sheet ได้ / False ถ้าเก็บลง Offline Queue"""
+        # 1. เตรียมข้อมูล Payload
+        payload = self._log_payload(note)
+
         # 2. ลองส่งข้อมูลเก่าที่ค้างอยู่ก่อน (ถ้ามีเน็ตจะส่งออกไป)
-        self._retry_offline_logs()
+        self.retry_offline_logs()
 
         # 3. ส่งข้อมูลปัจจุบัน
         success = self._post_to_webapp(payload)
@@ -111,14 +219,15 @@ class FaceVerifier:
         if not success:
             print(f"⚠️ ไม่สามารถเชื่อมต่อเน็ตได้ บันทึกข้อมูลลง {self.offline_file}")
             self._save_offline_log(payload)
+        return success
 
     def _post_to_webapp(self, payload):
         """ยิง Request จริง"""
         if not self.webapp_url:
             return False
         try:
-            # timeout 3 วินาทีพอ ถ้าช้ากว่านี้ถือว่าเน็ตไม่ดี ตัดไป offline เลย
-            response = requests.post(self.webapp_url, json=payload, timeout=3)
+            # timeout 3 วินาทีพอ ถ้าช้ากว่านี้ถือว่าเน็ตไม่ดี ตัดไป offline เลย (ไม่ Retry: Offline Queue คือการลองใหม่)
+            response = get_client().post(self.webapp_url, json=payload, endpoint="sheets", timeout=3, retries=0)
             if response.status_code == 200:
                 print(f"☁️ ส่งข้อมูล {payload['data']['Name']} สำเร็จ")
                 return True
@@ -127,173 +236,339 @@ class FaceVerifier:
         return False
 
     def _save_offline_log(self, payload):
-        """บันทึกข้อมูลลง JSON File ต่อท้าย"""
-        logs = []
-        # อ่านของเก่าขึ้นมา
-        if os.path.exists(self.offline_file):
-            try:
-                with open(self.offline_file, "r", encoding="utf-8") as f:
-                    logs = json.load(f)
-            except:
-                logs = []
-        
-        logs.append(payload)
-        
-        # เขียนกลับลงไฟล์
-        with open(self.offline_file, "w", encoding="utf-8") as f:
-            json.dump(logs, f, ensure_ascii=False, indent=2)
+        """บันทึกข้อมูลต่อท้าย Journal (O(1) ไม่ต้องเขียนไฟล์ใหม่ทั้งก้อน)"""
+        self.offline_queue.append(payload)
 
-    def _retry_offline_logs(self):
-        """พยายามส่งข้อมูลที่ค้างอยู่ในไฟล์"""
-        if not os.path.exists(self.offline_file):
+    def retry_offline_logs(self):
+        """พยายามส่งข้อมูลที่ค้างอยู่ใน Journal ตามลำดับ"""
+        # กันสองเธรดส่งรายการเดียวกันซ้ำ
+        if not self._retry_lock.acquire(blocking=False):
             return
-
         try:
-            with open(self.offline_file, "r", encoding="utf-8") as f:
-                logs = json.load(f)
-        except:
-            return
+            self._replay_offline_queue()
+        finally:
+            self._retry_lock.release()
 
-        if not logs:
+    def _replay_offline_queue(self):
+        pending_count = len(self.offline_queue)
+        if pending_count == 0:
             return
 
-        print(f"🔄 กำลังทยอยส่งข้อมูล Offline จำนวน {len(logs)} รายการ...")
-        remaining_logs = []
+        print(f"🔄 กำลังทยอยส่งข้อมูล Offline จำนวน {pending_count} รายการ...")
         sent_count = 0
 
-        for log in logs:
-            if self._post_to_webapp(log):
+        while True:
+            pending = self.offline_queue.pending(limit=self.batch_size)
+            if not pending:
+                break
+
+            if self._batch_supported:
+                ok = self._post_batch_to_webapp([log for _, log in pending])
+                if ok:
+                    self.offline_queue.ack(pending[-1][0])
+                    sent_count += len(pending)
+                    continue
+                if ok is False:
+                    break # เน็ตยังไม่มา ไว้รอบหน้า
+                # ok is None: เซิร์ฟเวอร์ยังไม่รองรับ Batch -> ส่งทีละแถวแทน
+                print("ℹ️ Web App ไม่รองรับ Batch เปลี่ยนเป็นส่งทีละรายการ")
+                self._batch_supported = False
+
+            stopped = False
+            for end_offset, log in pending:
+                if not self._post_to_webapp(log):
+                    stopped = True # ยังส่งไม่ได้ หยุดไว้ก่อน ลำดับจะได้ไม่สลับ
+                    break
+                # ack ทีละรายการ ถ้าโปรแกรมดับกลางทางจะไม่ส่งซ้ำ
+                self.offline_queue.ack(end_offset)
                 sent_count += 1
-            else:
-                remaining_logs.append(log) # ยังส่งไม่ได้ เก็บไว้ก่อน
+            if stopped:
+                break
         
         if sent_count > 0:
             print(f"✅ ส่งข้อมูลย้อนหลังสำเร็จ {sent_count} รายการ")
+            self.offline_queue.compact()
 
-        # บันทึกส่วนที่เหลือกลับลงไฟล์ (ถ้าส่งหมดแล้วก็ลบไฟล์ หรือบันทึก list ว่าง)
-        if remaining_logs:
-            with open(self.offline_file, "w", encoding="utf-8") as f:
-                json.dump(remaining_logs, f, ensure_ascii=False, indent=2)
-        else:
-            # ส่งหมดแล้ว ลบไฟล์ทิ้ง
-            os.remove(self.offline_file)
+    def _post_batch_to_webapp(self, payloads):
+        """
+        ส่งหลายแถวใน Request เดียว: {"rows": [payload, ...]}
+        คืน True = สำเร็จ, False = ส่งไม่ได้ (ลองใหม่ทีหลัง), None = เซิร์ฟเวอร์ไม่รองรับ Batch
+        """
+        if not self.webapp_url:
+            return False
+        try:
+            response = get_client().post(
+                self.webapp_url, json={"rows": payloads}, endpoint="sheets_batch", timeout=config.WEBAPP_BATCH_TIMEOUT
+            )
+            if response.status_code != 200:
+                return False
+            result = response.json()
+        except Exception:
+            return False
+
+        if result.get("batch"):
+            if result.get("status") == "ok":
+                print(f"☁️ ส่งข้อมูลแบบ Batch {len(payloads)} รายการสำเร็จ")
+                return True
+            return False
+        # patient.gs รุ่นเก่าจะตอบ error ว่าไม่มี field "data" (ยังไม่ได้เขียนอะไรลงชีต)
+        if "No 'data' field" in str(result.get("message", "")):
+            return None
+        return False
 
     # ---------- Send ESP32 ----------
     def send_command_to_esp32(self, cmd: str = "f"):
-        if self.ser is None:
+        """
+        ส่งคำสั่งเข้าคิวของไดรเวอร์ (ไม่บล็อก)
+        คืน Future[CommandResult] ที่จะได้ผลเมื่อ ESP32 รายงานว่าเสร็จ / ผิดพลาด / หมดเวลา
+        """
+        if self.esp32 is None:
+            return None
+        future = self.esp32.send(cmd)
+        future.add_done_callback(lambda f: self._on_esp32_result(f, cmd))
+        return future
+
+    def _on_esp32_result(self, future, cmd):
+        if future.cancelled():
+            # DoseOrchestrator รอ Ack เกินเวลาแล้วยกเลิก Future ทิ้ง: ไม่มีผลลัพธ์ให้อ่าน แต่ยังต้องนับเป็นคำสั่งที่พลาด
+            self.metrics.inc("esp32_commands_total", cmd=cmd[:1], status="cancelled")
+            if cmd[:1] == "f":
+                self.metrics.inc("dispense_errors_total")
+            print(f"❌ ESP32 คำสั่ง '{cmd}' ถูกยกเลิก (รอ Ack เกินเวลา)")
             return
-        try:
-            # 🟢 [Update] เคลียร์ Buffer ก่อนส่ง เพื่อลดอาการแลค
-            self.ser.reset_input_buffer()
-            
-            self.ser.write(cmd.encode("utf-8"))
-            self.ser.flush()
-            print(f"➡️ ส่งคำสั่ง '{cmd}' ไปยัง ESP32")
-        except Exception as e:
-            print(f"❌ ส่ง Serial ไม่ได้: {e}")
+        result = future.result()
+        self.metrics.inc("esp32_commands_total", cmd=result.cmd[:1], status=result.status)
+        if result.cmd[:1] == "f" and not result.ok:
+            self.metrics.inc("dispense_errors_total")
+        if result.ok:
+            print(f"🟢 ESP32 ทำคำสั่ง '{result.cmd}' เสร็จ ({result.latency:.1f}s)")
+        else:
+            print(f"❌ ESP32 คำสั่ง '{result.cmd}' ไม่สำเร็จ: {result.status} {result.detail}")
 
     # ---------- Face Recognition Core ----------
     def _load_known_faces(self):
+        """เข้ารหัสรูปต้นแบบของผู้ป่วยปัจจุบัน (ผ่านแคช) แล้วบันทึกลง Gallery"""
+        # ลงทะเบียนแบบหลายภาพ: Encoding ถูกคำนวณและเขียนลง Gallery ไว้แล้วตอนลงทะเบียน
+        record = self.state_store.patient(self.known_name) if self.state_store is not None else None
+        if record and record.get("references"):
+            self.gallery.load()
+            if len(self.gallery.get_encodings(self.known_name)) > 0:
+                return
+
         try:
-            image = face_recognition.load_image_file(self.known_image_path)
-            encoding = face_recognition.face_encodings(image)[0]
-            return [encoding], [self.known_name]
+            encodings = self.encoding_cache.get_or_compute(self.known_image_path)
         except Exception as e:
             print(f"❌ Error loading face: {e}")
-            return [], []
+            return
+        # เขียน Gallery ใหม่เฉพาะเมื่อ Encoding เปลี่ยนจริง
+        if not np.array_equal(self.gallery.get_encodings(self.known_name), encodings):
+            self.gallery.set_patient(self.known_name, encodings)
+            self.gallery.save()
 
     def open_camera(self):
-        self.video_capture = cv2.VideoCapture(self.camera_index)
-        # ตั้งค่าความละเอียดจาก config
-        self.video_capture.set(cv2.CAP_PROP_FRAME_WIDTH, config.FRAME_WIDTH)
-        self.video_capture.set(cv2.CAP_PROP_FRAME_HEIGHT, config.FRAME_HEIGHT)
-        if not self.video_capture.isOpened():
-            raise RuntimeError("Cannot open camera")
+        # ยืมกล้องจาก CameraService (ถ้ายังเปิดค้างอยู่ ได้ภาพที่ปรับแสงแล้วทันที)
+        self.video_capture = self.camera.acquire("scan")
+        if config.SESSION_RECORD_DIR:
+            # 🎞️ บันทึกทุกเฟรมของการสแกนครั้งนี้ไว้เล่นซ้ำ / วัดประสิทธิภาพภายหลัง
+            session_dir = os.path.join(config.SESSION_RECORD_DIR, time.strftime("%Y%m%d-%H%M%S"))
+            self.video_capture = RecordingCapture(self.video_capture, SessionRecorder(session_dir, expected=self.known_name))
 
     def close_camera(self):
         if self.video_capture is not None:
-            self.video_capture.release()
-        cv2.destroyAllWindows()
+            self.video_capture.release()  # คืนสิทธิ์ใช้กล้อง (CameraService ปิดอุปกรณ์เองเมื่อว่างนาน)
+            self.video_capture = None
 
     def _process_frame(self, frame):
-        small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-        rgb_small_frame = np.ascontiguousarray(small_frame[:, :, ::-1])
+        timer = self.metrics.timer
+        with timer("scan_stage_seconds", stage="resize"):
+            small_frame = self.preprocessor.resize(frame)
+            rgb_small_frame = self.preprocessor.to_rgb(small_frame)
+
+        if self.tracking_mode:
+            return self._process_frame_tracked(small_frame, rgb_small_frame)
+
+        with timer("scan_stage_seconds", stage="detect"):
+            face_locations = self._detect_faces(rgb_small_frame)
+        with timer("scan_stage_seconds", stage="encode"):
+            face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+        self.encode_count += 1
+        with timer("scan_stage_seconds", stage="match"):
+            face_names = self._match_faces(face_encodings)
+        self._remember_face_box(face_locations, face_names)
+
+        # ผ่านเฉพาะเมื่อเจอผู้ป่วยที่กำลังรอรับยา (ไม่ใช่คนอื่นใน Gallery)
+        recognized_this_frame = self.known_name in face_names
 
-        face_locations = face_recognition.face_locations(rgb_small_frame)
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+        return face_locations, face_names, recognized_this_frame
 
-        face_names = []
-        recognized_this_frame = False
+    def _detect_faces(self, rgb_small_frame):
+        """
+        ตรวจจับใบหน้าบนเฟรมย่อ
+        โหมด ROI: ถ้ารู้ตำแหน่งหน้าล่าสุด ให้ค้นหาเฉพาะรอบๆ กล่องเดิมก่อน ไม่เจอค่อยค้นทั้งเฟรม
+        พิกัดที่คืนเป็นพิกัดของเฟรมย่อทั้งภาพเสมอ
+        """
+        if self.roi_mode and self.last_face_box is not None:
+            h, w = rgb_small_frame.shape[:2]
+            top, right, bottom, left = self.last_face_box
+            pad_y = int((bottom - top) * self.roi_padding)
+            pad_x = int((right - left) * self.roi_padding)
+            y1, y2 = max(top - pad_y, 0), min(bottom + pad_y, h)
+            x1, x2 = max(left - pad_x, 0), min(right + pad_x, w)
+
+            crop = np.ascontiguousarray(rgb_small_frame[y1:y2, x1:x2])
+            roi_locations = self.detector.detect(crop)
+            if roi_locations:
+                self.roi_hits += 1
+                return [(t + y1, r + x1, b + y1, l + x1) for (t, r, b, l) in roi_locations]
+            self.roi_misses += 1
+
+        return self.detector.detect(rgb_small_frame)
+
+    def _remember_face_box(self, face_locations, face_names):
+        """จำกล่องของผู้ป่วยที่จำได้ ไว้ใช้เป็น ROI ของเฟรมถัดไป"""
+        self.last_face_box = None
+        for loc, name in zip(face_locations, face_names):
+            if name != "Unknown":
+                self.last_face_box = loc
+                break
+
+    def _match_faces(self, face_encodings):
+        # 🚀 จับคู่ทุกหน้ากับทั้ง Gallery ในการคำนวณ Matrix ครั้งเดียว
+        face_names, _, patient_distances = self.gallery.match(face_encodings, self.tolerance, mode=self.match_mode)
+
+        # ระยะที่ดีที่สุดของผู้ป่วยแต่ละคนในเฟรมนี้ (ไว้ดู/Debug)
+        if len(face_encodings) > 0:
+            best_per_patient = patient_distances.min(axis=0)
+            self.last_patient_distances = dict(zip(self.gallery.names, best_per_patient.tolist()))
+            self.last_known_distance = self.last_patient_distances.get(self.known_name, self.last_known_distance)
+        else:
+            self.last_patient_distances = {}
+        return face_names
 
-        for face_encoding in face_encodings:
-            matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding, tolerance=self.tolerance)
-            name = "Unknown"
-            face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-            
-            if len(face_distances) > 0:
-                best_match_index = np.argmin(face_distances)
-                if matches[best_match_index] and face_distances[best_match_index] < self.tolerance:
-                    name = self.known_face_names[best_match_index]
-                    recognized_this_frame = True
-            face_names.append(name)
+    def _process_frame_tracked(self, small_frame, rgb_small_frame):
+        """
+        โหมด Track-then-Verify
+        ตรวจจับ + เข้ารหัสครั้งแรก แล้วใช้ KLT ตามกล่องไป
+        เข้ารหัสใหม่เฉพาะตอนกล่องเลื่อนมาก / ความมั่นใจตก / ครบเวลา re-verify
+        """
+        timer = self.metrics.timer
+        gray = self.preprocessor.to_gray(small_frame)
+        tracker = self.tracker
 
-        return face_locations, face_names, recognized_this_frame
+        if tracker.active:
+            with timer("scan_stage_seconds", stage="track"):
+                tracked = tracker.update(gray)
+        else:
+            tracked = False
+
+        if tracked:
+            reason = tracker.needs_reencode()
+            track = tracker.track
+            if reason is None:
+                self.track_count += 1
+                return [track.location()], [track.name], track.name == self.known_name
+
+            if reason in ("drift", "interval"):
+                # เข้ารหัสเฉพาะกล่องที่ตามอยู่ ไม่ต้องรัน HOG ทั้งเฟรม
+                loc = track.location()
+                with timer("scan_stage_seconds", stage="encode"):
+                    encodings = face_recognition.face_encodings(rgb_small_frame, [loc])
+                self.encode_count += 1
+                with timer("scan_stage_seconds", stage="match"):
+                    names = self._match_faces(encodings)
+                name = names[0] if names else "Unknown"
+                if name == track.name:
+                    tracker.refresh(gray, loc, name)
+                    return [loc], [name], name == self.known_name
+
+        # ไม่มี Track หรือ Track เชื่อไม่ได้แล้ว -> ตรวจจับใหม่ (ROI ก่อน แล้วค่อยเต็มเฟรม)
+        with timer("scan_stage_seconds", stage="detect"):
+            face_locations = self._detect_faces(rgb_small_frame)
+        with timer("scan_stage_seconds", stage="encode"):
+            face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+        self.encode_count += 1
+        with timer("scan_stage_seconds", stage="match"):
+            face_names = self._match_faces(face_encodings)
+        self._remember_face_box(face_locations, face_names)
+
+        if face_locations:
+            # ตามผู้ป่วยที่รอรับยาก่อน ถ้าไม่มีค่อยตามหน้าแรก
+            idx = face_names.index(self.known_name) if self.known_name in face_names else 0
+            tracker.refresh(gray, face_locations[idx], face_names[idx])
+        else:
+            tracker.clear()
+
+        return face_locations, face_names, self.known_name in face_names
 
     # ========================================================
     # 🎨 UI: TUBERBOX THEME
     # ========================================================
-    def _draw_tuberbox_ui(self, frame, face_locations, face_names):
-        height, width, _ = frame.shape
-        COLOR_SAGE_GREEN = (161, 214, 162)
-        COLOR_WHITE = (255, 255, 255)
-        COLOR_ALERT = (150, 150, 255)
-
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (0, 0), (width, 80), (30, 30, 30), -1) 
-        cv2.addWeighted(overlay, 0.8, frame, 0.2, 0, frame)
+    @staticmethod
+    def _build_scan_header(width, height, theme):
+        def draw(img, color):
+            cv2.putText(img, "Face Verification", (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.0, color(theme["text"]), 2)
+        # แถบหัว (แถว 0-80 เหมือน rectangle เดิม) + ชื่อหน้าจอ
+        return Layer(Tint(0, 81, theme["header"], theme["header_alpha"]), render_sprite(width, height, draw))
+
+    @staticmethod
+    def _build_verified_panel(width, height, theme):
+        center_x, center_y = width // 2, height // 2
+        box_w, box_h = 500, 150
+        bx1, by1 = center_x - box_w//2, center_y - box_h//2
+        bx2, by2 = center_x + box_w//2, center_y + box_h//2
+        msg = "VERIFIED"
+        ts = cv2.getTextSize(msg, cv2.FONT_HERSHEY_SIMPLEX, 1.5, 3)[0]
+
+        def draw(img, color):
+            cv2.rectangle(img, (bx1, by1), (bx2, by2), color(theme["accent"]), -1)
+            cv2.rectangle(img, (bx1, by1), (bx2, by2), color(theme["text"]), 2)
+            cv2.putText(img, msg, (center_x - ts[0]//2, center_y + 10), cv2.FONT_HERSHEY_SIMPLEX, 1.5, color(theme["text"]), 3)
+        return Layer(render_sprite(width, height, draw))
 
-        cv2.putText(frame, "Face Verification", (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.0, COLOR_WHITE, 2)
+    def _draw_tuberbox_ui(self, frame, face_locations, face_names):
+        # ของนิ่งสร้างครั้งเดียวต่อความละเอียด/ธีม เหลือวาดสดเฉพาะกล่องหน้า + แถบความคืบหน้า
+        theme = self.overlays.theme
+        self.overlays.draw(frame, "scan_header", self._build_scan_header)
         
         if self.verified:
-            center_x, center_y = width // 2, height // 2
-            box_w, box_h = 500, 150
-            bx1, by1 = center_x - box_w//2, center_y - box_h//2
-            bx2, by2 = center_x + box_w//2, center_y + box_h//2
-            
-            cv2.rectangle(frame, (bx1, by1), (bx2, by2), COLOR_SAGE_GREEN, -1)
-            cv2.rectangle(frame, (bx1, by1), (bx2, by2), COLOR_WHITE, 2)
-            
-            msg = "VERIFIED"
-            ts = cv2.getTextSize(msg, cv2.FONT_HERSHEY_SIMPLEX, 1.5, 3)[0]
-            cv2.putText(frame, msg, (center_x - ts[0]//2, center_y + 10), cv2.FONT_HERSHEY_SIMPLEX, 1.5, COLOR_WHITE, 3)
+            self.overlays.draw(frame, "verified_panel", self._build_verified_panel)
             
         else:
             for (top, right, bottom, left), name in zip(face_locations, face_names):
                 top *= 4; right *= 4; bottom *= 4; left *= 4
-                color = COLOR_WHITE if name != "Unknown" else COLOR_ALERT
+                color = theme["text"] if name != "Unknown" else theme["alert"]
                 
                 cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
 
                 if self.hold_start_time is not None and name != "Unknown":
-                    elapsed = time.time() - self.hold_start_time
+                    elapsed = self.clock() - self.hold_start_time
                     progress = min(elapsed / self.hold_seconds, 1.0)
                     
                     bar_y = bottom + 20
-                    cv2.rectangle(frame, (left, bar_y), (right, bar_y + 8), (100,100,100), -1)
+                    cv2.rectangle(frame, (left, bar_y), (right, bar_y + 8), theme["track"], -1)
                     fill_w = int((right - left) * progress)
                     if fill_w > 0:
-                        cv2.rectangle(frame, (left, bar_y), (left + fill_w, bar_y + 8), COLOR_SAGE_GREEN, -1)
+                        cv2.rectangle(frame, (left, bar_y), (left + fill_w, bar_y + 8), theme["accent"], -1)
+
+    def _update_hold_state(self, recognized_this_frame: bool, track_id=None):
+        # โหมด Tracking: ถ้าเปลี่ยนเป็น Track ใหม่ ต้องเริ่มนับถือค้างใหม่
+        if track_id != self.hold_track_id:
+            self.hold_track_id = track_id
+            self.hold_start_time = None
 
-    def _update_hold_state(self, recognized_this_frame: bool):
         if recognized_this_frame:
             if self.hold_start_time is None:
-                self.hold_start_time = time.time()
+                self.hold_start_time = self.clock()
             else:
-                elapsed = time.time() - self.hold_start_time
+                elapsed = self.clock() - self.hold_start_time
                 if elapsed >= self.hold_seconds and not self.verified:
                     self.verified = True
                     print("✅ สแกนผ่านแล้ว")
-                    
+
+                    if self.on_verified is not None:
+                        self.on_verified()
+                        return
+
                     # 🚀 สั่งจ่ายยาทันที
                     self.send_command_to_esp32("f")
                     
@@ -302,57 +577,112 @@ class FaceVerifier:
         else:
             self.hold_start_time = None
 
-    def run(self):
+    def _recognize(self, frame):
+        """งานของ Recognition Worker: ประมวลผลเฟรมแล้วอัปเดตสถานะการถือค้าง"""
+        t0 = time.perf_counter()
+        locs, names, rec = self._process_frame(frame)
+        latency = time.perf_counter() - t0
+        self._update_hold_state(rec, track_id=self.tracker.track_id if self.tracking_mode else None)
+
+        # ⏱️ ปรับความถี่การประมวลผลตาม Latency จริง และสถานะการถือค้าง
+        self.scheduler.record(latency, face_seen=len(locs) > 0, candidate_held=self.hold_start_time is not None)
+        return locs, names, rec
+
+    def run(self, display=None):
+        """
+        สแกนจนยืนยันตัวตน / หมดเวลา / ถูกยกเลิก คืน True ถ้ายืนยันสำเร็จ
+        display: ที่แสดงภาพ (open / show / wait_key / close) ค่าเริ่มต้นคือหน้าต่าง OpenCV
+                 Main ใช้ TkScanView แล้วเรียก run() จาก Worker Thread (ลูปของ Tk ไม่ค้าง)
+        """
         self.hold_start_time = None
         self.verified = False
+        self.last_known_distance = None
+        display = display or CvWindowDisplay()
         self.open_camera()
-        
-        window_name = 'Tuberbox Scan'
-        cv2.namedWindow(window_name, cv2.WND_PROP_FULLSCREEN)
-        cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-
-        frame_count = 0
-        process_every_n_frames = 2
-        
-        last_locs, last_names, last_rec = [], [], False
+        display.open()
+
+        # 🧵 แยกเธรดกล้อง / เธรดจดจำใบหน้า ออกจากลูปแสดงผล
+        self.scheduler.reset()
+        self.tracker.clear()
+        self.hold_track_id = None
+        self.encode_count = 0
+        self.track_count = 0
+        self.last_face_box = None
+        pipeline = CapturePipeline(
+            self.video_capture,
+            self._recognize,
+            empty_result=([], [], False),
+            every_n_fn=lambda: self.scheduler.every_n,
+        )
+        self.pipeline = pipeline
+        last_render_seq = 0
 
         # ✅ เริ่มจับเวลา Timeout
-        start_scan_time = time.time()
+        start_scan_time = self.clock()
+        metrics = self.metrics
+        metrics.inc("scans_started_total")
+        timed_out = False
 
         try:
-            while True:
+            pipeline.start()
+            while pipeline.running:
                 # ✅ ตรวจสอบว่าหมดเวลาหรือยัง
-                elapsed_scan_time = time.time() - start_scan_time
+                elapsed_scan_time = self.clock() - start_scan_time
                 if elapsed_scan_time > self.scan_timeout:
                     print(f"⏰ หมดเวลาสแกน ({self.scan_timeout} วินาที) - ปิดกล้อง")
+                    timed_out = True
                     break
 
-                ret, frame = self.video_capture.read()
-                if not ret: break
-
-                frame_count += 1
-                display_frame = frame.copy()
-
-                if frame_count % process_every_n_frames == 0:
-                    last_locs, last_names, last_rec = self._process_frame(frame)
-                    self._update_hold_state(last_rec)
+                seq, frame = pipeline.latest_frame()
+                if frame is None or seq == last_render_seq:
+                    # ยังไม่มีเฟรมใหม่ รอสั้นๆ แล้ววนใหม่
+                    if display.wait_key(5) == KEY_QUIT:
+                        break
+                    continue
+                last_render_seq = seq
+
+                # เฟรมล่าสุดยังถูก Recognition Worker ใช้อยู่ -> คัดลอกลง Buffer เดิมแล้ววาดบนนั้น
+                display_frame = self.display_pool.get("display", frame.shape)
+                np.copyto(display_frame, frame)
+                last_locs, last_names, _ = pipeline.latest_result()
                 
-                self._draw_tuberbox_ui(display_frame, last_locs, last_names)
+                with metrics.timer("scan_stage_seconds", stage="draw"):
+                    self._draw_tuberbox_ui(display_frame, last_locs, last_names)
 
-                # ✅ แสดงเวลานับถอยหลังบนหน้าจอ (Optional)
-                time_left = max(0, int(self.scan_timeout - elapsed_scan_time))
-                cv2.putText(display_frame, f"Time left: {time_left}s", (20, 700), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+                    # ✅ แสดงเวลานับถอยหลังบนหน้าจอ (Optional)
+                    time_left = max(0, int(self.scan_timeout - elapsed_scan_time))
+                    cv2.putText(display_frame, f"Time left: {time_left}s", (20, 700), 
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, self.overlays.theme["countdown"], 2)
 
-                cv2.imshow(window_name, display_frame)
+                with metrics.timer("scan_stage_seconds", stage="imshow"):
+                    display.show(display_frame)
 
                 if self.verified:
-                    cv2.waitKey(2000)
+                    display.wait_key(2000)
                     break
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                if display.wait_key(1) == KEY_QUIT:
                     break
         finally:
+            pipeline.stop()
+            if self.verified:
+                metrics.inc("scans_verified_total")
+                metrics.observe("scan_time_to_verify_seconds", self.clock() - start_scan_time)
+            elif timed_out:
+                metrics.inc("scans_timed_out_total")
+            stats = pipeline.stats()
+            stats["encoded_frames"] = self.encode_count
+            stats["tracked_frames"] = self.track_count
+            print(f"📊 capture {stats['capture_fps']:.1f} fps | recognition {stats['recognition_fps']:.1f} fps | dropped {stats['frames_dropped']}"
+                  f" | encoded {self.encode_count} / tracked {self.track_count}")
+            if config.SCHEDULER_TRACE_FILE:
+                self.scheduler.dump_trace(
+                    config.SCHEDULER_TRACE_FILE,
+                    started=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_scan_time)),
+                    verified=self.verified,
+                    **stats,
+                )
             self.close_camera()
+            display.close()
         
         return self.verified
 
@@ -32,117 +32,266 @@ function getFirstEmptyRow(sheet, baseColIndex1Based) {
   return lastRow + 1;
 }
 
-function doPost(e) {
-  try {
-    if (!e.postData || !e.postData.contents) {
-      throw new Error("No POST data");
+// อ่านหัวตาราง แล้วคืน Map ชื่อหัวตาราง -> Index (0-based)
+function getHeaderIndexMap(sheet) {
+  var headerRow = 1;
+  var lastCol = sheet.getLastColumn();
+  if (lastCol === 0) {
+    throw new Error("No header row found");
+  }
+
+  var headerValues = sheet.getRange(headerRow, 1, 1, lastCol).getValues()[0];
+  var headerIndexMap = {};
+  for (var i = 0; i < headerValues.length; i++) {
+    var h = headerValues[i];
+    if (h) {
+      headerIndexMap[String(h).trim()] = i;
     }
+  }
+  return headerIndexMap;
+}
 
-    // อ่าน JSON ที่ส่งมาจาก Python
-    var payload = JSON.parse(e.postData.contents);
-    var sheetName = payload.sheet || "Sheet1";
-    var rowDataObj = payload.data;
+// หาคอลัมน์หลักที่ใช้เช็คแถวว่าง (Date หรือ Timestamp)
+function getBaseColIndex1Based(headerIndexMap) {
+  if (headerIndexMap.hasOwnProperty(DATE_HEADER)) {
+    return headerIndexMap[DATE_HEADER] + 1;
+  } else if (headerIndexMap.hasOwnProperty(TIMESTAMP_HEADER)) {
+    return headerIndexMap[TIMESTAMP_HEADER] + 1;
+  }
+  return 1;
+}
 
-    if (!rowDataObj) {
-      throw new Error("No 'data' field in JSON payload");
+// ใส่ข้อมูลที่ส่งมา + วัน/เวลาอัตโนมัติ ลงใน rowValues (ทับเฉพาะช่องที่ส่งมา)
+function fillRowValues(rowValues, headerIndexMap, rowDataObj, now) {
+  for (var key in rowDataObj) {
+    if (!rowDataObj.hasOwnProperty(key)) continue;
+    var headerName = String(key).trim();
+
+    if (headerIndexMap.hasOwnProperty(headerName)) {
+      rowValues[headerIndexMap[headerName]] = rowDataObj[key];
     }
+  }
 
-    var ss = SpreadsheetApp.getActiveSpreadsheet();
-    if (!ss) {
-      throw new Error("No active spreadsheet.");
+  if (headerIndexMap.hasOwnProperty(TIMESTAMP_HEADER)) {
+    rowValues[headerIndexMap[TIMESTAMP_HEADER]] = now;
+  }
+
+  if (headerIndexMap.hasOwnProperty(DATE_HEADER)) {
+    var onlyDate = new Date(now.getFullYear(), now.getMonth(), now.getDate());
+    rowValues[headerIndexMap[DATE_HEADER]] = onlyDate;
+  }
+
+  if (headerIndexMap.hasOwnProperty(TIME_HEADER)) {
+    var timeStr = Utilities.formatDate(now, Session.getScriptTimeZone(), "HH:mm:ss");
+    rowValues[headerIndexMap[TIME_HEADER]] = "'" + timeStr; // ใส่ ' เพื่อให้เป็น Text
+  }
+}
+
+// เขียนหลายแถวลงชีตเดียว: อ่านคอลัมน์หลักครั้งเดียวเพื่อหาแถวว่าง แล้วเขียนเฉพาะแถวเป้าหมาย
+// ใช้แถวว่างตามลำดับจากบนลงล่าง (ข้อมูลผู้ป่วยทางขวาของแถวเดิมจะไม่หาย)
+// แถวอื่นในช่วงเดียวกันไม่ถูกเขียนทับ (สูตร / Data validation ยังอยู่) หนึ่ง Range ต่อแถวที่ติดกันหนึ่งช่วง
+// rowTimes (ไม่บังคับ): เวลาของแต่ละแถว (Date) ใช้แทนเวลาปัจจุบัน เช่นแถวที่ซิงก์ย้อนหลัง
+function appendRows(sheet, rowDataList, rowTimes) {
+  var headerIndexMap = getHeaderIndexMap(sheet);
+  var lastCol = sheet.getLastColumn();
+  var baseCol = getBaseColIndex1Based(headerIndexMap);
+
+  var startRow = getFirstEmptyRow(sheet, baseCol);
+  var lastRow = sheet.getLastRow();
+
+  // 1. เลือกแถวเป้าหมาย: แถวที่คอลัมน์หลักว่าง (อ่านแค่คอลัมน์เดียว) ที่เหลือต่อท้ายชีต
+  var writtenRows = [];
+  if (lastRow >= startRow) {
+    var baseValues = sheet.getRange(startRow, baseCol, lastRow - startRow + 1, 1).getValues();
+    for (var r = 0; r < baseValues.length && writtenRows.length < rowDataList.length; r++) {
+      if (!baseValues[r][0]) writtenRows.push(startRow + r);
     }
+  }
+  var appendAt = Math.max(lastRow + 1, startRow);
+  while (writtenRows.length < rowDataList.length) {
+    writtenRows.push(appendAt++);
+  }
 
-    var sheet = ss.getSheetByName(sheetName);
-    if (!sheet) {
-      throw new Error("Sheet not found: " + sheetName);
+  // 2. อ่าน/เขียนทีละช่วงของแถวที่ติดกัน (ส่วนใหญ่มีช่วงเดียว)
+  var now = new Date();
+  var i = 0;
+  while (i < writtenRows.length) {
+    var j = i;
+    while (j + 1 < writtenRows.length && writtenRows[j + 1] === writtenRows[j] + 1) j++;
+    var range = sheet.getRange(writtenRows[i], 1, j - i + 1, lastCol);
+    var values = range.getValues();
+    for (var k = i; k <= j; k++) {
+      fillRowValues(values[k - i], headerIndexMap, rowDataList[k], (rowTimes && rowTimes[k]) || now);
     }
+    range.setValues(values);
+    i = j + 1;
+  }
+  return writtenRows;
+}
 
-    // 1. อ่านหัวตาราง (Headers)
-    var headerRow = 1;
-    var lastCol = sheet.getLastColumn();
-    if (lastCol === 0) {
-      throw new Error("No header row found");
+function getSheetOrThrow(ss, sheetName) {
+  var sheet = ss.getSheetByName(sheetName);
+  if (!sheet) {
+    throw new Error("Sheet not found: " + sheetName);
+  }
+  return sheet;
+}
+
+function jsonOutput(obj) {
+  return ContentService
+    .createTextOutput(JSON.stringify(obj))
+    .setMimeType(ContentService.MimeType.JSON);
+}
+
+// รูปแบบ Batch: { "rows": [ { "sheet": "...", "data": {...} }, ... ] }
+// รวมแถวตามชีต แล้วเขียนด้วย setValues ครั้งเดียวต่อชีต
+function handleBatch(ss, rows) {
+  var bySheet = {};
+  var order = [];
+  for (var i = 0; i < rows.length; i++) {
+    var sheetName = rows[i].sheet || "Sheet1";
+    if (!rows[i].data) {
+      throw new Error("Row " + i + " has no 'data' field");
+    }
+    if (!bySheet.hasOwnProperty(sheetName)) {
+      bySheet[sheetName] = [];
+      order.push(sheetName);
     }
+    bySheet[sheetName].push(rows[i].data);
+  }
 
-    var headerValues = sheet.getRange(headerRow, 1, 1, lastCol).getValues()[0];
-    
-    // สร้าง Map ชื่อหัวตาราง -> Index (0-based)
-    var headerIndexMap = {};
-    for (var i = 0; i < headerValues.length; i++) {
-      var h = headerValues[i];
-      if (h) {
-        headerIndexMap[String(h).trim()] = i;
-      }
+  var results = [];
+  for (var j = 0; j < order.length; j++) {
+    var sheet = getSheetOrThrow(ss, order[j]);
+    var written = appendRows(sheet, bySheet[order[j]]);
+    results.push({ sheet: order[j], rows: written });
+  }
+
+  return { status: "ok", batch: true, count: rows.length, results: results };
+}
+
+// ---------- Delta Sync (Dose Ledger ของเครื่อง) ----------
+// รูปแบบ: { "sync": { "device": "...", "base": 0, "entries": [ { "seq": 1, "key": "device:1", "sheet": "...", "at": "YYYY-MM-DD HH:MM:SS", "data": {...} }, ... ] } }
+// เก็บ High-water mark (seq ล่าสุดที่เขียนแล้ว) ของแต่ละเครื่องใน Script Properties
+// เขียนเฉพาะ seq = hwm + 1, hwm + 2, ... ตามลำดับ ส่งซ้ำ (Retry หลัง Timeout) จึงไม่เกิดแถวซ้ำ
+// ตอบ hwm ล่าสุดกลับไปเสมอ (entries ว่าง = ถาม hwm อย่างเดียว)
+// แถวที่เขียนไม่ได้ (ยังไม่มีชีต) ตอบ "blocked" พร้อม hwm ของแถวก่อนหน้า แทนการ Error ทั้ง Request
+function parseDeviceTime(text) {
+  var m = /^(\d{4})-(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2})$/.exec(text || "");
+  if (!m) return null;
+  return new Date(+m[1], +m[2] - 1, +m[3], +m[4], +m[5], +m[6]);
+}
+
+function handleSync(ss, sync) {
+  if (!sync.device) {
+    throw new Error("No 'device' field in sync payload");
+  }
+  var hwmKey = "hwm:" + sync.device;
+  var props = PropertiesService.getScriptProperties();
+
+  // กันสอง Request ของเครื่องเดียวกัน (เช่น Retry ซ้อนกับ Request เดิมที่ยังไม่เสร็จ) เขียนพร้อมกัน
+  var lock = LockService.getScriptLock();
+  lock.waitLock(20000);
+  try {
+    var hwm = parseInt(props.getProperty(hwmKey) || "0", 10);
+    // base: แถวที่เครื่องส่งทางเดิมไปแล้ว (ก่อนมีการซิงก์) ไม่ต้องรอ seq เหล่านั้น
+    var base = parseInt(sync.base || "0", 10);
+    if (base > hwm) {
+      hwm = base;
+      props.setProperty(hwmKey, String(hwm));
     }
+    var entries = (sync.entries || []).slice().sort(function (a, b) { return a.seq - b.seq; });
 
-    // 2. หาแถวที่จะเขียนข้อมูล (แถวว่างตัวแรก โดยเช็คจากคอลัมน์ Date หรือ Timestamp)
-    var baseColIndex1Based = 1; 
-    if (headerIndexMap.hasOwnProperty(DATE_HEADER)) {
-      baseColIndex1Based = headerIndexMap[DATE_HEADER] + 1;
-    } else if (headerIndexMap.hasOwnProperty(TIMESTAMP_HEADER)) {
-      baseColIndex1Based = headerIndexMap[TIMESTAMP_HEADER] + 1;
-    }
-
-    var nextRow = getFirstEmptyRow(sheet, baseColIndex1Based);
-
-    // =======================================================
-    // 🔴 จุดที่แก้ไข: อ่านข้อมูลเดิมของแถวนั้นขึ้นมาก่อน (Preserve Data)
-    // =======================================================
-    // ดึงข้อมูลทั้งแถวของ nextRow มาไว้ในตัวแปร currentRowValues
-    // ถ้าแถวนั้นมีข้อมูลผู้ป่วยรออยู่ทางขวา มันจะติดมาด้วย ไม่หายไปไหน
-    var range = sheet.getRange(nextRow, 1, 1, lastCol);
-    var currentRowValues = range.getValues()[0];
-
-    // 3. อัปเดตข้อมูลใหม่ลงไปใน currentRowValues (ทับเฉพาะช่องที่ส่งมา)
-    for (var key in rowDataObj) {
-      if (!rowDataObj.hasOwnProperty(key)) continue;
-      var headerName = String(key).trim();
-      
-      if (headerIndexMap.hasOwnProperty(headerName)) {
-        var colIndex = headerIndexMap[headerName];
-        currentRowValues[colIndex] = rowDataObj[key]; // ใส่ค่าใหม่ลงไป
+    // 1. เลือกเฉพาะ seq ที่ต่อจาก hwm ติดกัน แล้วแบ่งเป็นช่วงๆ ตามชีต (เรียงตาม seq)
+    var runs = [];
+    var next = hwm;
+    var blocked = null;
+    for (var i = 0; i < entries.length; i++) {
+      var entry = entries[i];
+      if (entry.seq <= next) continue;       // เขียนไปแล้ว (ส่งซ้ำ)
+      if (entry.seq !== next + 1) break;     // ลำดับขาดช่วง: รอให้เครื่องส่งตั้งแต่ next + 1
+      var sheetName = entry.sheet || "Sheet1";
+      if (!entry.data || !ss.getSheetByName(sheetName)) {
+        // แถวนี้เขียนไม่ได้: เขียนเฉพาะแถวก่อนหน้า แล้วบอกเครื่องว่าติดที่ seq ไหน
+        blocked = { seq: entry.seq, message: entry.data ? "Sheet not found: " + sheetName : "No 'data' field" };
+        break;
       }
+      var run = runs.length ? runs[runs.length - 1] : null;
+      if (!run || run.sheet !== sheetName) {
+        run = { sheet: sheetName, rows: [], times: [], last: 0 };
+        runs.push(run);
+      }
+      run.rows.push(entry.data);
+      run.times.push(parseDeviceTime(entry.at));
+      run.last = entry.seq;
+      next = entry.seq;
     }
 
-    // ---- จัดการใส่วัน/เวลาอัตโนมัติ ----
-    var now = new Date();
+    // 2. เขียนทีละช่วง แล้วบันทึก hwm ทันทีหลังแต่ละช่วงสำเร็จ
+    //    ถ้าช่วงหลังล้ม ช่วงก่อนหน้าถูกนับแล้ว เครื่องส่งซ้ำจะไม่เขียนซ้ำ
+    var results = [];
+    var saved = hwm;
+    for (var j = 0; j < runs.length; j++) {
+      var written = appendRows(getSheetOrThrow(ss, runs[j].sheet), runs[j].rows, runs[j].times);
+      props.setProperty(hwmKey, String(runs[j].last));
+      saved = runs[j].last;
+      results.push({ sheet: runs[j].sheet, rows: written });
+    }
 
-    if (headerIndexMap.hasOwnProperty(TIMESTAMP_HEADER)) {
-      currentRowValues[headerIndexMap[TIMESTAMP_HEADER]] = now;
+    var result = { status: "ok", sync: true, device: sync.device, hwm: saved, written: saved - hwm, results: results };
+    if (blocked) {
+      result.blocked = blocked;
     }
+    return result;
+  } finally {
+    lock.releaseLock();
+  }
+}
 
-    if (headerIndexMap.hasOwnProperty(DATE_HEADER)) {
-      var onlyDate = new Date(now.getFullYear(), now.getMonth(), now.getDate());
-      currentRowValues[headerIndexMap[DATE_HEADER]] = onlyDate;
+function doPost(e) {
+  try {
+    if (!e.postData || !e.postData.contents) {
+      throw new Error("No POST data");
+    }
+
+    // อ่าน JSON ที่ส่งมาจาก Python
+    var payload = JSON.parse(e.postData.contents);
+
+    var ss = SpreadsheetApp.getActiveSpreadsheet();
+    if (!ss) {
+      throw new Error("No active spreadsheet.");
     }
 
-    if (headerIndexMap.hasOwnProperty(TIME_HEADER)) {
-      var timeStr = Utilities.formatDate(now, Session.getScriptTimeZone(), "HH:mm:ss");
-      currentRowValues[headerIndexMap[TIME_HEADER]] = "'" + timeStr; // ใส่ ' เพื่อให้เป็น Text
+    if (payload.sync) {
+      return jsonOutput(handleSync(ss, payload.sync));
     }
 
-    // 4. บันทึกข้อมูลกลับลงไป (Write Back)
-    // เขียน currentRowValues กลับลงไปที่เดิม (ข้อมูลทางขวาที่ไม่ได้แก้ก็จะถูกเขียนกลับลงไปเหมือนเดิม)
-    range.setValues([currentRowValues]);
+    if (payload.rows) {
+      return jsonOutput(handleBatch(ss, payload.rows));
+    }
 
-    var result = {
+    var sheetName = payload.sheet || "Sheet1";
+    var rowDataObj = payload.data;
+
+    if (!rowDataObj) {
+      throw new Error("No 'data' field in JSON payload");
+    }
+
+    var sheet = getSheetOrThrow(ss, sheetName);
+    var written = appendRows(sheet, [rowDataObj]);
+
+    return jsonOutput({
       status: "ok",
       sheet: sheetName,
-      row: nextRow
-    };
-    return ContentService
-      .createTextOutput(JSON.stringify(result))
-      .setMimeType(ContentService.MimeType.JSON);
+      row: written[0]
+    });
 
   } catch (err) {
-    var errorResult = {
+    return jsonOutput({
       status: "error",
       message: err.message,
       stack: err.stack
-    };
-    return ContentService
-      .createTextOutput(JSON.stringify(errorResult))
-      .setMimeType(ContentService.MimeType.JSON);
+    });
   }
 
-}
\ No newline at end of file
+}
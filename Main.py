@@ -1,17 +1,31 @@
+import time
+STARTUP_T0 = time.perf_counter()  # จุดเริ่มจับเวลาเปิดโปรแกรม
+
 import tkinter as tk
 from PIL import Image, ImageTk
 from datetime import datetime
-import requests, json, threading
-import importlib  # ใช้สำหรับ Reload Config
+import json
+import threading
+from concurrent.futures import Future
 
-# Import คลาสต่างๆ
-from Facescan import FaceVerifier
-from register_face import register_new_face 
+# Import คลาสต่างๆ (Facescan / register_face โหลดทีหลังใน Warmup เพราะดึง dlib, mediapipe)
 from Manual import ManualUI
+from http_client import get_client
+from startup import StartupProfiler, Warmup
+from state_store import get_state_store
+from metrics import start_exporter
+from dose_scheduler import DoseScheduler, TICK, DUE, FOLLOWUP, MISSED, TAKEN, PREWARM
+from camera_service import get_camera_service
+from scan_view import TkScanView
+from dose_pipeline import DoseOrchestrator
+from dose_ledger import get_dose_ledger
+from ledger_sync import LedgerSync
+from tk_bridge import TkBridge
 import config
 
 class FullScreenImageApp:
     def __init__(self, root):
+        self.profiler = StartupProfiler(STARTUP_T0)
         self.root = root
         self.root.title("Tuberbox System")
         self.root.attributes("-fullscreen", True)
@@ -34,6 +48,12 @@ class FullScreenImageApp:
         
         self.bg_item = self.canvas.create_image(0, 0, image=self.assets['bg'], anchor="nw")
 
+        # หน้าจอสแกนฝังใน Canvas เดียวกัน (สร้างครั้งเดียว ซ่อนไว้จนกดสแกน)
+        self.scan_view = TkScanView(root, self.canvas, self.screen_width, self.screen_height)
+        self._scan_thread = None
+        # ส่งผลจาก Worker / asyncio กลับมาทำบนเธรด Tk
+        self.bridge = TkBridge(root)
+
         # ============================
         # 3. แยกส่วนจัดการ UI
         # ============================
@@ -42,41 +62,171 @@ class FullScreenImageApp:
         # หน้าคู่มือ (Manual)
         self.manual_page = ManualUI(self.canvas, self.screen_width, self.screen_height, on_back_callback=self.show_main_ui)
 
-        # ตัวแปรระบบ
-        self.eat_days = getattr(config, 'EAT_DAYS', 0)
+        # ตัวแปรระบบ (ค่าที่เปลี่ยนระหว่างใช้งานอยู่ใน State Store)
+        self.state = get_state_store()
+        self.eat_days = self.state.eat_days
         
+        self.ledger = get_dose_ledger()
+        self.sync = None
+        self._legacy_lock = threading.Lock()
+        if config.SYNC_ENABLED and config.WEBAPP_URL:
+            self.sync = LedgerSync(
+                self.ledger,
+                config.WEBAPP_URL,
+                face_id=config.FACE_ID,
+                batch_size=config.SYNC_BATCH_SIZE,
+                timeout=config.SYNC_TIMEOUT,
+            )
+
         self.eatday_text_id = None
+        self.adherence_text_id = None
         self.time_text_id = None
         self.is_scanning = False 
 
         # ดึงค่าจาก config
         self.CHANNEL_ACCESS_TOKEN = config.LINE_ACCESS_TOKEN
         self.USER_ID = config.LINE_USER_ID
-        self.alarm_hour = config.ALARM_HOUR
-        self.alarm_minute = config.ALARM_MINUTE
+
+        # ⏰ ตารางเวลาทานยา (Event-driven): นาฬิกา / เตือน / เตือนซ้ำ / แจ้งพลาด ใช้ตัวจับเวลา Tk ตัวเดียว
+        self.scheduler = DoseScheduler(
+            config.DOSE_TIMES,
+            on_event=self._on_dose_event,
+            followup_minutes=config.DOSE_FOLLOWUP_MINUTES,
+            missed_after_minutes=config.DOSE_MISSED_AFTER_MINUTES,
+            catchup_minutes=config.DOSE_CATCHUP_MINUTES,
+            early_minutes=config.DOSE_EARLY_MINUTES,
+            taken=self.state.doses_taken,
+            prewarm_minutes=config.CAMERA_PREWARM_MINUTES,
+        )
+        self._scheduler_timer = None
+        self.alarm_text_id = None
+
+        # 💊 หลังสแกนผ่าน: จ่ายยา / รอ ESP32 ยืนยัน / บันทึก / ส่ง Sheet / แจ้ง LINE (asyncio)
+        self.doses = DoseOrchestrator(
+            dispense_fn=self._dispense_dose,
+            persist_fn=self._persist_dose,
+            upload_fn=self._upload_dose,
+            notify_fn=self.send_line_alert,
+            ack_timeout=config.DOSE_ACK_TIMEOUT,
+            upload_timeout=config.DOSE_UPLOAD_TIMEOUT,
+            notify_timeout=config.DOSE_NOTIFY_TIMEOUT,
+            notify_success=config.DOSE_NOTIFY_SUCCESS,
+            events_file=config.DOSE_EVENTS_FILE,
+            ledger=self.ledger,
+        )
         
-        # ✅ สร้าง FaceVerifier ครั้งแรกครั้งเดียว
+        # ✅ FaceVerifier / หน้าลงทะเบียน ถูกสร้างใน Warmup Thread (หน้าจอขึ้นก่อนทันที)
+        self.verifier = None
+        self.register_new_face = None
+        self.gesture_detector = None
+        self.status_text_id = None
+
+        # สร้าง UI หน้าหลัก
+        self.build_main_ui()
+        self.root.after_idle(self._on_first_paint)
+
+        # 📈 Metrics endpoint (localhost) + Dump JSON เป็นระยะ
+        start_exporter()
+
+        # 🔥 โหลดของหนักเบื้องหลัง
+        self.warmup = Warmup([
+            ("face_engine", self._create_verifier),
+            ("registration", self._load_registration),
+            ("camera", self._prewarm_camera),
+        ], profiler=self.profiler).start()
+        self._poll_warmup()
+
+        # เริ่มตารางเวลา
+        self.scheduler.start()
+        self._arm_scheduler()
+        self.root.bind('q', self._on_key_q)
+
+    # ========================================================
+    # 🔥 Staged Startup
+    # ========================================================
+    def _create_verifier(self):
+        from Facescan import FaceVerifier  # ดึง face_recognition (dlib) + cv2
         self.verifier = FaceVerifier(
-            known_image_path=config.KNOWN_IMAGE_PATH,
-            known_name=config.KNOWN_NAME,
+            known_image_path=self.state.known_image_path,
+            known_name=self.state.known_name,
             tolerance=config.TOLERANCE,
             hold_seconds=config.HOLD_SECONDS,
             camera_index=config.CAMERA_INDEX,
             webapp_url=config.WEBAPP_URL,
-            sheet_name=config.SHEET_NAME,
+            sheet_name=self.state.sheet_name,
             face_id=config.FACE_ID,
             serial_port=config.SERIAL_PORT,
             serial_baudrate=config.SERIAL_BAUDRATE,
-            scan_timeout=config.SCAN_TIMEOUT
+            scan_timeout=config.SCAN_TIMEOUT,
+            state_store=self.state
         )
+        self.verifier.on_verified = self._on_face_verified
+        return self.verifier
+
+    def _load_registration(self):
+        from register_face import register_new_face, create_gesture_detector  # ดึง mediapipe
+        # สร้าง MediaPipe Hands ครั้งเดียวแล้ว warm-up ไว้ หน้าลงทะเบียนจึงเปิดได้ทันที
+        self.gesture_detector = create_gesture_detector().warm_up()
+        self.register_new_face = register_new_face
+        return register_new_face
+
+    def _prewarm_camera(self):
+        """เปิดกล้องรอไว้ (ปรับแสงเสร็จก่อนผู้ใช้กดปุ่ม) ถ้าไม่มีใครใช้ CameraService จะปิดเองเมื่อครบ Idle Timeout"""
+        try:
+            return get_camera_service().prewarm()
+        except RuntimeError as e:
+            print(f"⚠️ เปิดกล้องล่วงหน้าไม่สำเร็จ: {e}")
+
+    def _on_key_q(self, event):
+        # ระหว่างสแกน q = ยกเลิกการสแกน (เหมือนหน้าต่าง OpenCV เดิม) ไม่ใช่ปิดโปรแกรม
+        if self._scan_thread is not None:
+            self.scan_view.cancel()
+        else:
+            self.shutdown()
+
+    def shutdown(self):
+        """ปิดโปรแกรม: ปล่อยทรัพยากรที่แอปถือไว้ก่อนทำลายหน้าต่าง"""
+        if self._scan_thread is not None:
+            self.scan_view.cancel()
+            self._scan_thread.join(timeout=3.0)
+        self.doses.shutdown()
+        self.bridge.cancel()
+        if self.gesture_detector is not None:
+            self.gesture_detector.close()
+        get_camera_service().close()
+        self.root.destroy()
+
+    def _on_first_paint(self):
+        self.profiler.mark("first_paint")
+
+    def _poll_warmup(self):
+        """เช็คสถานะ Warmup จากเธรดหลักของ Tk (ห้ามแตะ Tk จากเธรดอื่น)"""
+        state = self.warmup.state
+        if state == "loading":
+            step = self.warmup.current_step or "..."
+            self._set_status(f"⏳ กำลังเตรียมระบบ ({step})")
+            self.root.after(200, self._poll_warmup)
+            return
 
-        # สร้าง UI หน้าหลัก
-        self.build_main_ui()
-
-        # เริ่ม Loop
-        self.update_time()
-        self.check_alarm_time()
-        self.root.bind('q', lambda event: self.root.destroy())
+        if state == "ready":
+            self.profiler.mark("scan_ready")
+            self._set_status("✅ พร้อมสแกน")
+            self.root.after(3000, lambda: self._set_status(""))
+            # ซิงก์แถวที่ค้างจากรอบก่อนเบื้องหลัง (ไม่ให้เน็ตช้า / waitLock ถ่วงเวลาพร้อมสแกน)
+            get_client().submit(self._sync_ledger)
+        else:
+            self._set_status(f"❌ เตรียมระบบไม่สำเร็จ: {self.warmup.error}")
+        self.profiler.report(config.STARTUP_PROFILE_FILE)
+
+    def _set_status(self, text):
+        if self.status_text_id:
+            self.canvas.itemconfigure(self.status_text_id, text=text)
+
+    def _require_ready(self):
+        if self.warmup.ready:
+            return True
+        print("⏳ ระบบยังโหลดไม่เสร็จ กรุณารอสักครู่")
+        return False
 
     def load_main_assets(self):
         try:
@@ -92,17 +242,25 @@ class FullScreenImageApp:
         self.eatday_text_id = self.canvas.create_text(132, 325, text=str(self.eat_days), font=("Prompt", 32, "bold"), fill="white")
         self.main_ui_items.append(self.eatday_text_id)
 
+        # สถิติการทานยาจาก Dose Ledger ในเครื่อง (ไม่ต้องรอเน็ต)
+        self.adherence_text_id = self.canvas.create_text(132, 372, text="", font=("Prompt", 14), fill="white")
+        self.main_ui_items.append(self.adherence_text_id)
+        self.update_adherence()
+
         current_date = datetime.now().strftime("%d/%m/%Y")
         date_id = self.canvas.create_text(280, 180, text=current_date, font=("Prompt", 28, "bold"), fill="white")
         self.main_ui_items.append(date_id)
 
-        alarm_str = f"{self.alarm_hour:02d}:{self.alarm_minute:02d}"
-        alarm_id = self.canvas.create_text(1100, 180, text=alarm_str, font=("Prompt", 28, "bold"), fill="white")
-        self.main_ui_items.append(alarm_id)
+        self.alarm_text_id = self.canvas.create_text(1100, 180, text=self._next_dose_label(), font=("Prompt", 28, "bold"), fill="white")
+        self.main_ui_items.append(self.alarm_text_id)
 
         self.time_text_id = self.canvas.create_text(650, 425, text="", font=("Prompt", 50, "bold"), fill="white")
         self.main_ui_items.append(self.time_text_id)
 
+        # สถานะการโหลดระบบ (Warmup)
+        self.status_text_id = self.canvas.create_text(650, 500, text="", font=("Prompt", 16), fill="white")
+        self.main_ui_items.append(self.status_text_id)
+
         btn_eat = self.canvas.create_rectangle(450, 540, 820, 670, outline="black", width=self.Outline, tags="btn_eat")
         self.canvas.tag_bind(btn_eat, "<Button-1>", self.on_button_click)
         self.main_ui_items.append(btn_eat)
@@ -131,50 +289,26 @@ class FullScreenImageApp:
             self.canvas.itemconfigure(item, state='normal')
 
     def on_register_click(self, event):
-        if self.is_scanning: return
+        if self.is_scanning or not self._require_ready(): return
         self.is_scanning = True
         print("⚙️ เข้าสู่โหมดลงทะเบียนใบหน้า...")
 
         def process_registration():
             try:
-                # 1. ลงทะเบียนใบหน้า
-                register_new_face()
-                
-                print("🔄 กำลังอัปเดตการตั้งค่าใหม่...")
-                
-                # 2. Reload config
-                importlib.reload(config)
+                # 1. ลงทะเบียนใบหน้า (บันทึกผู้ป่วยใหม่ลง State Store + รีเซ็ตจำนวนวันเป็น 0)
+                #    FaceVerifier subscribe ไว้ จึงโหลดใบหน้าใหม่เองโดยไม่ต้อง reload config
+                self.register_new_face(gesture_detector=self.gesture_detector)
                 
-                # 🟢 [แก้ไข] รีเซ็ตจำนวนวันเป็น 0 สำหรับผู้ป่วยคนใหม่
-                self.eat_days = 0
-                self.save_eat_days_to_config(0)
+                # 2. อัปเดตหน้าจอจากค่าล่าสุด
+                self.eat_days = self.state.eat_days
                 if self.eatday_text_id:
-                    self.canvas.itemconfigure(self.eatday_text_id, text="0")
+                    self.canvas.itemconfigure(self.eatday_text_id, text=str(self.eat_days))
+                self.update_adherence()
                 
-                print(f"✅ โหลดค่า Config ใหม่: Sheet -> {config.SHEET_NAME}, Name -> {config.KNOWN_NAME}")
-
-                # 3. อัปเดตค่าใน Object เดิม
-                if hasattr(self, 'verifier'):
-                    self.verifier.update_settings(
-                        new_sheet_name=config.SHEET_NAME,
-                        new_known_name=config.KNOWN_NAME,
-                        new_image_path=config.KNOWN_IMAGE_PATH
-                    )
-                    self.verifier.scan_timeout = config.SCAN_TIMEOUT
-                else:
-                    self.verifier = FaceVerifier(
-                        known_image_path=config.KNOWN_IMAGE_PATH,
-                        known_name=config.KNOWN_NAME,
-                        tolerance=config.TOLERANCE,
-                        hold_seconds=config.HOLD_SECONDS,
-                        camera_index=config.CAMERA_INDEX,
-                        webapp_url=config.WEBAPP_URL,
-                        sheet_name=config.SHEET_NAME,
-                        face_id=config.FACE_ID,
-                        serial_port=config.SERIAL_PORT,
-                        serial_baudrate=config.SERIAL_BAUDRATE,
-                        scan_timeout=config.SCAN_TIMEOUT
-                    )
+                print(f"✅ ผู้ป่วยปัจจุบัน: Sheet -> {self.state.sheet_name}, Name -> {self.state.known_name}")
+
+                if self.verifier is None:
+                    self._create_verifier()
                 
                 print("✅ ระบบพร้อมใช้งานสำหรับผู้ป่วยคนใหม่แล้ว!")
 
@@ -190,51 +324,168 @@ class FullScreenImageApp:
 
         self.root.after(10, process_registration)
 
-    def increment_eatday(self):
-        self.eat_days += 1
-        # อัปเดต UI
+    # ========================================================
+    # 💊 Dose Pipeline (เรียกจากเธรดอื่น ห้ามแตะ Tk ตรงๆ)
+    # ========================================================
+    def _on_face_verified(self):
+        """Recognition Worker: สแกนผ่าน -> เริ่ม Dose Pipeline ทันที (ไม่ต้องรอหน้าสแกนปิด)"""
+        slot = self.scheduler.match_slot()
+        future = self.doses.submit(
+            patient=self.state.known_name,
+            sheet=self.state.sheet_name,
+            slot=slot.id if slot else None,
+            note="Face verified from camera",
+            distance=self.verifier.last_known_distance,
+        )
+        self.bridge.post(self.bridge.watch, future, self._on_dose_finished)
+
+    def _dispense_dose(self, record):
+        return self.verifier.send_command_to_esp32("f")
+
+    def _persist_dose(self, record):
+        # 🟢 บันทึกลง State Store (เขียนไฟล์แบบ atomic)
+        days = self.state.increment_eat_days()
+        if record.slot:
+            self.state.mark_dose_taken(record.slot)
+        print(f"💾 บันทึกจำนวนวัน ({days}) เรียบร้อย")
+        return days
+
+    def _upload_dose(self, record):
+        if self.sync is not None:
+            self.verifier.retry_offline_logs()  # ของค้างใน Offline Journal จากก่อนมีการซิงก์
+            result = self.sync.push()
+            if result is not None:
+                return True if result else "pending"  # ส่งไม่ได้: แถวรออยู่ใน Ledger ซิงก์รอบหน้า
+            self._use_legacy_upload()
+
+        # แบบเดิม: ส่งแถวเดียว ส่งไม่ได้เก็บลง Offline Queue
+        # จองแถวใน Ledger ก่อน: ถ้าถูกส่งต่อไปทาง Offline Journal แล้ว (_use_legacy_upload) ไม่ต้องส่งซ้ำ
+        if not self.ledger.claim_for_legacy(record.dose_id):
+            return "queued"
+        posted = self.verifier.send_log(record.note)
+        self.ledger.set_upload(record.dose_id, "done" if posted else "queued")
+        self.ledger.advance_delivered()
+        return True if posted else "queued"
+
+    def _use_legacy_upload(self):
+        """
+        Web App ยังไม่รองรับการซิงก์: ปิดการซิงก์ แล้วส่งแถวใน Ledger ที่ยังไม่ถึง Sheet ต่อไปทาง Offline Journal
+        เลื่อน High-water mark เฉพาะแถวที่ส่งต่อแล้ว (ถ้าเซิร์ฟเวอร์อัปเดตทีหลังจะได้ไม่ส่งซ้ำ และไม่มีแถวหาย)
+        """
+        with self._legacy_lock:
+            if self.sync is None:
+                return
+            print("ℹ️ Web App ยังไม่รองรับการซิงก์ เปลี่ยนเป็นส่งทีละรายการ")
+            self.sync = None
+            handed = 0
+            while True:
+                rows = self.ledger.unsynced(limit=config.SYNC_BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    if self.ledger.claim_for_legacy(row["dose_id"]):
+                        self.verifier.queue_log(row["note"] or "Face verified", name=row["patient"], sheet=row["sheet"])
+                        handed += 1
+                if self.ledger.advance_delivered() < rows[-1]["seq"]:
+                    break  # กันวนไม่รู้จบ (ไม่ควรเกิด: ทุกแถวถูกส่งต่อหรือส่งไปแล้ว)
+        if handed:
+            print(f"📦 ส่งต่อ {handed} รายการใน Ledger ไปทาง Offline Journal")
+        self.verifier.retry_offline_logs()
+
+    def _sync_ledger(self):
+        """Thread Pool หลังระบบพร้อม: ส่งแถวที่ค้างจากรอบก่อน (เช่นเน็ตหลุดตอนปิดเครื่อง)"""
+        if self.sync is not None and self.sync.push() is None:
+            self._use_legacy_upload()
+
+    def _on_dose_finished(self, future):
+        """เธรด Tk: อัปเดตหน้าจอ + ปิดรอบยา (ยกเลิกเตือนซ้ำ / แจ้งพลาดของรอบนั้น)"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        record = future.result()
+        self.eat_days = self.state.eat_days
         if self.eatday_text_id:
             self.canvas.itemconfigure(self.eatday_text_id, text=str(self.eat_days))
-        
-        # 🟢 [เพิ่ม] บันทึกลง config.py ทันที
-        self.save_eat_days_to_config(self.eat_days)
-
-    def save_eat_days_to_config(self, days):
-        """ฟังก์ชันสำหรับบันทึกค่า EAT_DAYS ลงไฟล์ config.py"""
+        self.update_adherence()
+        if record.slot is None:
+            print("ℹ️ สแกนนอกช่วงเวลายา ไม่นับเป็นรอบใด")
+        else:
+            self.scheduler.record_dose(datetime.strptime(record.slot, "%Y-%m-%d %H:%M"))
+        self._arm_scheduler()
+
+    # ========================================================
+    # ⏰ Dose Scheduler (ตัวจับเวลา Tk ตัวเดียว)
+    # ========================================================
+    def _arm_scheduler(self):
+        """ตั้ง root.after ครั้งเดียวไปยังเหตุการณ์ถัดไปในคิว"""
+        if self._scheduler_timer is not None:
+            self.root.after_cancel(self._scheduler_timer)
+        delay = self.scheduler.next_delay()
+        self._scheduler_timer = None if delay is None else self.root.after(max(1, int(delay * 1000)), self._on_scheduler_wakeup)
+
+    def _on_scheduler_wakeup(self):
+        self._scheduler_timer = None
+        self.scheduler.run_due()  # ถ้าลูปหลักถูกบล็อก (ระหว่างสแกน) เหตุการณ์ที่ค้างจะถูกส่งตอนนี้
+        self._arm_scheduler()
+
+    def update_adherence(self):
+        """แสดง Streak / สัดส่วนการทานครบ 7 วันล่าสุด ของผู้ป่วยปัจจุบัน"""
+        if not self.adherence_text_id:
+            return
         try:
-            config_path = "config.py"
-            # อ่านข้อมูลเดิม
-            with open(config_path, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-            
-            # เขียนข้อมูลใหม่
-            with open(config_path, "w", encoding="utf-8") as f:
-                found = False
-                for line in lines:
-                    if line.strip().startswith("EAT_DAYS ="):
-                        f.write(f"EAT_DAYS = {days} # อัปเดตอัตโนมัติ\n")
-                        found = True
-                    else:
-                        f.write(line)
-                # ถ้ายังไม่มีตัวแปรนี้ ให้เพิ่มต่อท้าย
-                if not found:
-                    f.write(f"\nEAT_DAYS = {days} # อัปเดตอัตโนมัติ\n")
-            
-            print(f"💾 บันทึกจำนวนวัน ({days}) ลง config.py เรียบร้อย")
+            summary = self.ledger.summary(self.state.known_name, doses_per_day=len(self.scheduler.dose_times))
         except Exception as e:
-            print(f"❌ ไม่สามารถบันทึก config.py: {e}")
+            print(f"❌ อ่านสถิติการทานยาไม่สำเร็จ: {e}")
+            return
+        text = f"ต่อเนื่อง {summary['streak']} วัน | 7 วัน {summary['adherence_7d']:.0%}"
+        if summary["missed_30d"]:
+            text += f" | พลาด {summary['missed_30d']}"
+        self.canvas.itemconfigure(self.adherence_text_id, text=text)
+
+    def _next_dose_label(self):
+        slot = self.scheduler.next_slot()
+        return slot.label if slot else "--:--"
+
+    def _on_dose_event(self, kind, slot, **info):
+        if kind == TICK:
+            if self.time_text_id:
+                self.canvas.itemconfigure(self.time_text_id, text=datetime.now().strftime("%H:%M:%S"))
+            return
 
-    def update_time(self):
-        now = datetime.now().strftime("%H:%M:%S")
-        if self.time_text_id:
-            self.canvas.itemconfigure(self.time_text_id, text=now)
-        self.root.after(1000, self.update_time)
+        if kind == DUE:
+            print(f"⏰ ถึงเวลาทานยารอบ {slot.label}{' (ย้อนหลัง)' if info.get('late') else ''}")
+            if info.get("late"):
+                message = f"⏰ เลยเวลาทานยารอบ {slot.label} แล้วนะคะ อย่าลืมกดปุ่มและสแกนหน้านะคะ 💊"
+            else:
+                message = "⏰ ถึงเวลาทานยาแล้วนะคะ อย่าลืมกดปุ่มและสแกนหน้านะคะ 💊"
+            get_client().submit(self.send_line_alert, message)
+        elif kind == FOLLOWUP:
+            print(f"🔔 เตือนซ้ำครั้งที่ {info['number']} รอบ {slot.label}")
+            get_client().submit(self.send_line_alert, f"🔔 ยังไม่ได้สแกนทานยารอบ {slot.label} นะคะ (เตือนครั้งที่ {info['number']})")
+        elif kind == MISSED:
+            print(f"⚠️ พลาดการทานยารอบ {slot.id}")
+            try:
+                self.ledger.record_missed(self.state.known_name, slot.id)
+            except Exception as e:
+                print(f"❌ บันทึกรอบที่พลาดไม่สำเร็จ: {e}")
+            get_client().submit(self.send_line_alert, f"⚠️ ผู้ป่วยไม่ได้สแกนทานยารอบ {slot.label} ({slot.at:%d/%m/%Y})")
+        elif kind == PREWARM:
+            # เปิดกล้องรอไว้จนเลยช่วงเวลายารอบนี้ (ไม่ให้ Idle Timeout ปิดก่อนผู้ป่วยมาสแกน)
+            keep = (config.CAMERA_PREWARM_MINUTES + config.DOSE_MISSED_AFTER_MINUTES) * 60
+            try:
+                get_camera_service().prewarm(keep_seconds=keep)
+            except RuntimeError as e:
+                print(f"⚠️ เปิดกล้องล่วงหน้าไม่สำเร็จ: {e}")
+            return
+        elif kind == TAKEN:
+            print(f"💊 บันทึกการทานยารอบ {slot.id}")
+            try:
+                self.state.mark_dose_taken(slot.id)
+            except Exception as e:
+                print(f"❌ ไม่สามารถบันทึกรอบยา: {e}")
 
-    def check_alarm_time(self):
-        now = datetime.now()
-        if now.hour == self.alarm_hour and now.minute == self.alarm_minute and now.second == 0:
-             threading.Thread(target=self.send_line_alert, args=("⏰ ถึงเวลาทานยาแล้วนะคะ อย่าลืมกดปุ่มและสแกนหน้านะคะ 💊",)).start()
-        self.root.after(1000, self.check_alarm_time)
+        if self.alarm_text_id:
+            self.canvas.itemconfigure(self.alarm_text_id, text=self._next_dose_label())
+        self.update_adherence()
 
     def send_line_alert(self, message_text):
         if not self.CHANNEL_ACCESS_TOKEN or not self.USER_ID:
@@ -244,28 +495,45 @@ class FullScreenImageApp:
         headers = { "Content-Type": "application/json", "Authorization": f"Bearer {self.CHANNEL_ACCESS_TOKEN}" }
         data = { "to": self.USER_ID, "messages": [{"type": "text", "text": message_text}] }
         try:
-            requests.post("https://api.line.me/v2/bot/message/push", headers=headers, data=json.dumps(data), timeout=5)
+            get_client().post("https://api.line.me/v2/bot/message/push", headers=headers, data=json.dumps(data), endpoint="line_push")
         except Exception as e:
             print("Error sending LINE:", e)
 
     def test_send_alert(self, event):
-        threading.Thread(target=self.send_line_alert, args=("Test Alert",)).start()
+        get_client().submit(self.send_line_alert, "Test Alert")
         # สั่ง Test ESP32 ด้วย
-        self.verifier.send_command_to_esp32("a")
+        if self.verifier is not None:
+            self.verifier.send_command_to_esp32("a")
 
     def on_button_click(self, event):
-        if self.is_scanning: return
+        if self.is_scanning or not self._require_ready(): return
         self.is_scanning = True
         print("📷 เริ่มสแกนใบหน้า...")
-        self.root.after(10, self._run_scan_process)
+        self._run_scan_process()
 
     def _run_scan_process(self):
-        verified = self.verifier.run()
-        self.root.attributes("-fullscreen", True)
-        self.root.focus_force()
-        if verified:
-            print("✅ ผ่าน")
-            self.increment_eatday()
+        """สแกนใน Worker Thread แสดงผลบน Canvas เดิม ลูปของ Tk (นาฬิกา / เตือนยา) ทำงานต่อได้ตลอด"""
+        for item in self.main_ui_items:
+            self.canvas.itemconfigure(item, state='hidden')
+        self.scan_view.start()
+        future = Future()
+        self._scan_thread = threading.Thread(target=self._scan_worker, args=(future,), name="scan", daemon=True)
+        self._scan_thread.start()
+        self.bridge.watch(future, self._on_scan_finished)
+
+    def _scan_worker(self, future):
+        try:
+            future.set_result(self.verifier.run(display=self.scan_view))
+        except Exception as e:
+            print(f"❌ สแกนไม่สำเร็จ: {e}")
+            future.set_result(False)
+
+    def _on_scan_finished(self, future):
+        self._scan_thread = None
+        self.scan_view.stop()
+        self.show_main_ui()
+        if future.result():
+            print("✅ ผ่าน")  # จำนวนวันอัปเดตเมื่อ Dose Pipeline เสร็จ (_on_dose_finished)
         self.root.after(1000, lambda: setattr(self, 'is_scanning', False))
 
 if __name__ == "__main__":
@@ -1,5 +1,8 @@
 import requests
 
+# Session เดียวใช้ซ้ำ (Keep-alive) ไม่ต้อง TLS Handshake ใหม่ทุกครั้ง
+session = requests.Session()
+
 def copy_sheet_via_gas(script_url, spreadsheet_id, source_name, name_prefix):
     """
     ส่งคำสั่งไปที่ Google Apps Script เพื่อให้ Copy Sheet แบบรันเลขต่ออัตโนมัติ
@@ -13,7 +16,7 @@ def copy_sheet_via_gas(script_url, spreadsheet_id, source_name, name_prefix):
     
     try:
         # ส่งข้อมูลด้วย POST request
-        response = requests.post(script_url, json=payload)
+        response = session.post(script_url, json=payload, timeout=10)
         
         if response.status_code == 200:
             # แสดงผลลัพธ์ที่ส่งกลับมาจาก Google (จะบอกชื่อใหม่ที่ตั้งให้ด้วย)
@@ -36,6 +36,7 @@ class FaceVerifier:
         self.webapp_url = webapp_url
         self.sheet_name = sheet_name
         self.face_id = face_id
+        self.session = requests.Session()  # Keep-alive ไปยัง Web App
 
         # โหลดและเตรียมข้อมูลใบหน้าต้นแบบ
         self.known_face_encodings, self.known_face_names = self._load_known_faces()
@@ -69,7 +70,7 @@ class FaceVerifier:
         }
 
         try:
-            response = requests.post(self.webapp_url, json=payload, timeout=10)
+            response = self.session.post(self.webapp_url, json=payload, timeout=10)
             print("ส่งไป Google Sheet → Status code:", response.status_code)
             print("Response text:", response.text)
         except Exception as e:
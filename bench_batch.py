@@ -0,0 +1,72 @@
+"""
+ทดสอบการส่ง Offline Log ย้อนหลังแบบ Batch (FaceVerifier -> webapp_stub.py) บนเครื่อง ไม่ต้องใช้ Google Sheet จริง
+
+    python bench_batch.py [--logs 120] [--gaps 5] [--no-batch]
+
+- ชีตเริ่มต้นมีแถวว่างคั่นกลาง (มีข้อมูลผู้ป่วยรออยู่ทางขวา) เหมือนชีตจริง
+- ตรวจว่า Log ทุกรายการลงชีตครั้งเดียว ตามลำดับ เติมแถวว่างจากบนลงล่างก่อน
+  ข้อมูลเดิมในแถวว่างยังอยู่ และแถวที่มีข้อมูลแล้วไม่ถูกแตะ
+- เทียบจำนวน HTTP Request ระหว่าง Batch กับส่งทีละแถว (--no-batch)
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from Facescan import FaceVerifier
+from offline_queue import OfflineLogQueue
+from webapp_stub import WebAppStub
+
+SHEET = "Patient1"
+
+
+def seed_rows(gaps):
+    """แถวที่มีข้อมูลแล้ว สลับกับแถวว่างที่มีข้อมูลผู้ป่วยทางขวา (Dose) รออยู่"""
+    rows = []
+    for i in range(gaps):
+        rows.append({"Date": "2025-12-31", "Time": "08:00:00", "Name": f"old{i}", "Dose": "1 tab"})
+        rows.append({"Dose": f"gap{i}"})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logs", type=int, default=120)
+    parser.add_argument("--gaps", type=int, default=5)
+    parser.add_argument("--no-batch", action="store_true")
+    args = parser.parse_args()
+
+    stub = WebAppStub(batch=not args.no_batch).start()
+    seeded = seed_rows(args.gaps)
+    stub.store.seed(SHEET, seeded)
+
+    verifier = FaceVerifier(serial_port=None, webapp_url=stub.url)
+    verifier.sheet_name = SHEET
+    workdir = tempfile.mkdtemp(prefix="bench_batch_")
+    verifier.offline_queue = OfflineLogQueue(os.path.join(workdir, "offline_logs.jsonl"), fsync_policy="never")
+    for i in range(args.logs):
+        verifier.offline_queue.append({"sheet": SHEET, "data": {"Name": f"log{i:04d}", "Status": "Verified", "Note": ""}})
+
+    t0 = time.perf_counter()
+    try:
+        verifier.retry_offline_logs()
+    finally:
+        elapsed = time.perf_counter() - t0
+        stub.stop()
+
+    table = stub.store.sheets[SHEET]
+    names = [row.get("Name") for row in table if str(row.get("Name", "")).startswith("log")]
+    print(f"🔁 {stub.store.requests} HTTP requests | {stub.store.rows_written} แถว | {elapsed:.2f}s"
+          f" | ค้างในคิว {len(verifier.offline_queue)}")
+
+    assert len(verifier.offline_queue) == 0, "ยังมี Log ค้างในคิว"
+    assert names == [f"log{i:04d}" for i in range(args.logs)], "Log ไม่ครบ / ซ้ำ / ไม่เรียงลำดับ"
+    for i in range(args.gaps):
+        old, gap = table[2 * i], table[2 * i + 1]
+        assert old == seeded[2 * i], "แถวที่มีข้อมูลแล้วถูกเขียนทับ"
+        assert gap["Dose"] == f"gap{i}" and gap["Name"] == f"log{i:04d}", "ไม่ได้เติมแถวว่างตามลำดับ / ข้อมูลเดิมหาย"
+    print("✅ Log ทุกรายการลงชีตครั้งเดียว เติมแถวว่างก่อนโดยไม่แตะแถวอื่น")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: เปรียบเทียบ Face Detector แต่ละ Backend (Latency + Recall) บนโฟลเดอร์เฟรมที่บันทึกไว้
+
+    python bench_detectors.py frames_dir [--backends hog,mediapipe,yunet,dnn] [--scale 0.25]
+
+ถ้าในโฟลเดอร์มี labels.json ({"frame.jpg": [[top, right, bottom, left], ...]} พิกัดภาพเต็ม)
+จะใช้เป็นคำตอบอ้างอิง ถ้าไม่มีจะใช้ HOG บนภาพเต็มความละเอียดเป็นค่าอ้างอิงแทน
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from face_detectors import DETECTOR_NAMES, HogFaceDetector, create_face_detector
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def iou(a, b):
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def load_frames(frames_dir):
+    names = sorted(n for n in os.listdir(frames_dir) if n.lower().endswith(IMAGE_EXTS))
+    return [(n, cv2.imread(os.path.join(frames_dir, n))) for n in names]
+
+
+def reference_boxes(frames_dir, frames):
+    labels_path = os.path.join(frames_dir, "labels.json")
+    if os.path.exists(labels_path):
+        with open(labels_path, "r", encoding="utf-8") as f:
+            labels = json.load(f)
+        return {n: [tuple(b) for b in labels.get(n, [])] for n, _ in frames}
+
+    print("ℹ️ ไม่พบ labels.json ใช้ HOG ภาพเต็มเป็นค่าอ้างอิง")
+    hog = HogFaceDetector(upsample=1)
+    return {n: hog.detect(np.ascontiguousarray(img[:, :, ::-1])) for n, img in frames}
+
+
+def evaluate(detector, frames, refs, scale, iou_threshold):
+    timings, hits, total = [], 0, 0
+    for name, img in frames:
+        small = cv2.resize(img, (0, 0), fx=scale, fy=scale)
+        rgb = np.ascontiguousarray(small[:, :, ::-1])
+        t0 = time.perf_counter()
+        boxes = detector.detect(rgb)
+        timings.append(time.perf_counter() - t0)
+
+        boxes = [tuple(v / scale for v in b) for b in boxes]
+        for ref in refs[name]:
+            total += 1
+            if any(iou(ref, b) >= iou_threshold for b in boxes):
+                hits += 1
+    recall = hits / total if total else float("nan")
+    return timings, recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("frames_dir")
+    parser.add_argument("--backends", default=",".join(DETECTOR_NAMES))
+    parser.add_argument("--scale", type=float, default=0.25)
+    parser.add_argument("--iou", type=float, default=0.3)
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames_dir)
+    if not frames:
+        raise SystemExit(f"❌ ไม่พบรูปใน {args.frames_dir}")
+    refs = reference_boxes(args.frames_dir, frames)
+
+    print(f"🎞️ {len(frames)} เฟรม | scale {args.scale} | IoU >= {args.iou}")
+    print(f"{'backend':<10} {'median ms':>10} {'p95 ms':>8} {'recall':>8}")
+    for name in args.backends.split(","):
+        try:
+            detector = create_face_detector(name)
+        except Exception as e:
+            print(f"{name:<10} ⚠️ ใช้งานไม่ได้: {e}")
+            continue
+        try:
+            timings, recall = evaluate(detector, frames, refs, args.scale, args.iou)
+        finally:
+            detector.close()
+        ms = sorted(t * 1000 for t in timings)
+        p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+        print(f"{name:<10} {statistics.median(ms):>10.2f} {p95:>8.2f} {recall:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Benchmark: เวลาโหลด Encoding รูปต้นแบบ แบบ Cold start (รัน dlib) เทียบกับ Warm start (แคช mmap)
+
+    python bench_encoding_cache.py [image_path] [--runs 5]
+"""
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+
+import config
+from encoding_cache import EncodingCache
+
+
+def time_load(cache_dir, image_path):
+    start = time.perf_counter()
+    cache = EncodingCache(cache_dir, model=config.FACE_ENCODING_MODEL, upsample=config.FACE_UPSAMPLE)
+    encodings = cache.get_or_compute(image_path)
+    float(encodings[0][0])  # แตะข้อมูลจริง ให้ mmap อ่านจากดิสก์
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image", nargs="?", default=config.KNOWN_IMAGE_PATH)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    cold, warm = [], []
+    for _ in range(args.runs):
+        cache_dir = tempfile.mkdtemp(prefix="enc_cache_")
+        try:
+            cold.append(time_load(cache_dir, args.image))
+            warm.append(time_load(cache_dir, args.image))
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"📷 รูป: {args.image} ({args.runs} รอบ)")
+    print(f"🥶 Cold start: median {statistics.median(cold) * 1000:8.1f} ms")
+    print(f"🔥 Warm start: median {statistics.median(warm) * 1000:8.1f} ms")
+    print(f"🚀 เร็วขึ้น {statistics.median(cold) / statistics.median(warm):.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: หน่วยความจำที่จองต่อเฟรมในลูปสแกน (tracemalloc) แบบเดิม เทียบกับแบบใช้ Buffer ซ้ำ
+
+    python bench_frame_alloc.py [--frames 300] [--width 1280 --height 720]
+
+วัดเฉพาะส่วนที่เปลี่ยน: copy เฟรมแสดงผล, ระบายแถบหัว, ย่อภาพ, แปลงสี RGB / เทา
+(ไม่ต้องมีกล้อง / face_recognition)
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from frame_buffers import BufferPool, FramePreprocessor, blend_band
+
+
+def legacy_step(frame, state):
+    display = frame.copy()
+    overlay = display.copy()
+    cv2.rectangle(overlay, (0, 0), (display.shape[1], 80), (30, 30, 30), -1)
+    cv2.addWeighted(overlay, 0.8, display, 0.2, 0, display)
+    small = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
+    rgb = np.ascontiguousarray(small[:, :, ::-1])
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return display, rgb, gray
+
+
+def buffered_step(frame, state):
+    pool, pre = state
+    display = pool.get("display", frame.shape)
+    np.copyto(display, frame)
+    blend_band(display, 0, 81, (30, 30, 30), 0.8)
+    small = pre.resize(frame)
+    rgb = pre.to_rgb(small)
+    gray = pre.to_gray(small)
+    return display, rgb, gray
+
+
+def measure(step, frames, state):
+    step(frames[0], state)  # warm-up: ให้ Buffer ถูกจองก่อนเริ่มวัด
+    peaks, timings = [], []
+    tracemalloc.start()
+    for frame in frames:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        t0 = time.perf_counter()
+        result = step(frame, state)
+        timings.append(time.perf_counter() - t0)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - base)
+        del result
+    tracemalloc.stop()
+    return peaks, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8) for _ in range(8)]
+    frames = [frames[i % len(frames)] for i in range(args.frames)]
+
+    # ผลต้องเหมือนกัน (ต่างได้ไม่เกิน 1 จากการปัดเศษ)
+    a = legacy_step(frames[0], None)
+    b = buffered_step(frames[0], (BufferPool(), FramePreprocessor(0.25)))
+    for x, y in zip(a, b):
+        assert x.shape == y.shape and np.abs(x.astype(int) - y.astype(int)).max() <= 1
+
+    print(f"🎞️ {args.frames} เฟรม {args.width}x{args.height}")
+    for label, step, state in (
+        ("เดิม (copy ทุกเฟรม)", legacy_step, None),
+        ("ใช้ Buffer ซ้ำ     ", buffered_step, (BufferPool(), FramePreprocessor(0.25))),
+    ):
+        peaks, timings = measure(step, frames, state)
+        print(f"   {label}: จองเพิ่ม {statistics.mean(peaks) / 1024:9.1f} KiB/เฟรม"
+              f" | median {statistics.median(timings) * 1000:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
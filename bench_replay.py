@@ -0,0 +1,145 @@
+"""
+Benchmark: เล่นซ้ำ Session ที่บันทึกไว้ผ่าน FaceVerifier แบบ Deterministic (ไม่ต้องใช้เว็บแคม)
+
+    python bench_replay.py recordings/ [--every-n 1] [--json result.json] [--baseline old.json]
+
+- เวลาถือค้าง / Timeout ใช้นาฬิกาเสมือนตามเวลาของเฟรมที่บันทึกไว้ ผลผ่าน/ไม่ผ่านจึงเหมือนเดิมทุกครั้ง
+- รายงาน Latency แต่ละขั้น (p50/p95), fps ของการประมวลผล, เวลาจนสแกนผ่าน และจำนวน False Accept / False Reject
+- meta.json ของแต่ละ Session: expected = ชื่อผู้ป่วยที่ควรผ่าน, null = ไม่ควรผ่าน (คนอื่น / ไม่มีคน)
+- --baseline: เทียบ p50 กับผลครั้งก่อน ถ้าช้าลงเกิน --max-regression จะจบด้วย exit code 1
+"""
+import argparse
+import json
+import time
+
+from Facescan import FaceVerifier
+from metrics import MetricsRegistry
+from session_recorder import ReplayCapture, ReplayClock, list_sessions
+from state_store import get_state_store
+
+
+def replay_session(verifier, session_dir, patient, every_n=1):
+    """เล่นซ้ำ 1 Session ทีละเฟรมบนเธรดเดียว คืนผลของ Session นั้น"""
+    clock = ReplayClock()
+    capture = ReplayCapture(session_dir, clock)
+    expected = capture.expected
+
+    verifier.clock = clock.time
+    verifier.tracker.clock = clock.monotonic
+    verifier.scheduler.clock = clock.monotonic
+    verifier.known_name = expected or patient
+    verifier.hold_start_time = None
+    verifier.hold_track_id = None
+    verifier.verified = False
+    verifier.last_face_box = None
+    verifier.tracker.clear()
+    verifier.scheduler.reset()
+
+    frames = processed = 0
+    compute = 0.0
+    time_to_verify = None
+    try:
+        while True:
+            ret, frame = capture.read()
+            if not ret or clock.time() > verifier.scan_timeout:
+                break
+            frames += 1
+            if (frames - 1) % every_n:
+                continue
+            t0 = time.perf_counter()
+            verifier._recognize(frame)
+            compute += time.perf_counter() - t0
+            processed += 1
+            if verifier.verified:
+                time_to_verify = clock.time()
+                break
+    finally:
+        capture.release()
+
+    should_pass = expected is not None
+    return {
+        "session": session_dir,
+        "expected": expected,
+        "frames": frames,
+        "processed": processed,
+        "fps": processed / compute if compute > 0 else 0.0,
+        "verified": verifier.verified,
+        "time_to_verify": time_to_verify,
+        "false_accept": verifier.verified and not should_pass,
+        "false_reject": should_pass and not verifier.verified,
+    }
+
+
+def compare_baseline(stages, baseline_path, max_regression):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["stages"]
+    regressions = []
+    for name, summary in stages.items():
+        old = baseline.get(name)
+        if not old or old["p50_ms"] <= 0:
+            continue
+        change = summary["p50_ms"] / old["p50_ms"] - 1
+        flag = "⚠️" if change > max_regression else "  "
+        print(f"{flag} {name:<40} {old['p50_ms']:8.2f} -> {summary['p50_ms']:8.2f} ms ({change * 100:+.0f}%)")
+        if change > max_regression:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="โฟลเดอร์ Session หรือโฟลเดอร์ที่มีหลาย Session")
+    parser.add_argument("--every-n", type=int, default=1, help="ประมวลผลทุกๆ N เฟรม (ค่าคงที่ เพื่อให้ผลซ้ำได้)")
+    parser.add_argument("--patient", default=None, help="ผู้ป่วยที่กำลังรอรับยา สำหรับ Session ที่ expected = null")
+    parser.add_argument("--json", dest="json_path", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    sessions = list_sessions(args.paths)
+    if not sessions:
+        raise SystemExit("❌ ไม่พบ Session (ต้องมี meta.json + frames.avi)")
+
+    verifier = FaceVerifier(serial_port=None, webapp_url=None)
+    verifier.send_log_to_sheet = lambda note="": None  # ไม่ส่ง Log / ไม่เขียนคิว Offline ตอน Benchmark
+    verifier.metrics = MetricsRegistry(window=100000)
+    patient = args.patient or get_state_store().known_name
+
+    results = []
+    for session in sessions:
+        result = replay_session(verifier, session, patient, every_n=args.every_n)
+        results.append(result)
+        ttv = f"{result['time_to_verify']:.2f}s" if result["time_to_verify"] is not None else "-"
+        mark = "❗" if result["false_accept"] or result["false_reject"] else "✅"
+        print(f"{mark} {session:<40} frames {result['frames']:4d} | processed {result['processed']:4d}"
+              f" | {result['fps']:6.1f} fps | verify {ttv:>7} | expected {result['expected']}")
+
+    snapshot = verifier.metrics.snapshot()
+    stages = snapshot["histograms"]
+    print("\n⏱️ Latency ต่อขั้น:")
+    for name, summary in stages.items():
+        print(f"   {name:<40} n={summary['count']:5d}  p50 {summary['p50_ms']:8.2f} ms  p95 {summary['p95_ms']:8.2f} ms")
+
+    verify_times = [r["time_to_verify"] for r in results if r["time_to_verify"] is not None and not r["false_accept"]]
+    summary = {
+        "sessions": len(results),
+        "false_accept": sum(r["false_accept"] for r in results),
+        "false_reject": sum(r["false_reject"] for r in results),
+        "mean_fps": sum(r["fps"] for r in results) / len(results),
+        "mean_time_to_verify": sum(verify_times) / len(verify_times) if verify_times else None,
+    }
+    print(f"\n📊 {summary['sessions']} sessions | FA {summary['false_accept']} | FR {summary['false_reject']}"
+          f" | mean {summary['mean_fps']:.1f} fps | time-to-verify {summary['mean_time_to_verify']}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "stages": stages, "sessions": results}, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        print("\n📉 เทียบกับ Baseline (p50):")
+        if compare_baseline(stages, args.baseline, args.max_regression):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
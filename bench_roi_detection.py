@@ -0,0 +1,61 @@
+"""
+Benchmark: เวลาตรวจจับใบหน้าต่อเฟรม แบบค้นทั้งเฟรม เทียบกับโหมด ROI
+
+    python bench_roi_detection.py [video_or_camera_index] [--frames 200]
+"""
+import argparse
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from Facescan import FaceVerifier
+
+
+def measure(verifier, frames, roi_mode):
+    verifier.roi_mode = roi_mode
+    verifier.last_face_box = None
+    verifier.roi_hits = verifier.roi_misses = 0
+    timings = []
+    for frame in frames:
+        small = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
+        rgb_small = np.ascontiguousarray(small[:, :, ::-1])
+        t0 = time.perf_counter()
+        locations = verifier._detect_faces(rgb_small)
+        timings.append(time.perf_counter() - t0)
+        # จำกล่องแรกที่เจอไว้เป็น ROI (ไม่ต้องเข้ารหัส วัดเฉพาะการตรวจจับ)
+        verifier.last_face_box = locations[0] if locations else None
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", nargs="?", default="0")
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    cap = cv2.VideoCapture(source)
+    frames = []
+    while len(frames) < args.frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise SystemExit("❌ อ่านเฟรมไม่ได้")
+
+    verifier = FaceVerifier(serial_port=None, webapp_url=None)
+    full = measure(verifier, frames, roi_mode=False)
+    roi = measure(verifier, frames, roi_mode=True)
+
+    print(f"🎞️ {len(frames)} เฟรม จาก {args.source}")
+    print(f"🖼️ Full frame: median {statistics.median(full) * 1000:6.2f} ms / mean {statistics.mean(full) * 1000:6.2f} ms")
+    print(f"🎯 ROI mode  : median {statistics.median(roi) * 1000:6.2f} ms / mean {statistics.mean(roi) * 1000:6.2f} ms"
+          f" (hit {verifier.roi_hits}, fallback {verifier.roi_misses})")
+
+
+if __name__ == "__main__":
+    main()
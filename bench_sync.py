@@ -0,0 +1,87 @@
+"""
+ทดสอบ Delta Sync แบบครบวง (Dose Ledger -> LedgerSync -> webapp_stub.py) บนเครื่อง ไม่ต้องใช้ Google Sheet จริง
+
+    python bench_sync.py [--doses 200] [--fail-rate 0.3] [--delay 0.0] [--timeout 3] [--max-rounds 1000]
+
+- จำลองเน็ตหลุด (--fail-rate) และเซิร์ฟเวอร์ตอบช้ากว่า Timeout หลังเขียนแถวไปแล้ว (--delay > --timeout)
+- ซิงก์ซ้ำจนครบ แล้วตรวจว่าทุก Dose อยู่ในชีตครั้งเดียวพอดี (ไม่มี DedupKey ซ้ำ) และเรียงตาม seq
+- เทียบจำนวนแถวที่ส่งจริงกับการส่งใหม่ทั้งหมดทุกครั้ง
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from dose_ledger import DoseLedger
+from ledger_sync import LedgerSync
+from webapp_stub import WebAppStub
+
+
+def fake_dose(i, start):
+    at = start + timedelta(hours=12 * i)
+    return {
+        "dose_id": f"bench{i:05d}",
+        "patient": "Patient A",
+        "sheet": "Patient1",
+        "slot": at.strftime("%Y-%m-%d %H:%M"),
+        "verified_at": at.strftime("%Y-%m-%d %H:%M:%S"),
+        "status": "ok",
+        "note": "Face verified from camera",
+        "steps": {"ack": {"status": "done"}},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doses", type=int, default=200)
+    parser.add_argument("--per-round", type=int, default=7, help="จำนวน Dose ที่เพิ่มก่อนซิงก์แต่ละรอบ")
+    parser.add_argument("--fail-rate", type=float, default=0.3)
+    parser.add_argument("--delay", type=float, default=0.0, help="หน่วงการตอบของเซิร์ฟเวอร์ (วินาที)")
+    parser.add_argument("--timeout", type=float, default=3.0)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--max-rounds", type=int, default=1000)
+    args = parser.parse_args()
+
+    stub = WebAppStub(fail_rate=args.fail_rate).start()
+    workdir = tempfile.mkdtemp(prefix="bench_sync_")
+    ledger = DoseLedger(os.path.join(workdir, "doses.db"))
+    sync = LedgerSync(ledger, stub.url, face_id="bench", batch_size=args.batch_size, timeout=args.timeout)
+
+    start = datetime(2026, 1, 1, 8, 0)
+    pushes = failures = sent_rows = full_rows = 0
+    t0 = time.perf_counter()
+    added = 0
+    try:
+        while (added < args.doses or ledger.pending_count()) and pushes < args.max_rounds:
+            for _ in range(min(args.per_round, args.doses - added)):
+                ledger.add(fake_dose(added, start))
+                added += 1
+            full_rows += added  # ถ้าส่งใหม่ทั้งหมดทุกครั้ง
+            sent_rows += ledger.pending_count()
+            pushes += 1
+            # หน่วงเฉพาะรอบคี่: รอบนั้น Timeout ทั้งที่เขียนแล้ว รอบถัดไปต้องไม่เขียนซ้ำ
+            stub.delay = args.delay if pushes % 2 else 0.0
+            if not sync.push():
+                failures += 1
+    finally:
+        elapsed = time.perf_counter() - t0
+        stub.stop()
+
+    rows = stub.store.rows("Patient1")
+    keys = [r["DedupKey"] for r in rows]
+    seqs = [int(k.rsplit(":", 1)[1]) for k in keys]
+    duplicates = len(keys) - len(set(keys))
+
+    print(f"🔁 {pushes} รอบซิงก์ ({failures} รอบไม่สำเร็จ) | {stub.store.requests} HTTP requests | {elapsed:.2f}s")
+    print(f"📤 ส่งแถวรวม {sent_rows} (ส่งใหม่ทั้งหมดทุกครั้งจะเป็น {full_rows})")
+    print(f"📄 ชีตมี {len(rows)} แถว / Ledger {added} รายการ | ซ้ำ {duplicates} | hwm เซิร์ฟเวอร์ {stub.store.hwm.get(sync.device)}")
+    assert duplicates == 0, "พบแถวซ้ำ"
+    assert len(rows) == added, "จำนวนแถวไม่ตรงกับ Ledger"
+    assert seqs == sorted(seqs), "ลำดับไม่เรียงตาม seq"
+    assert rows[0]["Date"] == start.strftime("%Y-%m-%d"), "วันที่ต้องเป็นเวลาของเครื่อง ไม่ใช่เวลาที่ซิงก์"
+    print("✅ ทุก Dose อยู่ในชีตครั้งเดียว เรียงตามลำดับ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import threading
+import time
+
+import cv2
+
+import config
+from metrics import get_metrics
+
+
+class CameraLease:
+    """
+    สิทธิ์ใช้กล้องของหนึ่ง Session (สแกน / ลงทะเบียน)
+    หน้าตาเหมือน cv2.VideoCapture (read / isOpened / get / set / release) จึงใช้กับ CapturePipeline
+    และ RecordingCapture ได้ทันที แต่ release() แค่คืนสิทธิ์ ไม่ได้ปิดอุปกรณ์
+    """
+
+    def __init__(self, service, name):
+        self.service = service
+        self.name = name
+        self._last_seq = service.frame_seq
+        self.released = False
+
+    def read(self, timeout: float = 2.0):
+        """รอเฟรมที่ใหม่กว่าเฟรมที่อ่านไปล่าสุด (ไม่ได้เฟรมเดิมซ้ำ)"""
+        if self.released:
+            return False, None
+        seq, frame = self.service.wait_frame(self._last_seq, timeout)
+        if frame is None:
+            return False, None
+        self._last_seq = seq
+        return True, frame
+
+    def isOpened(self):
+        return not self.released and self.service.is_open
+
+    def get(self, prop):
+        return self.service.get(prop)
+
+    def set(self, prop, value):
+        # ความละเอียด / ค่ากล้องถูกตั้งครั้งเดียวตอนเปิดอุปกรณ์ (ใช้ร่วมกันทุก Session)
+        return False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.service.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class CameraService:
+    """
+    เจ้าของกล้องตัวเดียวของทั้งโปรแกรม
+    - เปิดอุปกรณ์ครั้งเดียว แล้วใช้ซ้ำทุกการสแกน / ลงทะเบียน (ไม่ต้องรอ Auto-exposure ใหม่ทุกครั้ง)
+    - ว่าง (ไม่มี Lease): grab() ช้าๆ ที่ idle_fps ไม่ถอดรหัสภาพ ให้กล้องปรับแสงค้างไว้แต่ใช้ CPU น้อย
+    - มี Lease: อ่านเต็มความเร็ว ส่งเฟรมล่าสุดให้ทุก Lease
+    - prewarm(): เปิดไว้ก่อนถึงเวลายา / ตอนเปิดโปรแกรม
+    - ปิดอุปกรณ์เองเมื่อว่างเกิน idle_timeout วินาที
+    """
+
+    def __init__(
+        self,
+        index: int = 0,
+        width: int = 1280,
+        height: int = 720,
+        idle_timeout: float = 300.0,
+        idle_fps: float = 2.0,
+        flush_frames: int = 4,
+        opener=cv2.VideoCapture,
+        clock=time.monotonic,
+    ):
+        self.index = index
+        self.width = width
+        self.height = height
+        self.idle_timeout = idle_timeout
+        self.idle_interval = 1.0 / idle_fps if idle_fps else 0.5
+        self.flush_frames = flush_frames
+        self.opener = opener
+        self.clock = clock
+
+        self._cond = threading.Condition()
+        self._capture = None
+        self._closing = None  # อุปกรณ์ที่กำลังปิด (release นอก Lock) ห้ามเปิดซ้ำจนกว่าจะปิดเสร็จ
+        self._thread = None
+        self._leases = set()
+        self._frame = None
+        self._seq = 0
+        self._idle_since = clock()
+        self._keep_until = 0.0
+        self._failed = False
+        self.metrics = get_metrics()
+        self.metrics.gauge_fn("camera_open", lambda: 1 if self.is_open else 0)
+        self.metrics.gauge_fn("camera_leases", lambda: len(self._leases))
+
+    # ---------- Device ----------
+    @property
+    def is_open(self):
+        return self._capture is not None
+
+    @property
+    def frame_seq(self):
+        with self._cond:
+            return self._seq
+
+    def _open_locked(self):
+        # V4L2 เปิดอุปกรณ์ซ้ำไม่ได้ระหว่างที่ตัวเก่ายัง release ไม่เสร็จ
+        self._cond.wait_for(lambda: self._closing is None)
+        if self._capture is not None:
+            return
+        t0 = time.perf_counter()
+        capture = self.opener(self.index)
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        if not capture.isOpened():
+            capture.release()
+            raise RuntimeError("Cannot open camera")
+        self._capture = capture
+        self._failed = False
+        self._idle_since = self.clock()
+        self.metrics.inc("camera_opens_total")
+        self.metrics.observe("camera_open_seconds", time.perf_counter() - t0)
+        print(f"📷 เปิดกล้อง {self.index} ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+        self._thread = threading.Thread(target=self._reader_loop, args=(capture,), name="camera", daemon=True)
+        self._thread.start()
+
+    def prewarm(self, keep_seconds: float = 0.0):
+        """เปิดกล้องไว้ล่วงหน้า และไม่ปิดเองอย่างน้อย keep_seconds วินาที"""
+        with self._cond:
+            self._keep_until = max(self._keep_until, self.clock() + keep_seconds)
+            self._idle_since = self.clock()
+            self._open_locked()
+        return self
+
+    def get(self, prop):
+        capture = self._capture
+        return capture.get(prop) if capture is not None else 0.0
+
+    def close(self):
+        """ปิดอุปกรณ์ทันที (ตอนปิดโปรแกรม) Lease ที่ค้างอยู่จะอ่านได้ (False, None)"""
+        with self._cond:
+            capture, self._capture = self._capture, None
+            thread, self._thread = self._thread, None
+            self._leases.clear()
+            if capture is not None:
+                self._closing = capture
+            self._cond.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=2.0)
+        if capture is not None:
+            self._release_device(capture)
+            print("📷 ปิดกล้อง")
+
+    def _release_device(self, capture):
+        """release() นอก Lock แล้วค่อยปล่อยให้ acquire / prewarm เปิดอุปกรณ์ใหม่ได้"""
+        try:
+            capture.release()
+        finally:
+            with self._cond:
+                if self._closing is capture:
+                    self._closing = None
+                self._cond.notify_all()
+
+    # ---------- Leases ----------
+    def acquire(self, name: str = "session") -> CameraLease:
+        with self._cond:
+            self._open_locked()
+            lease = CameraLease(self, name)
+            self._leases.add(lease)
+            self._cond.notify_all()  # ปลุก Reader ให้เปลี่ยนเป็นโหมดอ่านเต็มความเร็ว
+            return lease
+
+    def release(self, lease):
+        with self._cond:
+            self._leases.discard(lease)
+            if not self._leases:
+                self._idle_since = self.clock()
+
+    def wait_frame(self, last_seq, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > last_seq or self._capture is None or self._failed, timeout)
+            if self._seq <= last_seq:
+                return last_seq, None
+            return self._seq, self._frame
+
+    # ---------- Reader Thread ----------
+    def _reader_loop(self, capture):
+        # ตัดสินใจโหมดใต้ Lock แต่ grab()/read() (บล็อกได้ถึงหนึ่งเฟรม) ทำนอก Lock
+        # acquire / release / wait_frame จึงไม่ต้องรอ Driver ของกล้อง
+        active = False
+        while True:
+            flush = 0
+            with self._cond:
+                if self._capture is not capture:
+                    return
+                if not self._leases:
+                    now = self.clock()
+                    if now - self._idle_since > self.idle_timeout and now > self._keep_until:
+                        self._capture = None
+                        self._closing = capture
+                        self._thread = None
+                        self._frame = None
+                        break
+                    if active:
+                        self._frame = None  # ไม่ถือเฟรมใหญ่ค้างไว้ตอนว่าง
+                    active = False
+                    self._cond.wait(self.idle_interval)
+                    idle = not self._leases
+                else:
+                    idle = False
+                if not idle and not active:
+                    active = True
+                    flush = self.flush_frames  # ทิ้งเฟรมเก่าที่ค้างใน Driver ระหว่างโหมดว่าง
+
+            if idle:
+                capture.grab()  # ไม่ถอดรหัส: ให้กล้องทำงานต่อ (Auto-exposure) แต่ประหยัด CPU
+                continue
+            for _ in range(flush):
+                capture.grab()
+
+            ret, frame = capture.read()
+            with self._cond:
+                if self._capture is not capture:
+                    return  # ถูก close() ระหว่างอ่าน ไม่ส่งเฟรมนี้ต่อ
+                if not ret:
+                    print("❌ อ่านภาพจากกล้องไม่สำเร็จ")
+                    self._failed = True
+                    self._capture = None
+                    self._closing = capture
+                    self._thread = None
+                    self._cond.notify_all()
+                    break
+                self._frame = frame
+                self._seq += 1
+                self._cond.notify_all()
+
+        self._release_device(capture)
+        print("📷 ปิดกล้อง" + ("" if self._failed else " (ไม่ได้ใช้งานนาน)"))
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_camera_service(index: int | None = None) -> CameraService:
+    """คืน CameraService ตัวเดียวต่อกล้องหนึ่งตัว (ค่าเริ่มต้นมาจาก config.py)"""
+    index = config.CAMERA_INDEX if index is None else index
+    with _services_lock:
+        service = _services.get(index)
+        if service is None:
+            service = _services[index] = CameraService(
+                index,
+                width=config.FRAME_WIDTH,
+                height=config.FRAME_HEIGHT,
+                idle_timeout=config.CAMERA_IDLE_TIMEOUT,
+                idle_fps=config.CAMERA_IDLE_FPS,
+            )
+        return service
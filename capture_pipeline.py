@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import deque
+
+from metrics import get_metrics
+
+
+class LatestFrameSlot:
+    """
+    Buffer ขนาด 1 ช่อง เก็บเฉพาะเฟรมล่าสุด
+    - กล้องเขียนทับได้ตลอด (ไม่มีคิวค้าง ภาพไม่ Stale)
+    - นับจำนวนเฟรมที่ถูกเขียนทับก่อน Worker จะหยิบไปประมวลผล
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._taken_seq = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, frame):
+        with self._cond:
+            if self._seq > self._taken_seq:
+                self.dropped += 1
+            self._frame = frame
+            self._seq += 1
+            self._cond.notify_all()
+
+    def peek(self):
+        """ดูเฟรมล่าสุดโดยไม่นับว่าถูกหยิบไปแล้ว (ใช้ฝั่งแสดงผล)"""
+        with self._cond:
+            return self._seq, self._frame
+
+    def wait_newer(self, last_seq, timeout=None):
+        """รอจนมีเฟรมใหม่กว่า last_seq แล้วหยิบไป (ใช้ฝั่ง Worker)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > last_seq or self.closed, timeout)
+            if self._seq <= last_seq:
+                return last_seq, None
+            self._taken_seq = self._seq
+            return self._seq, self._frame
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class RateCounter:
+    """นับอัตราเหตุการณ์ต่อวินาทีในหน้าต่างเวลาล่าสุด"""
+
+    def __init__(self, window: float = 2.0):
+        self.window = window
+        self._ticks = deque()
+        self._lock = threading.Lock()
+
+    def tick(self):
+        now = time.monotonic()
+        with self._lock:
+            self._ticks.append(now)
+            self._trim(now)
+
+    def rate(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if len(self._ticks) < 2:
+                return 0.0
+            span = now - self._ticks[0]
+            return (len(self._ticks) - 1) / span if span > 0 else 0.0
+
+    def _trim(self, now):
+        while self._ticks and now - self._ticks[0] > self.window:
+            self._ticks.popleft()
+
+
+class CapturePipeline:
+    """
+    Producer/Consumer สำหรับหน้าสแกน
+    - Capture Thread: อ่านกล้องตลอดเวลา เขียนลง LatestFrameSlot
+    - Recognition Worker: หยิบเฟรมล่าสุดไปประมวลผล (ช้าแค่ไหนก็ไม่บล็อกจอ)
+    - Render Loop (เธรดหลัก): ใช้ latest_frame() + latest_result() วาดภาพ
+    """
+
+    def __init__(self, capture, process_fn, empty_result=None, every_n_fn=None):
+        self.capture = capture
+        self.process_fn = process_fn
+        # ฟังก์ชันบอกว่าให้เว้นกี่เฟรมก่อนประมวลผลครั้งถัดไป (เช่น AdaptiveFrameScheduler)
+        self.every_n_fn = every_n_fn
+        self.slot = LatestFrameSlot()
+
+        self._result = empty_result
+        self._result_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+        self.capture_rate = RateCounter()
+        self.recognition_rate = RateCounter()
+        self.capture_failed = False
+        self.error = None
+        self.metrics = get_metrics()
+
+    def start(self):
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._recognition_loop, name="recognition", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.slot.close()
+        for t in self._threads:
+            t.join(timeout=2.0)
+        self._threads = []
+
+    @property
+    def running(self):
+        return not self._stop.is_set() and not self.capture_failed
+
+    def _capture_loop(self):
+        while not self._stop.is_set():
+            with self.metrics.timer("scan_stage_seconds", stage="capture"):
+                ret, frame = self.capture.read()
+            if not ret:
+                self.capture_failed = True
+                self.slot.close()
+                break
+            self.capture_rate.tick()
+            self.slot.put(frame)
+
+    def _recognition_loop(self):
+        last_seq = 0
+        while not self._stop.is_set():
+            every_n = self.every_n_fn() if self.every_n_fn else 1
+            seq, frame = self.slot.wait_newer(last_seq + every_n - 1, timeout=0.5)
+            if frame is None:
+                if self.slot.closed:
+                    break
+                continue
+            last_seq = seq
+            try:
+                result = self.process_fn(frame)
+            except Exception as e:
+                print(f"❌ Recognition worker error: {e}")
+                self.error = e
+                continue
+            with self._result_lock:
+                self._result = result
+            self.recognition_rate.tick()
+
+    def latest_frame(self):
+        return self.slot.peek()
+
+    def latest_result(self):
+        with self._result_lock:
+            return self._result
+
+    def stats(self):
+        return {
+            "capture_fps": self.capture_rate.rate(),
+            "recognition_fps": self.recognition_rate.rate(),
+            "frames_dropped": self.slot.dropped,
+        }
@@ -11,44 +11,143 @@ LINE_USER_ID = "Uaa30a62f505cfb7a3e546ed644e4755f"
 # =========================================
 WEBAPP_URL = "https://script.google.com/macros/s/AKfycbzbxWYrMm4hLpA70R3MqH9_St1djR3P-DDduRYsnpXxjWBDxCf0zjSfVxD_Ycjl6vzS/exec"
 SHEET_NAME = "Patient"
-OFFLINE_LOG_FILE = "offline_logs.json"
+OFFLINE_LOG_FILE = "offline_logs.jsonl"      # Journal ต่อท้ายทีละบรรทัด
+OFFLINE_LEGACY_FILE = "offline_logs.json"     # ไฟล์แบบเก่า (ย้ายให้อัตโนมัติ)
+OFFLINE_FSYNC_POLICY = "always"               # "always" / "batch" / "never"
+OFFLINE_COMPACT_BYTES = 64 * 1024             # ส่วนที่ส่งแล้วเกินเท่านี้ค่อย Compact
+WEBAPP_BATCH_SIZE = 50                        # ส่ง Log ย้อนหลังได้สูงสุดกี่แถวต่อ Request
+WEBAPP_BATCH_TIMEOUT = 10                     # วินาที (Batch ใหญ่กว่าแถวเดียว)
+# ซิงก์ Dose Ledger แบบ Delta (ส่งเฉพาะ seq ที่เซิร์ฟเวอร์ยังไม่มี ส่งซ้ำได้ไม่เกิดแถวซ้ำ)
+SYNC_ENABLED = True                           # False = ส่ง Log แบบเดิม (แถวเดียว + Offline Queue)
+SYNC_BATCH_SIZE = 50
+SYNC_TIMEOUT = 10
+
+# =========================================
+# 🌐 OUTBOUND HTTP (Session กลาง + Connection Pool)
+# =========================================
+HTTP_POOL_SIZE = 4
+HTTP_MAX_WORKERS = 2              # จำนวน Thread เบื้องหลังสูงสุด (ส่ง Log / LINE)
+HTTP_RETRIES = 1                  # ลองใหม่กี่ครั้งเมื่อเน็ตหลุด / 5xx (POST: เฉพาะตอนต่อไม่ติด / 429)
+HTTP_BACKOFF_BASE = 0.3           # วินาที (Exponential Backoff + Jitter)
+HTTP_HOST_TIMEOUTS = {            # (connect, read) วินาที แยกตาม Host
+    "script.google.com": (3, 10),
+    "api.line.me": (3, 5),
+}
 
 # =========================================
 # 🔌 HARDWARE & SERIAL (ESP32)
 # =========================================
 SERIAL_PORT = "/dev/ttyUSB0" 
 SERIAL_BAUDRATE = 115200
+SERIAL_PORT_CANDIDATES = ["/dev/ttyUSB*", "/dev/ttyACM*"]   # ลองพอร์ตเหล่านี้ถ้า USB เปลี่ยนชื่อ
+ESP32_COMMAND_TIMEOUT = 8.0     # วินาที รอ ESP32 ตอบว่าจ่ายยาเสร็จ (เฟิร์มแวร์ตัดเองที่ 5 วินาที)
+ESP32_QUEUE_TIMEOUT = 5.0       # คำสั่งรอต่อพอร์ตนานกว่านี้ให้ยกเลิก (กันจ่ายยาย้อนหลัง)
 
 # =========================================
 # 👤 FACE RECOGNITION SETTINGS
 # =========================================
 KNOWN_IMAGE_PATH = "patient.jpeg"
+GALLERY_PATH = "face_gallery.npz"   # คลัง Encoding ผู้ป่วยทุกคน (Matrix float32)
+ENCODING_CACHE_DIR = ".encoding_cache"   # แคช Encoding ของรูปต้นแบบ (ไม่ต้องรัน dlib ซ้ำ)
+FACE_ENCODING_MODEL = "small"
+FACE_UPSAMPLE = 1
+
+# ตัวตรวจจับใบหน้า: "hog" (dlib), "mediapipe", "yunet", "dnn" (OpenCV Res10-SSD)
+FACE_DETECTOR = "hog"
+DETECTOR_MIN_CONFIDENCE = 0.6
+YUNET_MODEL_PATH = "models/face_detection_yunet_2023mar.onnx"
+DNN_PROTOTXT_PATH = "models/deploy.prototxt"
+DNN_MODEL_PATH = "models/res10_300x300_ssd_iter_140000.caffemodel"
 KNOWN_NAME = "patient"
 FACE_ID = "patient_001"
 
 TOLERANCE = 0.45
 HOLD_SECONDS = 3.0
 
+# Track-then-Verify: ตรวจจับครั้งเดียว แล้วตามด้วย KLT เข้ารหัสใหม่เมื่อจำเป็น
+TRACKING_MODE = True
+TRACK_MAX_DRIFT = 0.35          # กล่องเลื่อนเกินกี่เท่าของขนาดหน้า -> เข้ารหัสใหม่
+TRACK_MIN_CONFIDENCE = 0.5      # สัดส่วนจุดที่ตามได้ต่ำกว่านี้ -> ตรวจจับใหม่ทั้งเฟรม
+TRACK_REVERIFY_SECONDS = 1.0    # ยืนยันตัวตนซ้ำอย่างน้อยทุกกี่วินาที
+
+# จับคู่กับภาพอ้างอิงหลายภาพ: "all" = ใกล้ที่สุดจากทุกภาพ, "centroid" = เทียบกับค่าเฉลี่ยของคนนั้น
+MATCH_MODE = "all"
+
+# ลงทะเบียนแบบหลายภาพ (ถ่ายต่อเนื่องแล้วเลือกภาพที่ดีที่สุด)
+ENROLL_BURST_FRAMES = 12          # จำนวนเฟรมที่ถ่ายต่อเนื่องหลังนับถอยหลัง
+ENROLL_TOP_K = 5                  # เก็บ Encoding ไว้กี่ภาพ
+ENROLL_MIN_DISTANCE = 0.06        # ภาพที่ใกล้กันกว่านี้ถือว่าซ้ำ ไม่เก็บ
+ENROLL_MIN_FACE_FRACTION = 0.15   # หน้าต้องสูงอย่างน้อยกี่ส่วนของภาพ
+ENROLL_MAX_YAW = 0.35             # หันข้างได้ไม่เกินเท่านี้ (จมูกเยื้องจากกึ่งกลางตา / ระยะห่างตา)
+
+# ตรวจจับมือ (แบมือค้างไว้เพื่อเริ่มถ่ายรูป) ในหน้าลงทะเบียน
+GESTURE_PROCESS_WIDTH = 320       # ย่อภาพเหลือกว้างเท่านี้ก่อนส่งเข้า MediaPipe
+GESTURE_MAX_RATE = 10.0           # ตรวจมือได้สูงสุดกี่ครั้งต่อวินาที
+
+# ROI Detection: ค้นหาหน้าเฉพาะรอบกล่องล่าสุดก่อน ไม่เจอค่อยค้นทั้งเฟรม
+ROI_MODE = True
+ROI_PADDING = 0.6               # ขยายกล่องออกไปด้านละกี่เท่าของขนาดหน้า
+
 # =========================================
 # 📷 CAMERA SETTINGS
 # =========================================
 CAMERA_INDEX = 0
 FRAME_WIDTH = 1280
 FRAME_HEIGHT = 720
+# กล้องเปิดค้างไว้ใช้ร่วมกันระหว่างสแกน / ลงทะเบียน (ไม่ต้องรอกล้องปรับแสงใหม่ทุกครั้ง)
+CAMERA_IDLE_TIMEOUT = 300.0      # วินาที: ไม่มีใครใช้นานเท่านี้ -> ปิดกล้อง
+CAMERA_IDLE_FPS = 2.0            # ระหว่างว่าง grab() ช้าๆ ให้กล้องปรับแสงค้างไว้ (ไม่ถอดรหัสภาพ)
+CAMERA_PREWARM_MINUTES = 5       # เปิดกล้องรอไว้ก่อนถึงเวลายา (None = ไม่เปิดล่วงหน้า)
+
+# ปรับความถี่การจดจำใบหน้าอัตโนมัติ (Adaptive Frame Skip)
+TARGET_DISPLAY_FPS = 20.0        # FPS ของจอที่อยากรักษาไว้
+SCHED_MIN_EVERY_N = 1            # ถี่สุด: ทุกเฟรม (ใช้ตอนกำลังถือค้าง)
+SCHED_MAX_EVERY_N = 8            # ห่างสุด: ตอนไม่มีใครอยู่หน้ากล้อง
+SCHED_IDLE_SECONDS = 3.0         # ไม่เจอหน้านานเท่านี้ -> ถอยไปใช้ค่าห่างสุด
+SCHED_LATENCY_SMOOTHING = 0.3    # น้ำหนักค่าเฉลี่ย Latency (EWMA)
+SCHEDULER_TRACE_FILE = "scan_trace.jsonl"   # None = ไม่บันทึก trace
+SESSION_RECORD_DIR = None              # เช่น "recordings" = บันทึกทุกการสแกนไว้เล่นซ้ำด้วย bench_replay.py
 
 # =========================================
 # ⏰ ALARM & UI SETTINGS
 # =========================================
 ALARM_HOUR = 20
 ALARM_MINUTE = 0
+# เวลาทานยาทุกรอบของวัน ("HH:MM") เช่น ["08:00", "20:00"]
+DOSE_TIMES = [f"{ALARM_HOUR:02d}:{ALARM_MINUTE:02d}"]
+DOSE_FOLLOWUP_MINUTES = [15, 30]   # เตือนซ้ำทาง LINE ถ้ายังไม่สแกน (นาทีหลังเวลายา)
+DOSE_MISSED_AFTER_MINUTES = 60     # เลยเวลานี้ถือว่าพลาดรอบนั้น (แจ้งผู้ดูแล)
+DOSE_CATCHUP_MINUTES = 120         # เปิดเครื่องหลังเวลายาไม่เกินนี้ -> ยังแจ้งเตือน/แจ้งพลาดย้อนหลัง
+DOSE_EARLY_MINUTES = 60            # สแกนก่อนเวลายาได้ไม่เกินนี้ (นับเป็นรอบนั้น)
 BG_IMAGE_PATH = "bg.png"
+UI_THEME = "tuberbox"             # ธีมสีหน้าจอสแกน / ลงทะเบียน (ดู ui_overlay.THEMES)
+STARTUP_PROFILE_FILE = "startup_profile.jsonl"   # None = ไม่บันทึกเวลาเปิดโปรแกรม
+
+# =========================================
+# 📈 METRICS (Latency / Counter ของระบบ)
+# =========================================
+METRICS_ENABLED = True             # False = ปิดทั้งหมด (ใช้ NullMetrics ไม่มี Overhead)
+METRICS_HOST = "127.0.0.1"         # เปิดเฉพาะในเครื่อง
+METRICS_PORT = 9108                # GET /metrics (Prometheus) และ /metrics.json, None = ไม่เปิด HTTP
+METRICS_DUMP_FILE = "metrics.json" # None = ไม่ Dump ไฟล์
+METRICS_DUMP_INTERVAL = 30.0       # วินาที
+METRICS_WINDOW = 500               # จำนวนค่าล่าสุดที่ใช้คำนวณ p50/p95
 
 # =========================================
 # ⏱️ TIMEOUT SETTINGS (เพิ่มส่วนนี้)
 # =========================================
 SCAN_TIMEOUT = 20.0
+DOSE_ACK_TIMEOUT = 20.0      # รอ ESP32 ยืนยันว่าจ่ายยาเสร็จ
+DOSE_UPLOAD_TIMEOUT = 15.0   # ส่ง Log ขึ้น Sheet (รวมส่งของค้างใน Offline Queue)
+DOSE_NOTIFY_TIMEOUT = 10.0   # แจ้ง LINE
 
 # =========================================
-# 💊 DATA STORAGE (AUTO SAVE)
+# 💊 DATA STORAGE
 # =========================================
+# ค่าที่เปลี่ยนระหว่างใช้งาน (EAT_DAYS / SHEET_NAME / KNOWN_NAME / ข้อมูลผู้ป่วย) เก็บใน STATE_FILE
+# ค่าในไฟล์นี้ใช้เป็นค่าเริ่มต้นตอนยังไม่มี STATE_FILE เท่านั้น (โปรแกรมไม่เขียนทับ config.py อีกแล้ว)
+STATE_FILE = "state.json"
+LEDGER_FILE = "doses.db"                 # SQLite: ประวัติการทานยาในเครื่อง (สถิติ / Streak บนหน้าจอ)
+DOSE_EVENTS_FILE = "dose_events.jsonl"   # บันทึกทุก Dose (ผลของแต่ละขั้นตอน) None = ไม่บันทึก
+DOSE_NOTIFY_SUCCESS = False              # True = แจ้ง LINE ทุกครั้งที่จ่ายยาสำเร็จ (ปกติแจ้งเฉพาะตอนจ่ายไม่สำเร็จ)
 EAT_DAYS = 0
\ No newline at end of file
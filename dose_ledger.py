@@ -0,0 +1,337 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+
+import config
+
+# สถานะที่นับว่า "ได้รับยาแล้ว" (partial = จ่ายยาสำเร็จ แต่ส่ง Sheet / แจ้งเตือนไม่สำเร็จ)
+# failed (จ่ายยาไม่สำเร็จ) / cancelled / running (ยังไม่จบ) ไม่นับในสถิติการทานยา
+TAKEN_STATUSES = ("ok", "partial")
+_TAKEN_SQL = "status IN (" + ", ".join(f"'{s}'" for s in TAKEN_STATUSES) + ")"
+
+# สถานะ upload ที่ถือว่าแถวถึง Sheet แล้ว / รอส่งใน Offline Journal (ทางเดิม) ห้ามส่งซ้ำทางอื่น
+DELIVERED_UPLOADS = ("synced", "done", "queued")
+_DELIVERED_SQL = "(" + ", ".join(f"'{s}'" for s in DELIVERED_UPLOADS) + ")"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS doses (
+    id        INTEGER PRIMARY KEY,
+    seq       INTEGER,           -- ลำดับต่อเครื่อง เพิ่มขึ้นเรื่อยๆ (ใช้ซิงก์กับ Sheet)
+    dose_id   TEXT UNIQUE,
+    patient   TEXT NOT NULL,
+    sheet     TEXT,
+    slot      TEXT,              -- รอบยา "YYYY-MM-DD HH:MM" (NULL = สแกนนอกช่วงเวลายา)
+    taken_at  TEXT NOT NULL,     -- เวลาท้องถิ่น "YYYY-MM-DD HH:MM:SS"
+    day       TEXT NOT NULL,     -- "YYYY-MM-DD" ใช้นับรายวัน
+    distance  REAL,              -- ระยะใบหน้าตอนยืนยันตัวตน (ยิ่งน้อยยิ่งมั่นใจ)
+    dispense  TEXT,              -- ผลการจ่ายยา (สถานะ ack ของ ESP32)
+    upload    TEXT,              -- สถานะการส่งขึ้น Sheet: done / queued / error ...
+    status    TEXT,              -- สถานะรวมของ Dose: running / ok / partial / failed / cancelled
+    duration  REAL,
+    note      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_doses_patient_time ON doses(patient, taken_at);
+CREATE INDEX IF NOT EXISTS idx_doses_patient_day ON doses(patient, day);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key       TEXT PRIMARY KEY,
+    value     TEXT
+);
+
+CREATE TABLE IF NOT EXISTS missed (
+    patient   TEXT NOT NULL,
+    slot      TEXT NOT NULL,
+    noted_at  TEXT NOT NULL,
+    PRIMARY KEY (patient, slot)
+);
+"""
+
+
+class DoseLedger:
+    """
+    สมุดบันทึกการทานยาในเครื่อง (SQLite) สำหรับสถิติการทานยาโดยไม่ต้องพึ่งเน็ต
+    - add(): บันทึก DoseRecord จาก DoseOrchestrator (dose_id ซ้ำ = อัปเดตแถวเดิม)
+    - record_missed(): รอบที่ DoseScheduler แจ้งว่าพลาด
+    - streak() / daily_counts() / missed_doses() / adherence(): ใช้ Index (patient, เวลา) ตอบในระดับมิลลิวินาที
+    ใช้ Connection เดียวร่วมกันทุกเธรด (ป้องกันด้วย Lock) โหมด WAL อ่านไม่บล็อกการเขียน
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+
+    def _migrate(self):
+        """
+        Ledger ที่สร้างก่อนมีการซิงก์: เพิ่มคอลัมน์ seq / note แล้วไล่ลำดับตามแถวเดิม
+        แถวเดิมถูกส่งขึ้น Sheet ทางเดิม (ทีละแถว / Offline Journal) ไปแล้ว -> นับเป็นซิงก์แล้ว ไม่ส่งซ้ำ
+        """
+        columns = {r[1] for r in self._conn.execute("PRAGMA table_info(doses)")}
+        for name, kind in (("seq", "INTEGER"), ("note", "TEXT")):
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE doses ADD COLUMN {name} {kind}")
+        self._conn.execute("UPDATE doses SET seq = id WHERE seq IS NULL")
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_doses_seq ON doses(seq)")
+        if "seq" not in columns:
+            last = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM doses").fetchone()[0]
+            self._raise_synced(last)
+            if last:
+                print(f"📒 Ledger เดิม {last} รายการถูกส่งทางเดิมแล้ว เริ่มซิงก์ต่อจาก seq {last}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---------- Meta (device id / ตำแหน่งที่ซิงก์แล้ว) ----------
+    def _get_meta(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _raise_synced(self, seq):
+        """เลื่อน High-water mark ในเครื่องขึ้น (ไม่ถอยหลัง) สำหรับแถวที่ส่งทางอื่นไปแล้ว"""
+        if seq > int(self._get_meta("synced_seq", 0)):
+            self._set_meta("synced_seq", seq)
+
+    def device_id(self) -> str:
+        """รหัสเครื่อง สร้างครั้งแรกแล้วเก็บไว้ใน Ledger (Ledger ใหม่ = เครื่องใหม่ ลำดับ seq ไม่ชนของเดิม)"""
+        with self._lock, self._conn:
+            device = self._get_meta("device_id")
+            if device is None:
+                device = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+                self._set_meta("device_id", device)
+            return device
+
+    # ---------- Write ----------
+    def add(self, record):
+        """
+        บันทึก DoseRecord (หรือ dict จาก record.to_dict())
+        แถวใหม่ได้ seq ถัดไป / dose_id เดิม = อัปเดตผลของขั้นตอน (seq เดิม ไม่ต้องซิงก์ใหม่)
+        """
+        data = record.to_dict() if hasattr(record, "to_dict") else record
+        steps = data.get("steps", {})
+        dispense = steps.get("ack", {}).get("status")
+        upload = steps.get("upload", {}).get("status")
+        with self._lock, self._conn:
+            updated = self._conn.execute(
+                f"""UPDATE doses SET dispense = ?, status = ?, duration = ?,
+                       upload = CASE
+                           WHEN upload = 'synced' THEN upload
+                           WHEN upload IN {_DELIVERED_SQL} AND COALESCE(?, '') NOT IN {_DELIVERED_SQL} THEN upload
+                           ELSE COALESCE(?, upload) END
+                   WHERE dose_id = ?""",
+                (dispense, data.get("status"), data.get("duration"), upload, upload, data["dose_id"]),
+            ).rowcount
+            if updated:
+                return
+            seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM doses").fetchone()[0]
+            taken_at = data["verified_at"]
+            self._conn.execute(
+                """INSERT INTO doses (seq, dose_id, patient, sheet, slot, taken_at, day, distance, dispense, upload, status, duration, note)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    seq, data["dose_id"], data["patient"], data.get("sheet"), data.get("slot"),
+                    taken_at, taken_at[:10], data.get("distance"), dispense, upload,
+                    data.get("status"), data.get("duration"), data.get("note"),
+                ),
+            )
+
+    def set_upload(self, dose_id: str, status: str):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE doses SET upload = ? WHERE dose_id = ?", (status, dose_id))
+
+    # ---------- Sync ----------
+    @property
+    def synced_seq(self) -> int:
+        """High-water mark ล่าสุดที่เซิร์ฟเวอร์ยืนยัน (seq ที่ <= ค่านี้ถูกเขียนลง Sheet แล้ว)"""
+        with self._lock:
+            return int(self._get_meta("synced_seq", 0))
+
+    def unsynced(self, limit: int = 50):
+        """แถวที่ยังไม่ได้ซิงก์ เรียงตาม seq"""
+        with self._lock:
+            after = int(self._get_meta("synced_seq", 0))
+            rows = self._conn.execute(
+                "SELECT * FROM doses WHERE seq > ? ORDER BY seq LIMIT ?", (after, limit)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def last_seq(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM doses").fetchone()[0]
+
+    def pending_count(self) -> int:
+        with self._lock:
+            after = int(self._get_meta("synced_seq", 0))
+            return self._conn.execute("SELECT COUNT(*) FROM doses WHERE seq > ?", (after,)).fetchone()[0]
+
+    def mark_synced(self, hwm: int):
+        """บันทึก High-water mark จากเซิร์ฟเวอร์ (ค่าน้อยกว่าเดิมก็รับ = เซิร์ฟเวอร์ขอให้ส่งตั้งแต่ตรงนั้นใหม่)"""
+        with self._lock, self._conn:
+            # ไม่เกินแถวที่มีอยู่จริง (เช่นเซิร์ฟเวอร์จำ hwm ของ Ledger เก่าที่ใช้ device id เดียวกัน)
+            hwm = min(hwm, self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM doses").fetchone()[0])
+            previous = int(self._get_meta("synced_seq", 0))
+            self._set_meta("synced_seq", hwm)
+            if hwm > previous:
+                self._conn.execute("UPDATE doses SET upload = 'synced' WHERE seq > ? AND seq <= ?", (previous, hwm))
+
+    def claim_for_legacy(self, dose_id: str) -> bool:
+        """
+        จองแถวไว้ส่งทางเดิม (ทีละแถว / Offline Journal) ตอนเซิร์ฟเวอร์ไม่รองรับการซิงก์
+        คืน False ถ้าแถวนี้ถูกซิงก์ / ส่ง / จองไปแล้ว (ไม่ต้องส่งซ้ำ) ไม่มีแถวใน Ledger = True
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT seq FROM doses WHERE dose_id = ?", (dose_id,)).fetchone()
+            if row is None:
+                return True
+            return self._conn.execute(
+                f"""UPDATE doses SET upload = 'queued'
+                   WHERE dose_id = ? AND seq > ? AND COALESCE(upload, '') NOT IN {_DELIVERED_SQL}""",
+                (dose_id, int(self._get_meta("synced_seq", 0))),
+            ).rowcount == 1
+
+    def advance_delivered(self) -> int:
+        """เลื่อน High-water mark ผ่านแถวที่ติดกันซึ่งส่งทางเดิมแล้วเท่านั้น (แถวที่ยังไม่ได้ส่งจะหยุดไว้) คืนค่าใหม่"""
+        with self._lock, self._conn:
+            hwm = int(self._get_meta("synced_seq", 0))
+            for seq, upload in self._conn.execute("SELECT seq, upload FROM doses WHERE seq > ? ORDER BY seq", (hwm,)):
+                if upload not in DELIVERED_UPLOADS:
+                    break
+                hwm = seq
+            self._raise_synced(hwm)
+            return hwm
+
+    def record_missed(self, patient: str, slot: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO missed (patient, slot, noted_at) VALUES (?, ?, ?)",
+                (patient, slot, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            )
+
+    def import_events(self, events_file: str):
+        """
+        นำเข้าจาก DOSE_EVENTS_FILE (JSON Lines) ที่บันทึกไว้ก่อนมี Ledger (dose_id ซ้ำจะถูกข้าม)
+        Dose เหล่านี้ถูกส่งขึ้น Sheet ทางเดิมไปแล้ว จึงนับเป็นซิงก์แล้วด้วย
+        """
+        if not events_file or not os.path.exists(events_file):
+            return 0
+        count = 0
+        with open(events_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    self.add(json.loads(line))
+                    count += 1
+                except (ValueError, KeyError):
+                    continue
+        if count:
+            with self._lock, self._conn:
+                self._raise_synced(self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM doses").fetchone()[0])
+        return count
+
+    # ---------- Queries ----------
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def count(self, patient: str) -> int:
+        return self._query(f"SELECT COUNT(*) FROM doses WHERE patient = ? AND {_TAKEN_SQL}", (patient,))[0][0]
+
+    def recent(self, patient: str, limit: int = 10):
+        rows = self._query(
+            "SELECT * FROM doses WHERE patient = ? ORDER BY taken_at DESC LIMIT ?", (patient, limit)
+        )
+        return [dict(r) for r in rows]
+
+    def daily_counts(self, patient: str, days: int = 7, today: date | None = None):
+        """[(วันที่, จำนวนครั้ง), ...] ของ days วันล่าสุด (รวมวันที่ไม่ได้ทานเป็น 0) เรียงจากเก่าไปใหม่"""
+        today = today or date.today()
+        first = today - timedelta(days=days - 1)
+        rows = self._query(
+            f"""SELECT day, COUNT(*) FROM doses
+               WHERE patient = ? AND day >= ? AND day <= ? AND {_TAKEN_SQL}
+               GROUP BY day""",
+            (patient, first.isoformat(), today.isoformat()),
+        )
+        counts = dict(rows)
+        return [((first + timedelta(days=i)).isoformat(), counts.get((first + timedelta(days=i)).isoformat(), 0)) for i in range(days)]
+
+    def streak(self, patient: str, doses_per_day: int = 1, today: date | None = None) -> int:
+        """
+        จำนวนวันติดต่อกันที่ทานครบ doses_per_day ครั้ง นับย้อนจากวันนี้
+        (ถ้าวันนี้ยังไม่ครบ เริ่มนับจากเมื่อวาน วันนี้ยังไม่จบจึงไม่ตัด Streak)
+        """
+        today = today or date.today()
+        rows = self._query(
+            f"""SELECT day FROM doses
+               WHERE patient = ? AND day <= ? AND {_TAKEN_SQL}
+               GROUP BY day HAVING COUNT(*) >= ?
+               ORDER BY day DESC LIMIT 400""",
+            (patient, today.isoformat(), doses_per_day),
+        )
+        days = [r[0] for r in rows]
+        expected = today if days and days[0] == today.isoformat() else today - timedelta(days=1)
+        streak = 0
+        for day in days:
+            if day != expected.isoformat():
+                break
+            streak += 1
+            expected -= timedelta(days=1)
+        return streak
+
+    def missed_doses(self, patient: str, days: int = 30, today: date | None = None):
+        """รอบที่พลาด (และไม่ได้ทานย้อนหลังในรอบนั้น) ใน days วันล่าสุด เรียงจากใหม่ไปเก่า"""
+        today = today or date.today()
+        first = (today - timedelta(days=days - 1)).isoformat()
+        rows = self._query(
+            f"""SELECT m.slot FROM missed m
+               WHERE m.patient = ? AND m.slot >= ?
+                 AND NOT EXISTS (SELECT 1 FROM doses d WHERE d.patient = m.patient AND d.slot = m.slot AND d.{_TAKEN_SQL})
+               ORDER BY m.slot DESC""",
+            (patient, first),
+        )
+        return [r[0] for r in rows]
+
+    def adherence(self, patient: str, days: int = 7, doses_per_day: int = 1, today: date | None = None) -> float:
+        """สัดส่วนวันที่ทานครบใน days วันล่าสุด (0-1)"""
+        counts = self.daily_counts(patient, days, today)
+        return sum(1 for _, n in counts if n >= doses_per_day) / days if days else 0.0
+
+    def summary(self, patient: str, doses_per_day: int = 1, today: date | None = None):
+        """ค่าที่หน้าจอหลักใช้แสดง (อ่านครั้งเดียวจบ)"""
+        return {
+            "total": self.count(patient),
+            "streak": self.streak(patient, doses_per_day, today),
+            "week": self.daily_counts(patient, 7, today),
+            "adherence_7d": self.adherence(patient, 7, doses_per_day, today),
+            "missed_30d": len(self.missed_doses(patient, 30, today)),
+        }
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_dose_ledger() -> DoseLedger:
+    """คืน DoseLedger ตัวเดียวที่ใช้ร่วมกันทั้งโปรแกรม (ครั้งแรกนำเข้า DOSE_EVENTS_FILE เดิมให้ด้วย)"""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            is_new = not os.path.exists(config.LEDGER_FILE)
+            _ledger = DoseLedger(config.LEDGER_FILE)
+            if is_new and config.DOSE_EVENTS_FILE:
+                imported = _ledger.import_events(config.DOSE_EVENTS_FILE)
+                if imported:
+                    print(f"📒 นำเข้าประวัติการทานยา {imported} รายการจาก {config.DOSE_EVENTS_FILE}")
+        return _ledger
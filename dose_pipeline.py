@@ -0,0 +1,257 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from metrics import get_metrics
+
+# สถานะของขั้นตอนที่ไม่ถือว่าล้มเหลว (queued = ส่งไม่ได้แต่เก็บลง Offline Queue แล้ว,
+# pending = ซิงก์ไม่ได้แต่อยู่ใน Dose Ledger แล้ว จะซิงก์ขึ้นไปรอบหน้า)
+OK_STATUSES = ("done", "skipped", "queued", "pending")
+
+
+class DoseRecord:
+    """บันทึกเหตุการณ์ของการทานยาหนึ่งครั้ง: ใคร / รอบไหน / แต่ละขั้นตอนใช้เวลาเท่าไร ได้ผลอะไร"""
+
+    def __init__(self, patient, sheet, slot=None, note="Face verified", distance=None):
+        self.dose_id = uuid.uuid4().hex[:12]
+        self.patient = patient
+        self.sheet = sheet
+        self.slot = slot
+        self.note = note
+        self.distance = distance
+        self.verified_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.status = "running"
+        self.steps = {}
+        self._t0 = time.perf_counter()
+        self.duration = None
+
+    def step_done(self, name, status, started, detail=""):
+        self.steps[name] = {
+            "status": status,
+            "seconds": round(time.perf_counter() - started, 3),
+            "detail": detail,
+        }
+
+    def ok(self, name):
+        return self.steps.get(name, {}).get("status") in OK_STATUSES
+
+    def finish(self, status=None):
+        self.duration = round(time.perf_counter() - self._t0, 3)
+        if status is None:
+            failed = [n for n, s in self.steps.items() if s["status"] not in OK_STATUSES]
+            status = "ok" if not failed else ("failed" if "ack" in failed or "persist" in failed else "partial")
+        self.status = status
+        return self
+
+    def to_dict(self):
+        return {
+            "dose_id": self.dose_id,
+            "patient": self.patient,
+            "sheet": self.sheet,
+            "slot": self.slot,
+            "note": self.note,
+            "distance": self.distance,
+            "verified_at": self.verified_at,
+            "status": self.status,
+            "duration": self.duration,
+            "steps": self.steps,
+        }
+
+
+class DoseOrchestrator:
+    """
+    ลำดับงานหลังสแกนผ่าน (หนึ่ง Dose = หนึ่ง Pipeline) บน asyncio Event Loop ของตัวเอง (เธรด dose-loop)
+    - dispense -> ack: สั่ง ESP32 แล้วรอเฟิร์มแวร์รายงานว่าจ่ายเสร็จ
+    - persist: บันทึกจำนวนวัน / รอบยาลง State Store
+    - upload: ส่ง Log ขึ้น Google Sheet (ส่งไม่ได้ -> Offline Queue)
+    สามงานนี้ทำพร้อมกัน แต่ละงานมี Timeout ของตัวเอง แล้วจึง notify (แจ้ง LINE) ตามผลของการจ่ายยา
+    submit() เรียกได้จากทุกเธรด คืน concurrent.futures.Future[DoseRecord]
+    ฟังก์ชันที่ส่งเข้ามาเป็นแบบ Blocking ธรรมดา (รันผ่าน asyncio.to_thread)
+    """
+
+    def __init__(
+        self,
+        dispense_fn,
+        persist_fn,
+        upload_fn,
+        notify_fn=None,
+        ack_timeout: float = 20.0,
+        persist_timeout: float = 5.0,
+        upload_timeout: float = 15.0,
+        notify_timeout: float = 10.0,
+        notify_success: bool = False,
+        events_file: str | None = None,
+        ledger=None,
+        history: int = 50,
+    ):
+        self.dispense_fn = dispense_fn
+        self.persist_fn = persist_fn
+        self.upload_fn = upload_fn
+        self.notify_fn = notify_fn
+        self.ack_timeout = ack_timeout
+        self.persist_timeout = persist_timeout
+        self.upload_timeout = upload_timeout
+        self.notify_timeout = notify_timeout
+        self.notify_success = notify_success
+        self.events_file = events_file
+        self.ledger = ledger
+        self.records = deque(maxlen=history)
+        self.metrics = get_metrics()
+
+        self._loop = asyncio.new_event_loop()
+        self._tasks = {}
+        self._file_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="dose-loop", daemon=True)
+        self._thread.start()
+
+    # ---------- Public API (ทุกเธรด) ----------
+    def submit(self, patient, sheet, slot=None, note="Face verified", distance=None):
+        record = DoseRecord(patient, sheet, slot=slot, note=note, distance=distance)
+        print(f"💊 เริ่มขั้นตอนจ่ายยา {record.dose_id} ({patient}{', รอบ ' + slot if slot else ''})")
+        return asyncio.run_coroutine_threadsafe(self._run(record), self._loop)
+
+    def cancel(self, dose_id):
+        self._loop.call_soon_threadsafe(self._cancel_task, dose_id)
+
+    def shutdown(self, timeout: float = 3.0):
+        """ยกเลิกงานที่ค้าง (บันทึกสถานะ cancelled) แล้วหยุด Event Loop"""
+        if not self._loop.is_running():
+            return
+        future = asyncio.run_coroutine_threadsafe(self._cancel_all(), self._loop)
+        try:
+            future.result(timeout)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
+    # ---------- Event Loop ----------
+    def _cancel_task(self, dose_id):
+        task = self._tasks.get(dose_id)
+        if task is not None:
+            task.cancel()
+
+    async def _cancel_all(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, record):
+        self._tasks[record.dose_id] = asyncio.current_task()
+        try:
+            # ลง Ledger ก่อนเริ่ม (ได้ seq) ขั้น upload จึงซิงก์แถวนี้ขึ้นไปพร้อมของที่ค้างได้เลย
+            await self._add_to_ledger(record)
+            await asyncio.gather(
+                self._dispense(record),
+                self._step(record, "persist", self.persist_fn, self.persist_timeout),
+                self._step(record, "upload", self.upload_fn, self.upload_timeout),
+            )
+            await self._notify(record)
+            record.finish()
+        except asyncio.CancelledError:
+            record.finish("cancelled")
+            raise
+        finally:
+            self._tasks.pop(record.dose_id, None)
+            # SQLite commit / fsync เป็น Blocking I/O: ทำบนเธรดแยก ไม่ให้ Event Loop ค้าง
+            # shield: ถูกยกเลิกก็ยังบันทึกสถานะ cancelled ให้เสร็จ
+            await asyncio.shield(asyncio.to_thread(self._save, record))
+        return record
+
+    async def _add_to_ledger(self, record):
+        if self.ledger is not None:
+            await asyncio.to_thread(self._ledger_add, record)
+
+    def _ledger_add(self, record):
+        try:
+            self.ledger.add(record)
+        except Exception as e:
+            print(f"❌ บันทึก Dose ลง Ledger ไม่สำเร็จ: {e}")
+
+    async def _step(self, record, name, fn, timeout, *args):
+        """รันฟังก์ชัน Blocking หนึ่งขั้นตอนพร้อม Timeout แล้วบันทึกผล (ไม่โยน Exception ออกไปล้มขั้นอื่น)"""
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(asyncio.to_thread(fn, record, *args), timeout)
+        except asyncio.TimeoutError:
+            record.step_done(name, "timeout", started, f"> {timeout}s")
+            return None
+        except asyncio.CancelledError:
+            record.step_done(name, "cancelled", started)
+            raise
+        except Exception as e:
+            record.step_done(name, "error", started, str(e))
+            return None
+        # None = ข้าม, False = ล้มเหลว, str = สถานะที่ฟังก์ชันบอกมาเอง, อื่นๆ = สำเร็จ
+        if result is None:
+            status = "skipped"
+        elif result is False:
+            status = "error"
+        else:
+            status = result if isinstance(result, str) else "done"
+        record.step_done(name, status, started)
+        return result
+
+    async def _dispense(self, record):
+        # dispense: ใส่คำสั่งลงคิวของไดรเวอร์ (คืน Future หรือ None ถ้าไม่มี ESP32)
+        started = time.perf_counter()
+        try:
+            future = self.dispense_fn(record)
+        except Exception as e:
+            record.step_done("dispense", "error", started, str(e))
+            return
+        if future is None:
+            record.step_done("dispense", "skipped", started, "no ESP32")
+            record.step_done("ack", "skipped", started)
+            return
+        record.step_done("dispense", "done", started)
+
+        # ack: รอเฟิร์มแวร์รายงานผล (ไดรเวอร์มี Timeout ของตัวเองอยู่แล้ว ตรงนี้กันค้างอีกชั้น)
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), self.ack_timeout)
+        except asyncio.TimeoutError:
+            record.step_done("ack", "timeout", started, f"> {self.ack_timeout}s")
+            return
+        record.step_done("ack", "done" if result.ok else "error", started, "" if result.ok else f"{result.status} {result.detail}".strip())
+
+    async def _notify(self, record):
+        if self.notify_fn is None:
+            return
+        if not record.ok("ack"):
+            detail = record.steps.get("ack", record.steps.get("dispense", {})).get("status", "error")
+            message = f"❌ เครื่องจ่ายยาทำงานไม่สำเร็จ ({detail}) ผู้ป่วย {record.patient} กรุณาตรวจสอบเครื่องค่ะ"
+        elif self.notify_success:
+            message = f"💊 {record.patient} สแกนหน้าและรับยาเรียบร้อยแล้วค่ะ"
+        else:
+            return
+        await self._step(record, "notify", self._send_notify, self.notify_timeout, message)
+
+    def _send_notify(self, record, message):
+        self.notify_fn(message)
+        return True
+
+    def _save(self, record):
+        """เรียกบนเธรดแยก (asyncio.to_thread) เท่านั้น"""
+        self.records.append(record)
+        self.metrics.inc("doses_total", status=record.status)
+        for name, step in record.steps.items():
+            self.metrics.observe("dose_step_seconds", step["seconds"], step=name, status=step["status"])
+        print(f"📋 Dose {record.dose_id}: {record.status} ({record.duration}s) "
+              + " | ".join(f"{n}={s['status']}" for n, s in record.steps.items()))
+        if self.ledger is not None:
+            self._ledger_add(record)
+        if not self.events_file:
+            return
+        try:
+            with self._file_lock, open(self.events_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            print(f"❌ บันทึก Dose event ไม่สำเร็จ: {e}")
@@ -0,0 +1,240 @@
+import heapq
+import itertools
+import time
+from datetime import datetime, timedelta
+
+# ชนิดของเหตุการณ์ที่ส่งให้ on_event(kind, slot, **info)
+TICK = "tick"          # ครบวินาที (ใช้อัปเดตนาฬิกาบนจอ) slot = None
+DUE = "due"            # ถึงเวลาทานยา (late=True ถ้ามาช้า เช่นเปิดเครื่องหลังเวลา / ลูปหลักถูกบล็อก)
+FOLLOWUP = "followup"  # เตือนซ้ำเมื่อยังไม่สแกน (info: number)
+MISSED = "missed"      # เลยเวลาที่ยอมรับแล้วยังไม่ทานยา
+TAKEN = "taken"        # บันทึกการทานยาของรอบนั้นแล้ว
+PREWARM = "prewarm"    # อีก prewarm_minutes นาทีจะถึงเวลายา (เช่นเปิดกล้องรอไว้)
+
+
+class DoseSlot:
+    """ยาหนึ่งรอบ เช่น 2026-10-18 20:00"""
+
+    def __init__(self, at: datetime):
+        self.at = at
+        self.id = at.strftime("%Y-%m-%d %H:%M")
+
+    @property
+    def label(self):
+        return self.at.strftime("%H:%M")
+
+    def __repr__(self):
+        return f"DoseSlot({self.id})"
+
+
+def parse_dose_times(values):
+    """["08:00", "20:00"] หรือ [(8, 0), (20, 0)] -> [(8, 0), (20, 0)] เรียงตามเวลา"""
+    times = []
+    for value in values:
+        if isinstance(value, str):
+            hour, minute = (int(x) for x in value.split(":"))
+        else:
+            hour, minute = value
+        times.append((hour, minute))
+    return sorted(set(times))
+
+
+class DoseScheduler:
+    """
+    ตัวจัดตารางเวลาทานยาแบบ Event-driven
+    - คิวเหตุการณ์เป็น Heap เรียงตามเวลา monotonic (ไม่ต้องวนเช็คทุกวินาที)
+    - ผู้ใช้ตั้งตัวจับเวลาตัวเดียว: รอ next_delay() วินาทีแล้วเรียก run_due()
+      เหตุการณ์ที่เลยกำหนดไปแล้ว (เช่นลูปหลักถูกบล็อกระหว่างสแกน) จะถูกส่งตอน run_due() ครั้งถัดไป ไม่หายเงียบ
+    - รองรับหลายรอบต่อวัน / เตือนซ้ำ / แจ้งเมื่อพลาด / ตามเตือนรอบที่เลยเวลาตอนเปิดเครื่อง
+    - wall (เวลาจริง) และ monotonic ฉีดเข้ามาได้ ใช้ทดสอบด้วยนาฬิกาปลอม
+    """
+
+    def __init__(
+        self,
+        dose_times,
+        on_event,
+        followup_minutes=(15, 30),
+        missed_after_minutes: float = 60,
+        catchup_minutes: float = 120,
+        early_minutes: float = 60,
+        taken=(),
+        tick_seconds: float | None = 1.0,
+        wall=time.time,
+        monotonic=time.monotonic,
+        max_clock_jump: float = 5.0,
+        prewarm_minutes: float | None = None,
+    ):
+        self.dose_times = parse_dose_times(dose_times)
+        self.on_event = on_event
+        self.followup_minutes = sorted(m for m in followup_minutes if m < missed_after_minutes)
+        self.missed_after = timedelta(minutes=missed_after_minutes)
+        self.catchup = timedelta(minutes=catchup_minutes)
+        self.early = timedelta(minutes=early_minutes)
+        self.taken = set(taken)
+        self.tick_seconds = tick_seconds
+        self.wall = wall
+        self.monotonic = monotonic
+        self.max_clock_jump = max_clock_jump
+        self.prewarm = timedelta(minutes=prewarm_minutes) if prewarm_minutes else None
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._offset = None     # wall - monotonic ตอนวางแผนล่าสุด (ใช้ตรวจนาฬิกาถูกปรับ)
+        self._fired = set()     # (slot.id, kind, number) ที่ส่งไปแล้ว วางแผนใหม่จะไม่ส่งซ้ำ
+        self._planned_until = None
+
+    # ---------- Time Helpers ----------
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.wall())
+
+    def _deadline(self, at: datetime) -> float:
+        """แปลงเวลาจริงเป็นเวลา monotonic ของเครื่อง"""
+        return self.monotonic() + (at.timestamp() - self.wall())
+
+    def _push(self, deadline, kind, slot=None, **info):
+        heapq.heappush(self._heap, (deadline, next(self._seq), kind, slot, info))
+
+    @staticmethod
+    def _key(kind, slot, info):
+        return (slot.id, kind, info.get("number"))
+
+    def _slots_on(self, day):
+        return [DoseSlot(datetime.combine(day, datetime.min.time()).replace(hour=h, minute=m)) for h, m in self.dose_times]
+
+    # ---------- Planning ----------
+    def start(self):
+        """วางแผนเหตุการณ์ตั้งแต่ตอนนี้ + ตามเตือนรอบที่เลยเวลามาแล้วแต่ยังไม่ทาน"""
+        self._heap.clear()
+        self._offset = self.wall() - self.monotonic()
+        now = self.now()
+
+        for day in (now.date() - timedelta(days=1), now.date()):
+            for slot in self._slots_on(day):
+                if slot.at > now or slot.id in self.taken:
+                    continue
+                overdue = now - slot.at
+                if overdue <= self.missed_after:
+                    self._push(self.monotonic(), DUE, slot, late=True)
+                    self._plan_reminders(slot, after=now)
+                elif overdue <= self.catchup:
+                    self._push(self.monotonic(), MISSED, slot)
+
+        self._planned_until = now.date() - timedelta(days=1)
+        self._plan_days(now)
+        if self.tick_seconds:
+            self._push(self.monotonic(), TICK)
+        return self
+
+    def _plan_days(self, now):
+        """วางแผนรอบที่ยังไม่ถึงเวลาของวันนี้และพรุ่งนี้ (เติมทีละวันเมื่อวันเปลี่ยน)"""
+        last_day = now.date() + timedelta(days=1)
+        day = self._planned_until + timedelta(days=1)
+        while day <= last_day:
+            for slot in self._slots_on(day):
+                if slot.at > now and slot.id not in self.taken:
+                    if self.prewarm is not None:
+                        self._push(self._deadline(max(slot.at - self.prewarm, now)), PREWARM, slot)
+                    self._push(self._deadline(slot.at), DUE, slot, late=False)
+                    self._plan_reminders(slot)
+            day += timedelta(days=1)
+        self._planned_until = last_day
+        # ลืมรอบที่เก่ากว่าช่วงตามเตือน (start() ไม่วางแผนย้อนไปเกินเมื่อวาน)
+        cutoff = (now - timedelta(days=1) - self.catchup).strftime("%Y-%m-%d %H:%M")
+        self._fired = {key for key in self._fired if key[0] >= cutoff}
+
+    def _plan_reminders(self, slot, after=None):
+        for number, minutes in enumerate(self.followup_minutes, start=1):
+            at = slot.at + timedelta(minutes=minutes)
+            if after is None or at > after:
+                self._push(self._deadline(at), FOLLOWUP, slot, number=number)
+        self._push(self._deadline(max(slot.at + self.missed_after, after or slot.at)), MISSED, slot)
+
+    # ---------- Driving ----------
+    def next_delay(self) -> float | None:
+        """วินาทีจนถึงเหตุการณ์ถัดไป (None = ไม่มีอะไรในคิว)"""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self.monotonic())
+
+    def run_due(self):
+        """ส่งทุกเหตุการณ์ที่ถึงกำหนดแล้ว คืนจำนวนเหตุการณ์ที่ส่ง"""
+        offset = self.wall() - self.monotonic()
+        if self._offset is not None and abs(offset - self._offset) > self.max_clock_jump:
+            # นาฬิกาเครื่องถูกปรับ (NTP / ตั้งเวลาเอง) -> วางแผนใหม่จากเวลาปัจจุบัน
+            # เหตุการณ์ที่ส่งไปแล้ว (แจ้งเตือน / พลาด) จะถูกข้ามใน _fired ไม่ส่ง LINE ซ้ำ
+            print("🕒 นาฬิกาเครื่องเปลี่ยน วางตารางเวลาทานยาใหม่")
+            self.start()
+
+        now_mono = self.monotonic()
+        tick = False
+        batch = {}  # slot.id -> (deadline, kind, slot, info)
+        while self._heap and self._heap[0][0] <= now_mono:
+            deadline, _, kind, slot, info = heapq.heappop(self._heap)
+            if kind == TICK:
+                tick = True
+            elif slot.id not in self.taken:
+                key = self._key(kind, slot, info)
+                if key in self._fired:
+                    continue
+                # นับว่าส่งแล้วแม้ถูกรวบด้านล่าง วางแผนใหม่ทีหลังจะได้ไม่ส่งเหตุการณ์เก่าออกมาอีก
+                self._fired.add(key)
+                # ค้างหลายเหตุการณ์ของรอบเดียวกัน (ลูปหลักถูกบล็อกนาน) -> ส่งเฉพาะอันล่าสุด ไม่ส่ง LINE รัวๆ
+                if kind == FOLLOWUP and slot.id in batch and batch[slot.id][1] == DUE:
+                    continue
+                if kind == PREWARM and now_mono - deadline > 60:
+                    continue  # เลยเวลาไปแล้ว DUE ตามมาเอง
+                batch[slot.id] = (deadline, kind, slot, info)
+
+        fired = 0
+        if tick:
+            self.on_event(TICK, None)
+            # ตรงกับขอบวินาทีของนาฬิกาจริง
+            frac = self.wall() % self.tick_seconds
+            self._push(self.monotonic() + self.tick_seconds - frac, TICK)
+            fired += 1
+        for deadline, kind, slot, info in batch.values():
+            if kind == DUE and not info.get("late") and now_mono - deadline > 60:
+                info = dict(info, late=True)
+            self.on_event(kind, slot, **info)
+            fired += 1
+
+        now = self.now()
+        if now.date() + timedelta(days=1) > self._planned_until:
+            self._plan_days(now)
+        return fired
+
+    # ---------- Dose Records ----------
+    def match_slot(self, when: datetime | None = None):
+        """
+        หารอบที่ยังไม่ทานที่ใกล้ที่สุดในช่วง [เวลา - early, เวลา + missed_after] (อ่านอย่างเดียว ไม่บันทึก)
+        คืน DoseSlot หรือ None ถ้าไม่ตรงกับรอบไหน
+        """
+        when = when or self.now()
+        candidates = []
+        for day in (when.date() - timedelta(days=1), when.date(), when.date() + timedelta(days=1)):
+            for slot in self._slots_on(day):
+                if slot.id in self.taken:
+                    continue
+                if slot.at - self.early <= when <= slot.at + self.missed_after:
+                    candidates.append(slot)
+        if not candidates:
+            return None
+        return min(candidates, key=lambda s: abs((when - s.at).total_seconds()))
+
+    def record_dose(self, when: datetime | None = None):
+        """บันทึกว่าทานยาแล้ว (ยกเลิกเตือนซ้ำ / แจ้งพลาดของรอบนั้น) คืน DoseSlot หรือ None"""
+        slot = self.match_slot(when)
+        if slot is None:
+            return None
+        self.taken.add(slot.id)
+        self.on_event(TAKEN, slot)
+        return slot
+
+    def next_slot(self):
+        """รอบถัดไปที่ยังไม่ได้ทาน (ไว้แสดงบนจอ)"""
+        now = self.now()
+        for day in (now.date(), now.date() + timedelta(days=1)):
+            for slot in self._slots_on(day):
+                if slot.id not in self.taken and slot.at + self.missed_after > now:
+                    return slot
+        return None
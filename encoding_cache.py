@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+INDEX_FILE = "index.json"
+
+
+class EncodingCache:
+    """
+    แคช Encoding ของรูปต้นแบบบนดิสก์ (ไม่ต้องรัน dlib ซ้ำทุกครั้งที่เปิดโปรแกรม)
+    - Key = SHA-256 ของเนื้อไฟล์รูป + ชื่อโมเดล + ค่า upsample
+    - เก็บ Encoding เป็นไฟล์ .npy แล้วโหลดกลับแบบ mmap
+    - ถ้ารูปเปลี่ยน (Hash ไม่ตรง) รายการเก่าจะถูกลบทิ้งอัตโนมัติ
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        model: str = "small",
+        upsample: int = 1,
+        detection_model: str = "hog",
+    ):
+        self.cache_dir = cache_dir
+        self.model = model
+        self.upsample = upsample
+        self.detection_model = detection_model
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = self._read_index()
+        self.prune()
+
+    # ---------- Index ----------
+    def _read_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def file_hash(path):
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def make_key(self, content_hash):
+        return f"{content_hash}-{self.detection_model}-{self.model}-u{self.upsample}"
+
+    # ---------- Public API ----------
+    def get(self, image_path):
+        """คืน Encoding (K x 128, mmap) ถ้ามีในแคชและรูปยังไม่เปลี่ยน ไม่งั้นคืน None"""
+        entry = self.index.get(os.path.abspath(image_path))
+        if entry is None:
+            return None
+        key = self.make_key(self.file_hash(image_path))
+        if entry.get("key") != key:
+            self._drop(image_path)
+            return None
+        try:
+            return np.load(os.path.join(self.cache_dir, entry["file"]), mmap_mode="r")
+        except (OSError, ValueError):
+            self._drop(image_path)
+            return None
+
+    def put(self, image_path, encodings):
+        content_hash = self.file_hash(image_path)
+        key = self.make_key(content_hash)
+        self._drop(image_path)
+
+        filename = key + ".npy"
+        tmp_path = os.path.join(self.cache_dir, filename + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(encodings, dtype=np.float32).reshape(-1, 128))
+        os.replace(tmp_path, os.path.join(self.cache_dir, filename))
+
+        self.index[os.path.abspath(image_path)] = {"key": key, "file": filename}
+        self._write_index()
+
+    def get_or_compute(self, image_path):
+        """อ่านจากแคชก่อน ถ้าไม่มีค่อยรัน face_recognition แล้วเก็บผลไว้"""
+        cached = self.get(image_path)
+        if cached is not None:
+            return cached
+
+        import face_recognition
+
+        image = face_recognition.load_image_file(image_path)
+        locations = face_recognition.face_locations(
+            image,
+            number_of_times_to_upsample=self.upsample,
+            model=self.detection_model,
+        )
+        encodings = face_recognition.face_encodings(image, locations, model=self.model)
+        if not encodings:
+            raise ValueError(f"ไม่พบใบหน้าในรูป {image_path}")
+
+        # ใช้เฉพาะหน้าแรกเหมือนเดิม
+        encodings = np.asarray(encodings[:1], dtype=np.float32)
+        self.put(image_path, encodings)
+        return encodings
+
+    def prune(self):
+        """ลบรายการที่ไฟล์รูปต้นทางถูกลบไปแล้ว และไฟล์ .npy ที่ไม่มีใครอ้างถึง"""
+        for path in [p for p in self.index if not os.path.exists(p)]:
+            self._drop(path)
+        referenced = {e["file"] for e in self.index.values()}
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npy") and name not in referenced:
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def _drop(self, image_path):
+        entry = self.index.pop(os.path.abspath(image_path), None)
+        if entry is None:
+            return
+        still_used = any(e["file"] == entry["file"] for e in self.index.values())
+        if not still_used:
+            try:
+                os.remove(os.path.join(self.cache_dir, entry["file"]))
+            except OSError:
+                pass
+        self._write_index()
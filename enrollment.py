@@ -0,0 +1,141 @@
+import math
+
+import cv2
+import numpy as np
+
+# คะแนนดิบของ HOG (dlib) ไม่ได้อยู่ในช่วง 0-1 เหมือน Backend อื่น ใช้ค่านี้หารให้เป็น 0-1
+CONFIDENCE_SCALE = {"hog": 2.0}
+
+# น้ำหนักของคะแนนแต่ละด้าน (รวมกันได้ 1)
+QUALITY_WEIGHTS = {"blur": 0.35, "size": 0.25, "pose": 0.25, "confidence": 0.15}
+
+
+class EnrollmentCandidate:
+    """เฟรมหนึ่งเฟรมที่เจอหน้า พร้อม Encoding และคะแนนคุณภาพ"""
+
+    def __init__(self, frame, location, encoding, scores):
+        self.frame = frame
+        self.location = location
+        self.encoding = encoding
+        self.scores = scores
+        self.quality = sum(QUALITY_WEIGHTS[k] * scores[k] for k in QUALITY_WEIGHTS)
+
+
+class EnrollmentSession:
+    """
+    ลงทะเบียนใบหน้าแบบหลายภาพ (Multi-reference)
+    - add_frame(): ตรวจจับบนภาพย่อ ให้คะแนน เบลอ / ขนาดหน้า / มุมหน้า / ความมั่นใจของตัวตรวจจับ แล้วเข้ารหัสจากภาพเต็ม
+    - select(): เลือก Top-K ที่คะแนนดีที่สุดและไม่ซ้ำกันเกินไป (ระยะห่างอย่างน้อย min_distance)
+    งานเข้ารหัสทั้งหมดเกิดตอนลงทะเบียนครั้งเดียว ฝั่งสแกนใช้ Encoding ที่ได้ได้ทันที
+    """
+
+    def __init__(
+        self,
+        detector,
+        top_k: int = 5,
+        min_distance: float = 0.06,
+        detect_scale: float = 0.5,
+        min_face_fraction: float = 0.15,
+        max_yaw: float = 0.35,
+        blur_reference: float = 150.0,
+        encoding_model: str = "small",
+    ):
+        self.detector = detector
+        self.top_k = top_k
+        self.min_distance = min_distance
+        self.detect_scale = detect_scale
+        self.min_face_fraction = min_face_fraction
+        self.max_yaw = max_yaw
+        self.blur_reference = blur_reference
+        self.encoding_model = encoding_model
+        self.confidence_scale = CONFIDENCE_SCALE.get(getattr(detector, "name", ""), 1.0)
+        self.candidates = []
+        self.rejected = 0
+
+    def add_frame(self, bgr_frame):
+        """ประเมินเฟรม BGR หนึ่งเฟรม คืน EnrollmentCandidate หรือ None ถ้าใช้ไม่ได้"""
+        import face_recognition
+
+        height, width = bgr_frame.shape[:2]
+        small = cv2.resize(bgr_frame, (0, 0), fx=self.detect_scale, fy=self.detect_scale)
+        rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        faces = self.detector.detect_with_scores(rgb_small)
+        if not faces:
+            self.rejected += 1
+            return None
+
+        # ใช้หน้าที่ใหญ่ที่สุด (คนที่ยืนหน้ากล้อง)
+        (top, right, bottom, left), det_score = max(faces, key=lambda f: (f[0][2] - f[0][0]) * (f[0][1] - f[0][3]))
+        s = 1.0 / self.detect_scale
+        location = (int(top * s), int(right * s), int(bottom * s), int(left * s))
+        face_fraction = (location[2] - location[0]) / height
+        if face_fraction < self.min_face_fraction:
+            self.rejected += 1
+            return None
+
+        rgb = cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2RGB)
+        landmarks = face_recognition.face_landmarks(rgb, [location], model="small")
+        yaw, roll = self._pose(landmarks[0]) if landmarks else (1.0, 0.0)
+        if yaw > self.max_yaw:
+            self.rejected += 1
+            return None
+
+        encodings = face_recognition.face_encodings(rgb, [location], model=self.encoding_model)
+        if not encodings:
+            self.rejected += 1
+            return None
+
+        scores = {
+            "blur": self._sharpness(bgr_frame, location),
+            "size": min(face_fraction / (2 * self.min_face_fraction), 1.0),
+            "pose": max(0.0, 1.0 - yaw / self.max_yaw) * max(0.0, 1.0 - abs(roll) / 30.0),
+            "confidence": min(max(det_score / self.confidence_scale, 0.0), 1.0),
+        }
+        candidate = EnrollmentCandidate(bgr_frame, location, np.asarray(encodings[0], dtype=np.float32), scores)
+        self.candidates.append(candidate)
+        return candidate
+
+    def _sharpness(self, bgr_frame, location):
+        """ความคมชัด: ค่าความแปรปรวนของ Laplacian บนหน้า (ยิ่งสูงยิ่งคม)"""
+        top, right, bottom, left = location
+        gray = cv2.cvtColor(bgr_frame[max(top, 0):bottom, max(left, 0):right], cv2.COLOR_BGR2GRAY)
+        if gray.size == 0:
+            return 0.0
+        return min(cv2.Laplacian(gray, cv2.CV_64F).var() / self.blur_reference, 1.0)
+
+    @staticmethod
+    def _pose(landmarks):
+        """
+        ประมาณมุมหน้าจากจุด 5 จุด (model="small")
+        yaw: จมูกเยื้องจากกึ่งกลางตาเท่าไรเมื่อเทียบกับระยะห่างตา (0 = หน้าตรง)
+        roll: มุมเอียงของเส้นที่ลากผ่านตาสองข้าง (องศา)
+        """
+        left_eye = np.mean(landmarks["left_eye"], axis=0)
+        right_eye = np.mean(landmarks["right_eye"], axis=0)
+        nose = np.mean(landmarks["nose_tip"], axis=0)
+        eye_mid = (left_eye + right_eye) / 2
+        eye_dist = np.linalg.norm(right_eye - left_eye)
+        if eye_dist == 0:
+            return 1.0, 0.0
+        yaw = abs(nose[0] - eye_mid[0]) / eye_dist
+        dx, dy = right_eye - left_eye
+        roll = math.degrees(math.atan2(dy, dx))
+        if roll > 90:
+            roll -= 180
+        elif roll < -90:
+            roll += 180
+        return float(yaw), roll
+
+    def select(self):
+        """เลือก Top-K แบบ Greedy: เรียงตามคะแนน แล้วข้ามภาพที่ใกล้กับภาพที่เลือกไปแล้วเกินไป"""
+        chosen = []
+        for candidate in sorted(self.candidates, key=lambda c: c.quality, reverse=True):
+            if all(np.linalg.norm(candidate.encoding - c.encoding) >= self.min_distance for c in chosen):
+                chosen.append(candidate)
+            if len(chosen) >= self.top_k:
+                break
+        return chosen
+
+    @staticmethod
+    def encodings_of(chosen):
+        return np.stack([c.encoding for c in chosen]).astype(np.float32)
@@ -37,13 +37,24 @@ void loop() {
   if (Serial.available() > 0) {
     char cmd = Serial.read();
 
+    // ✅ ข้อความแบบมีโครงสร้างให้ Python อ่าน: #ACK <cmd> / #DONE <cmd> / #ERR <cmd> <reason>
+    if (cmd == 'f' || cmd == 'a' || cmd == 's') {
+      Serial.print("#ACK ");
+      Serial.println(cmd);
+    }
+
     if (cmd == 'f') { 
       faceDetected = true;
       Serial.println("✅ ตรวจจับใบหน้าสำเร็จ! กำลังจ่ายยา...");
-      dispenseMedicine();
+      if (dispenseMedicine()) {
+        Serial.println("#DONE f");
+      } else {
+        Serial.println("#ERR f TIMEOUT");
+      }
     }
     if (cmd == 'a') { 
       mp3.playWithVolume(002, 30);
+      Serial.println("#DONE a");
     }
 mp3.playWithVolume(001, 30);
     if (cmd == 's') {
@@ -53,6 +64,8 @@ mp3.playWithVolume(001, 30);
       motorSpeed = newSpeed;
       Serial.print("🔧 ตั้งความเร็วใหม่ = ");
       Serial.println(motorSpeed);
+      Serial.print("#DONE s ");
+      Serial.println(motorSpeed);
     }
   }
 }
@@ -60,7 +73,8 @@ mp3.playWithVolume(001, 30);
 // -----------------------------
 // ฟังก์ชันควบคุมมอเตอร์ (ปรับปรุงใหม่)
 // -----------------------------
-void dispenseMedicine() {
+// คืนค่า true ถ้าจ่ายยาสำเร็จ, false ถ้าหมดเวลา (Timeout)
+bool dispenseMedicine() {
   digitalWrite(IN1, HIGH);
   digitalWrite(IN2, LOW);
 
@@ -101,6 +115,7 @@ void dispenseMedicine() {
   }
   
   faceDetected = false;
+  return !isError;
 }
 
 void startMotor() {
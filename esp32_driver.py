@@ -0,0 +1,260 @@
+import glob
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import serial
+
+from metrics import get_metrics
+
+# ข้อความตอบกลับแบบมีโครงสร้างจาก esp.ino:  #ACK f / #DONE f / #ERR f TIMEOUT
+FRAME_PREFIX = "#"
+
+# ข้อความแบบเก่า (เฟิร์มแวร์ที่ยังไม่มี #DONE) ใช้ตีความผลของคำสั่ง 'f'
+LEGACY_DONE = "🟢"
+LEGACY_ERRORS = ("❌", "🔴")
+
+
+class CommandResult:
+    """ผลลัพธ์ของคำสั่งหนึ่งคำสั่ง"""
+
+    def __init__(self, cmd, status, detail="", latency=0.0, lines=None):
+        self.cmd = cmd
+        self.status = status          # "done" / "error" / "timeout" / "disconnected"
+        self.detail = detail
+        self.latency = latency
+        self.lines = lines or []
+
+    @property
+    def ok(self):
+        return self.status == "done"
+
+    def __repr__(self):
+        return f"CommandResult({self.cmd!r}, {self.status!r}, {self.detail!r}, {self.latency:.2f}s)"
+
+
+class _Command:
+    def __init__(self, cmd, timeout):
+        self.cmd = cmd
+        self.timeout = timeout
+        self.future = Future()
+        self.queued_at = time.monotonic()
+        self.sent_at = None
+        self.acked = False
+        self.lines = []
+
+    def resolve(self, status, detail=""):
+        if self.future.done():
+            return
+        latency = time.monotonic() - (self.sent_at or self.queued_at)
+        get_metrics().observe("serial_command_seconds", latency, cmd=self.cmd[:1], status=status)
+        self.future.set_result(CommandResult(self.cmd, status, detail, latency, self.lines))
+
+
+class Esp32Driver:
+    """
+    ไดรเวอร์ Serial ไป ESP32 แบบไม่บล็อก
+    - มี I/O Thread ของตัวเอง: เปิดพอร์ต / เขียนคำสั่ง / อ่านข้อความตอบกลับ
+    - ส่งคำสั่งผ่านคิว ทีละคำสั่ง; send() คืน Future ที่จะได้ผลเมื่อเฟิร์มแวร์รายงานว่าเสร็จ / ผิดพลาด / หมดเวลา
+    - ถ้า USB หลุดหรือเปลี่ยนชื่อพอร์ต (re-enumerate) จะเชื่อมต่อใหม่เองอัตโนมัติ
+    - คำสั่งที่รอในคิวนานเกิน queue_timeout จะถูกยกเลิก (ไม่จ่ายยาย้อนหลังตอนต่อกลับมาได้)
+    """
+
+    def __init__(
+        self,
+        port: str,
+        baudrate: int = 115200,
+        port_candidates=(),
+        command_timeout: float = 8.0,
+        queue_timeout: float = 5.0,
+        boot_delay: float = 2.0,
+        reconnect_interval: float = 2.0,
+        on_line=None,
+        serial_factory=serial.Serial,
+    ):
+        self.port = port
+        self.baudrate = baudrate
+        self.port_candidates = list(port_candidates)
+        self.command_timeout = command_timeout
+        self.queue_timeout = queue_timeout
+        self.boot_delay = boot_delay
+        self.reconnect_interval = reconnect_interval
+        self.on_line = on_line
+        self.serial_factory = serial_factory
+
+        self.ser = None
+        self.active_port = None
+        self.framed_firmware = False
+        self._queue = queue.Queue()
+        self._current = None
+        self._rx = b""
+        self._stop = threading.Event()
+        self._connected = threading.Event()
+        self._thread = None
+
+    # ---------- Public API ----------
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._io_loop, name="esp32-io", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self._disconnect("closed")
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    def wait_connected(self, timeout=None):
+        return self._connected.wait(timeout)
+
+    def send(self, cmd: str, timeout: float | None = None) -> Future:
+        """ใส่คำสั่งลงคิว คืน Future[CommandResult]"""
+        command = _Command(cmd, timeout if timeout is not None else self.command_timeout)
+        self._queue.put(command)
+        return command.future
+
+    # ---------- I/O Thread ----------
+    def _io_loop(self):
+        while not self._stop.is_set():
+            if self.ser is None:
+                if not self._connect():
+                    self._expire_queued()
+                    self._stop.wait(self.reconnect_interval)
+                    continue
+
+            try:
+                self._pump()
+            except (serial.SerialException, OSError) as e:
+                print(f"❌ Serial หลุด ({self.active_port}): {e}")
+                self._disconnect("disconnected")
+
+    def _candidate_ports(self):
+        ports = [self.port] if self.port else []
+        for pattern in self.port_candidates:
+            ports.extend(p for p in sorted(glob.glob(pattern)) if p not in ports)
+        return ports
+
+    def _connect(self):
+        for port in self._candidate_ports():
+            try:
+                ser = self.serial_factory(port, self.baudrate, timeout=0.05)
+            except (serial.SerialException, OSError):
+                continue
+            # ESP32 รีบูตเมื่อเปิดพอร์ต รอใน I/O Thread แทนการ sleep บนเธรดหลัก
+            self._stop.wait(self.boot_delay)
+            ser.reset_input_buffer()
+            self._rx = b""
+            self.ser = ser
+            self.active_port = port
+            self._connected.set()
+            print(f"✅ เปิดพอร์ต Serial ไป ESP32 ที่ {port} เรียบร้อย")
+            return True
+        return False
+
+    def _disconnect(self, status):
+        self._connected.clear()
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except Exception:
+                pass
+        self.ser = None
+        # คำสั่งที่ค้างอยู่ ไม่ส่งซ้ำอัตโนมัติ (กันจ่ายยาซ้ำ)
+        if self._current is not None:
+            self._current.resolve(status, "serial port lost")
+            self._current = None
+
+    def _expire_queued(self):
+        """ยกเลิกคำสั่งที่รอในคิวนานเกินไปตอนยังต่อ ESP32 ไม่ได้"""
+        keep = []
+        while True:
+            try:
+                command = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if time.monotonic() - command.queued_at > self.queue_timeout:
+                command.resolve("disconnected", "ESP32 not connected")
+            else:
+                keep.append(command)
+        for command in keep:
+            self._queue.put(command)
+
+    def _pump(self):
+        now = time.monotonic()
+
+        # 1. ส่งคำสั่งถัดไปถ้าไม่มีคำสั่งค้าง
+        if self._current is None:
+            try:
+                command = self._queue.get_nowait()
+            except queue.Empty:
+                command = None
+            if command is not None:
+                if now - command.queued_at > self.queue_timeout:
+                    command.resolve("timeout", "queued too long")
+                else:
+                    self.ser.write(command.cmd.encode("utf-8"))
+                    self.ser.flush()
+                    command.sent_at = now
+                    self._current = command
+                    print(f"➡️ ส่งคำสั่ง '{command.cmd}' ไปยัง ESP32")
+
+        # 2. อ่านข้อความตอบกลับ (timeout สั้นๆ ของพอร์ตทำให้ลูปไม่หมุนเปล่า)
+        data = self.ser.read(self.ser.in_waiting or 1)
+        if data:
+            self._rx += data
+            while b"\n" in self._rx:
+                raw, self._rx = self._rx.split(b"\n", 1)
+                line = raw.decode("utf-8", errors="replace").strip()
+                if line:
+                    self._handle_line(line)
+
+        # 3. ตรวจ Timeout ของคำสั่งปัจจุบัน
+        current = self._current
+        if current is not None and time.monotonic() - current.sent_at > current.timeout:
+            print(f"⏰ ESP32 ไม่ตอบคำสั่ง '{current.cmd}' ภายใน {current.timeout:.0f} วินาที")
+            current.resolve("timeout", "no completion from firmware")
+            self._current = None
+
+    def _handle_line(self, line):
+        print(f"📟 ESP32: {line}")
+        if self.on_line is not None:
+            self.on_line(line)
+
+        current = self._current
+        if current is not None:
+            current.lines.append(line)
+
+        if line.startswith(FRAME_PREFIX):
+            self.framed_firmware = True
+            parts = line[1:].split(maxsplit=2)
+            kind = parts[0].upper() if parts else ""
+            cmd = parts[1] if len(parts) > 1 else ""
+            detail = parts[2] if len(parts) > 2 else ""
+            # เทียบเฉพาะตัวอักษรแรก (เช่น "s180" -> 's')
+            if current is None or cmd != current.cmd[:1]:
+                return
+            if kind == "ACK":
+                current.acked = True
+            elif kind == "DONE":
+                current.resolve("done", detail)
+                self._current = None
+            elif kind == "ERR":
+                current.resolve("error", detail)
+                self._current = None
+            return
+
+        # เฟิร์มแวร์รุ่นเก่า: ดูจากอีโมจิของคำสั่งจ่ายยา
+        if self.framed_firmware or current is None or current.cmd[:1] != "f":
+            return
+        if line.startswith(LEGACY_DONE):
+            current.resolve("done", line)
+            self._current = None
+        elif line.startswith(LEGACY_ERRORS):
+            current.resolve("error", line)
+            self._current = None
@@ -0,0 +1,153 @@
+import abc
+
+import cv2
+import numpy as np
+import config
+
+
+class FaceDetector(abc.ABC):
+    """
+    Interface กลางของตัวตรวจจับใบหน้า
+    - รับภาพ RGB (numpy, contiguous)
+    - คืนกล่องรูปแบบเดียวกับ face_recognition: (top, right, bottom, left)
+    ขั้นตอนเข้ารหัส/จับคู่ (face_encodings + Gallery) ไม่ขึ้นกับ Backend ที่เลือก
+    """
+
+    name = "base"
+
+    @abc.abstractmethod
+    def detect_with_scores(self, rgb):
+        """คืน list ของ ((top, right, bottom, left), score)"""
+
+    def detect(self, rgb):
+        return [box for box, _ in self.detect_with_scores(rgb)]
+
+    def close(self):
+        pass
+
+
+def _clip_box(top, right, bottom, left, height, width):
+    return (
+        max(int(top), 0),
+        min(int(right), width),
+        min(int(bottom), height),
+        max(int(left), 0),
+    )
+
+
+class HogFaceDetector(FaceDetector):
+    """dlib HOG (ค่าเดิมของระบบ)"""
+
+    name = "hog"
+
+    def __init__(self, upsample: int = 1):
+        import face_recognition.api as fr_api
+
+        self.upsample = upsample
+        self._detector = fr_api.face_detector
+
+    def detect_with_scores(self, rgb):
+        height, width = rgb.shape[:2]
+        rects, scores, _ = self._detector.run(rgb, self.upsample, 0.0)
+        return [
+            (_clip_box(r.top(), r.right(), r.bottom(), r.left(), height, width), float(score))
+            for r, score in zip(rects, scores)
+        ]
+
+
+class MediaPipeFaceDetector(FaceDetector):
+    """MediaPipe Face Detection (BlazeFace) - เร็วมากบน CPU"""
+
+    name = "mediapipe"
+
+    def __init__(self, min_confidence: float = 0.5, model_selection: int = 0):
+        import mediapipe as mp
+
+        self._detector = mp.solutions.face_detection.FaceDetection(
+            model_selection=model_selection,
+            min_detection_confidence=min_confidence,
+        )
+
+    def detect_with_scores(self, rgb):
+        height, width = rgb.shape[:2]
+        results = self._detector.process(rgb)
+        faces = []
+        for det in results.detections or []:
+            bb = det.location_data.relative_bounding_box
+            left, top = bb.xmin * width, bb.ymin * height
+            right, bottom = left + bb.width * width, top + bb.height * height
+            faces.append((_clip_box(top, right, bottom, left, height, width), float(det.score[0])))
+        return faces
+
+    def close(self):
+        self._detector.close()
+
+
+class YuNetFaceDetector(FaceDetector):
+    """OpenCV YuNet (cv2.FaceDetectorYN) - ต้องมีไฟล์โมเดล .onnx"""
+
+    name = "yunet"
+
+    def __init__(self, model_path: str, min_confidence: float = 0.6):
+        self._detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320), min_confidence)
+        self._input_size = None
+
+    def detect_with_scores(self, rgb):
+        height, width = rgb.shape[:2]
+        if self._input_size != (width, height):
+            self._detector.setInputSize((width, height))
+            self._input_size = (width, height)
+        _, faces = self._detector.detect(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+        if faces is None:
+            return []
+        results = []
+        for f in faces:
+            x, y, w, h = f[:4]
+            results.append((_clip_box(y, x + w, y + h, x, height, width), float(f[-1])))
+        return results
+
+
+class OpenCvDnnFaceDetector(FaceDetector):
+    """OpenCV DNN Res10-SSD (Caffe) - ต้องมี deploy.prototxt + .caffemodel"""
+
+    name = "dnn"
+
+    def __init__(self, prototxt_path: str, model_path: str, min_confidence: float = 0.6):
+        self._net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
+        self._net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self._net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.min_confidence = min_confidence
+
+    def detect_with_scores(self, rgb):
+        height, width = rgb.shape[:2]
+        bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        blob = cv2.dnn.blobFromImage(bgr, 1.0, (300, 300), (104.0, 177.0, 123.0))
+        self._net.setInput(blob)
+        detections = self._net.forward()[0, 0]
+        faces = []
+        for det in detections:
+            score = float(det[2])
+            if score < self.min_confidence:
+                continue
+            left, top, right, bottom = det[3:7] * np.array([width, height, width, height])
+            faces.append((_clip_box(top, right, bottom, left, height, width), score))
+        return faces
+
+
+def create_face_detector(name: str = config.FACE_DETECTOR) -> FaceDetector:
+    """สร้าง Backend ตามชื่อ (ค่าเริ่มต้นจาก config.FACE_DETECTOR)"""
+    name = name.lower()
+    if name == "hog":
+        return HogFaceDetector(upsample=config.FACE_UPSAMPLE)
+    if name == "mediapipe":
+        return MediaPipeFaceDetector(min_confidence=config.DETECTOR_MIN_CONFIDENCE)
+    if name == "yunet":
+        return YuNetFaceDetector(config.YUNET_MODEL_PATH, min_confidence=config.DETECTOR_MIN_CONFIDENCE)
+    if name == "dnn":
+        return OpenCvDnnFaceDetector(
+            config.DNN_PROTOTXT_PATH, config.DNN_MODEL_PATH, min_confidence=config.DETECTOR_MIN_CONFIDENCE
+        )
+    raise ValueError(f"ไม่รู้จัก Face Detector: {name}")
+
+
+DETECTOR_NAMES = ["hog", "mediapipe", "yunet", "dnn"]
@@ -0,0 +1,152 @@
+import os
+import numpy as np
+
+ENCODING_DIM = 128
+
+
+class FaceGallery:
+    """
+    คลังใบหน้าผู้ป่วยหลายคน (Multi-patient Gallery)
+    - เก็บ Encoding ทุกภาพของทุกคนไว้ใน Matrix float32 ก้อนเดียว (M x 128)
+    - แถวของผู้ป่วยคนเดียวกันเรียงติดกัน เพื่อหาค่าที่ดีที่สุดรายคนด้วย reduceat ได้ทันที
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.names: list[str] = []
+        self.encodings = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        self.owners = np.empty((0,), dtype=np.int32)
+        self._starts = np.empty((0,), dtype=np.intp)
+        self._sq_norms = np.empty((0,), dtype=np.float32)
+        self._centroids = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        self._centroid_sq_norms = np.empty((0,), dtype=np.float32)
+
+        if self.path and os.path.exists(self.path):
+            self.load()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    # ---------- Persistence ----------
+    def load(self):
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                names = [str(n) for n in data["names"]]
+                encodings = np.asarray(data["encodings"], dtype=np.float32)
+                owners = np.asarray(data["owners"], dtype=np.int32)
+        except Exception as e:
+            print(f"❌ โหลด Gallery ไม่สำเร็จ ({self.path}): {e}")
+            return
+        self._set_rows(names, encodings, owners)
+        print(f"📂 โหลด Gallery: {len(self.names)} คน / {len(self.encodings)} encodings")
+
+    def save(self):
+        if not self.path:
+            return
+        # เขียนไฟล์ชั่วคราวก่อนแล้วค่อย rename กันไฟล์พังถ้าไฟดับกลางทาง
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            names=np.array(self.names, dtype=str),
+            encodings=self.encodings,
+            owners=self.owners,
+        )
+        os.replace(tmp_path, self.path)
+
+    # ---------- Editing ----------
+    def get_encodings(self, name):
+        if name not in self.names:
+            return np.empty((0, ENCODING_DIM), dtype=np.float32)
+        return self.encodings[self.owners == self.names.index(name)]
+
+    def set_patient(self, name, encodings):
+        """แทนที่ Encoding ทั้งหมดของผู้ป่วยคนนี้ (เพิ่มคนใหม่ถ้ายังไม่มี)"""
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        groups = {n: self.get_encodings(n) for n in self.names}
+        groups[name] = encodings
+        self._rebuild(groups)
+
+    def add_encodings(self, name, encodings):
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        self.set_patient(name, np.concatenate([self.get_encodings(name), encodings]))
+
+    def remove_patient(self, name):
+        groups = {n: self.get_encodings(n) for n in self.names if n != name}
+        self._rebuild(groups)
+
+    def _rebuild(self, groups):
+        names = [n for n, enc in groups.items() if len(enc) > 0]
+        if names:
+            encodings = np.concatenate([groups[n] for n in names]).astype(np.float32)
+            owners = np.concatenate(
+                [np.full(len(groups[n]), i, dtype=np.int32) for i, n in enumerate(names)]
+            )
+        else:
+            encodings = np.empty((0, ENCODING_DIM), dtype=np.float32)
+            owners = np.empty((0,), dtype=np.int32)
+        self._set_rows(names, encodings, owners)
+
+    def _set_rows(self, names, encodings, owners):
+        order = np.argsort(owners, kind="stable")
+        self.names = list(names)
+        self.encodings = np.ascontiguousarray(encodings[order], dtype=np.float32)
+        self.owners = np.ascontiguousarray(owners[order], dtype=np.int32)
+        # จุดเริ่มต้นของแต่ละคนใน Matrix (ใช้กับ np.minimum.reduceat)
+        self._starts = np.searchsorted(self.owners, np.arange(len(self.names))).astype(np.intp)
+        self._sq_norms = np.einsum("ij,ij->i", self.encodings, self.encodings)
+        # ค่าเฉลี่ย (Centroid) ของแต่ละคน ใช้กับโหมด match แบบ "centroid"
+        if len(self.names):
+            counts = np.diff(np.append(self._starts, len(self.encodings)))
+            self._centroids = (np.add.reduceat(self.encodings, self._starts, axis=0) / counts[:, None]).astype(np.float32)
+        else:
+            self._centroids = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        self._centroid_sq_norms = np.einsum("ij,ij->i", self._centroids, self._centroids)
+
+    # ---------- Matching ----------
+    def distances(self, face_encodings, centroids=False):
+        """
+        ระยะห่าง Euclidean ของทุกหน้า (F) กับทุก Encoding (M) ในการคำนวณครั้งเดียว -> (F x M)
+        centroids=True: เทียบกับค่าเฉลี่ยของแต่ละคนแทน -> (F x N)
+        """
+        faces = np.asarray(face_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        refs, ref_sq = (self._centroids, self._centroid_sq_norms) if centroids else (self.encodings, self._sq_norms)
+        sq = (
+            np.einsum("ij,ij->i", faces, faces)[:, None]
+            + ref_sq[None, :]
+            - 2.0 * (faces @ refs.T)
+        )
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq, out=sq)
+
+    def match(self, face_encodings, tolerance, mode="all"):
+        """
+        จับคู่ทุกหน้าในเฟรมกับ Gallery
+        mode: "all" = ใช้ระยะที่ใกล้ที่สุดจากทุกภาพอ้างอิงของคนนั้น, "centroid" = เทียบกับค่าเฉลี่ยของคนนั้น
+        คืนค่า (names, best_distances, patient_distances)
+        - names: ชื่อผู้ป่วยที่ใกล้ที่สุดของแต่ละหน้า หรือ "Unknown"
+        - best_distances: ระยะที่ดีที่สุดของแต่ละหน้า (F,)
+        - patient_distances: ระยะที่ดีที่สุดของแต่ละหน้าเทียบกับผู้ป่วยแต่ละคน (F x N)
+        """
+        n_faces = len(face_encodings)
+        if n_faces == 0 or len(self.names) == 0:
+            return (
+                ["Unknown"] * n_faces,
+                np.full(n_faces, np.inf, dtype=np.float32),
+                np.empty((n_faces, len(self.names)), dtype=np.float32),
+            )
+
+        if mode == "centroid":
+            patient_distances = self.distances(face_encodings, centroids=True)
+        else:
+            patient_distances = np.minimum.reduceat(self.distances(face_encodings), self._starts, axis=1)
+        best_patient = np.argmin(patient_distances, axis=1)
+        best_distances = patient_distances[np.arange(n_faces), best_patient]
+
+        names = [
+            self.names[p] if d < tolerance else "Unknown"
+            for p, d in zip(best_patient, best_distances)
+        ]
+        return names, best_distances, patient_distances
@@ -0,0 +1,148 @@
+import itertools
+import time
+
+import cv2
+import numpy as np
+
+
+class FaceTrack:
+    """สถานะของใบหน้าที่กำลังติดตาม (พิกัดบนเฟรมย่อ 0.25x เหมือน face_locations)"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, box, name, now):
+        self.track_id = next(FaceTrack._ids)
+        self.box = np.array(box, dtype=np.float32)          # top, right, bottom, left
+        self.anchor_box = self.box.copy()                   # กล่อง ณ ตอนเข้ารหัสล่าสุด
+        self.name = name
+        self.confidence = 1.0
+        self.encoded_at = now
+        self.points = None
+        self.prev_gray = None
+        self.lost = False                                   # หลุด Track แต่ยังจำ id/ชื่อไว้รอตรวจจับซ้ำ
+
+    def location(self):
+        top, right, bottom, left = (int(round(v)) for v in self.box)
+        return top, right, bottom, left
+
+
+class KLTFaceTracker:
+    """
+    ติดตามใบหน้าด้วย Optical Flow (KLT) บนเฟรมขาวดำขนาดย่อ
+    - ตรวจจับ + เข้ารหัสครั้งเดียว แล้วตามกล่องไปเรื่อยๆ (ถูกกว่า HOG + dlib หลายเท่า)
+    - ขอให้เข้ารหัสใหม่เมื่อ: กล่องเลื่อนเกิน max_drift, ความมั่นใจต่ำ หรือครบ reverify_seconds
+    """
+
+    def __init__(
+        self,
+        max_drift: float = 0.35,
+        min_confidence: float = 0.5,
+        reverify_seconds: float = 1.0,
+        max_points: int = 40,
+        clock=time.monotonic,
+    ):
+        self.max_drift = max_drift
+        self.min_confidence = min_confidence
+        self.reverify_seconds = reverify_seconds
+        self.max_points = max_points
+        self.clock = clock
+        self.track = None
+
+    @property
+    def track_id(self):
+        return self.track.track_id if self.track is not None else None
+
+    @property
+    def active(self):
+        """มี Track ที่ยังตามกล่องได้อยู่ (ไม่นับ Track ที่หลุดแล้ว)"""
+        return self.track is not None and not self.track.lost
+
+    def clear(self):
+        self.track = None
+
+    def _lose(self):
+        """หลุด Track: เลิกตามกล่อง แต่คง track_id + ชื่อไว้ ถ้าตรวจจับเจอคนเดิมจะได้ไม่เริ่มนับถือค้างใหม่"""
+        if self.track is not None:
+            self.track.lost = True
+            self.track.points = None
+
+    def start(self, gray, box, name):
+        """เริ่ม Track ใหม่ (ได้ track_id ใหม่)"""
+        self.track = FaceTrack(box, name, self.clock())
+        self._seed(gray)
+        return self.track
+
+    def refresh(self, gray, box, name):
+        """เข้ารหัสซ้ำแล้วยังเป็นคนเดิม: ตั้ง Anchor ใหม่ แต่คง track_id เดิม"""
+        if self.track is None or self.track.name != name:
+            return self.start(gray, box, name)
+        self.track.box = np.array(box, dtype=np.float32)
+        self.track.anchor_box = self.track.box.copy()
+        self.track.encoded_at = self.clock()
+        self.track.confidence = 1.0
+        self.track.lost = False
+        self._seed(gray)
+        return self.track
+
+    def _seed(self, gray):
+        track = self.track
+        top, right, bottom, left = track.location()
+        mask = np.zeros_like(gray)
+        mask[max(top, 0):max(bottom, 0), max(left, 0):max(right, 0)] = 255
+        track.points = cv2.goodFeaturesToTrack(
+            gray, maxCorners=self.max_points, qualityLevel=0.01, minDistance=3, mask=mask
+        )
+        track.prev_gray = gray
+
+    def update(self, gray):
+        """ขยับกล่องตาม Optical Flow คืน False ถ้าหลุด Track"""
+        track = self.track
+        if track is None or track.lost or track.points is None or len(track.points) < 4:
+            self._lose()
+            return False
+
+        next_pts, status, _ = cv2.calcOpticalFlowPyrLK(track.prev_gray, gray, track.points, None)
+        back_pts, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, track.prev_gray, next_pts, None)
+
+        # Forward-Backward check: จุดที่ตามไปแล้วย้อนกลับมาไม่ตรงถือว่าเชื่อไม่ได้
+        fb_error = np.linalg.norm((track.points - back_pts).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < 1.0)
+        track.confidence = float(good.sum()) / len(track.points)
+        if good.sum() < 4:
+            self._lose()
+            return False
+
+        old = track.points.reshape(-1, 2)[good]
+        new = next_pts.reshape(-1, 2)[good]
+        dx, dy = np.median(new - old, axis=0)
+
+        # สเกล: อัตราส่วนระยะห่างระหว่างจุดคู่ต่างๆ
+        old_spread = np.linalg.norm(old - old.mean(axis=0), axis=1)
+        new_spread = np.linalg.norm(new - new.mean(axis=0), axis=1)
+        valid = old_spread > 1e-3
+        scale = float(np.median(new_spread[valid] / old_spread[valid])) if valid.any() else 1.0
+
+        top, right, bottom, left = track.box
+        cy, cx = (top + bottom) / 2 + dy, (left + right) / 2 + dx
+        half_h, half_w = (bottom - top) / 2 * scale, (right - left) / 2 * scale
+        track.box = np.array([cy - half_h, cx + half_w, cy + half_h, cx - half_w], dtype=np.float32)
+
+        track.points = new.reshape(-1, 1, 2)
+        track.prev_gray = gray
+        return True
+
+    def needs_reencode(self):
+        """คืนเหตุผลที่ต้องเข้ารหัสใหม่ ('confidence' / 'drift' / 'interval') หรือ None"""
+        track = self.track
+        if track is None or track.lost:
+            return "lost"
+        if track.confidence < self.min_confidence:
+            return "confidence"
+        top, right, bottom, left = track.anchor_box
+        size = max(bottom - top, right - left, 1.0)
+        shift = np.abs(track.box - track.anchor_box).max() / size
+        if shift > self.max_drift:
+            return "drift"
+        if self.clock() - track.encoded_at > self.reverify_seconds:
+            return "interval"
+        return None
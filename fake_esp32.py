@@ -0,0 +1,102 @@
+"""
+ESP32 จำลองบน pty สำหรับทดสอบ Esp32Driver โดยไม่ต้องมีบอร์ดจริง (Linux / Raspberry Pi)
+
+    python fake_esp32.py [--dispense-seconds 1.5] [--fail-every 0] [--legacy]
+
+จะพิมพ์ path ของพอร์ตจำลอง (เช่น /dev/pts/5) ให้นำไปตั้งเป็น config.SERIAL_PORT
+- --legacy      ตอบเฉพาะข้อความอีโมจิแบบเฟิร์มแวร์รุ่นเก่า (ไม่มี #ACK / #DONE)
+- --fail-every  ให้การจ่ายยาครั้งที่ N, 2N, ... จบด้วย Timeout
+"""
+import argparse
+import os
+import pty
+import threading
+import time
+import tty
+
+
+class FakeEsp32:
+    def __init__(self, dispense_seconds=1.5, fail_every=0, legacy=False):
+        self.dispense_seconds = dispense_seconds
+        self.fail_every = fail_every
+        self.legacy = legacy
+        self.dispense_count = 0
+        self.received = []
+
+        self.master_fd, slave_fd = pty.openpty()
+        tty.setraw(slave_fd)
+        self.port = os.ttyname(slave_fd)
+        self._slave_fd = slave_fd  # เปิดค้างไว้ ไม่ให้ pty ปิดเมื่อ Driver ปิดพอร์ต
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        self._println("ระบบจ่ายยาเริ่มทำงาน...")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        os.close(self.master_fd)
+        os.close(self._slave_fd)
+
+    def _println(self, text):
+        os.write(self.master_fd, (text + "\r\n").encode("utf-8"))
+
+    def _framed(self, text):
+        if not self.legacy:
+            self._println(text)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                data = os.read(self.master_fd, 64)
+            except OSError:
+                break
+            for ch in data.decode("utf-8", errors="ignore"):
+                self._handle(ch)
+
+    def _handle(self, cmd):
+        if cmd not in "fas":
+            return
+        self.received.append(cmd)
+        self._framed(f"#ACK {cmd}")
+        if cmd == "f":
+            self.dispense_count += 1
+            self._println("✅ ตรวจจับใบหน้าสำเร็จ! กำลังจ่ายยา...")
+            time.sleep(self.dispense_seconds)
+            if self.fail_every and self.dispense_count % self.fail_every == 0:
+                self._println("❌ Error: มอเตอร์หมุนนานเกินกำหนด (Timeout)!")
+                self._println("🔴 ระบบหยุดฉุกเฉิน กรุณาตรวจสอบฮาร์ดแวร์")
+                self._framed("#ERR f TIMEOUT")
+            else:
+                self._println("🟢 ถาดจ่ายยาทำงานเสร็จสมบูรณ์")
+                self._framed("#DONE f")
+        elif cmd == "a":
+            self._framed("#DONE a")
+        elif cmd == "s":
+            self._framed("#DONE s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dispense-seconds", type=float, default=1.5)
+    parser.add_argument("--fail-every", type=int, default=0)
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+
+    fake = FakeEsp32(args.dispense_seconds, args.fail_every, args.legacy).start()
+    print(f"🧪 ESP32 จำลองพร้อมที่ {fake.port} (กด Ctrl+C เพื่อหยุด)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.stop()
+        print(f"📦 รับคำสั่งทั้งหมด: {''.join(fake.received)}")
+
+
+if __name__ == "__main__":
+    main()
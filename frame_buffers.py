@@ -0,0 +1,68 @@
+import cv2
+import numpy as np
+
+
+class BufferPool:
+    """
+    เก็บ Array ที่จองไว้ล่วงหน้า ใช้ซ้ำทุกเฟรม (จองใหม่เฉพาะตอนขนาดภาพเปลี่ยน)
+    slot: ใช้ตอนต้องเก็บเฟรมก่อนหน้าไว้ด้วย เช่นภาพเทาของ KLT (สลับ 2 ช่องแบบ ping-pong)
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, shape, dtype=np.uint8, slot=0):
+        key = (name, slot)
+        buf = self._buffers.get(key)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = self._buffers[key] = np.empty(shape, dtype)
+        return buf
+
+    def clear(self):
+        self._buffers.clear()
+
+
+class FramePreprocessor:
+    """
+    ย่อภาพ + แปลงสี โดยเขียนลง Buffer เดิมทุกเฟรม (dst=) แทนการจอง Array ใหม่
+    ใช้บนเธรดเดียว (Recognition Worker) เท่านั้น
+    """
+
+    def __init__(self, scale: float = 0.25):
+        self.scale = scale
+        self.pool = BufferPool()
+        self._gray_slot = 0
+
+    def resize(self, frame):
+        h, w = frame.shape[:2]
+        sw, sh = int(w * self.scale), int(h * self.scale)
+        small = self.pool.get("small", (sh, sw, 3))
+        cv2.resize(frame, (sw, sh), dst=small, interpolation=cv2.INTER_LINEAR)
+        return small
+
+    def to_rgb(self, bgr):
+        # แทน np.ascontiguousarray(bgr[:, :, ::-1]) ที่จอง Array ใหม่ทุกครั้ง
+        rgb = self.pool.get("rgb", bgr.shape)
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=rgb)
+        return rgb
+
+    def to_gray(self, bgr):
+        # สลับช่อง: ภาพเทาของเฟรมก่อนหน้ายังถูก KLT ใช้อยู่ ห้ามเขียนทับ
+        self._gray_slot ^= 1
+        gray = self.pool.get("gray", bgr.shape[:2], slot=self._gray_slot)
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY, dst=gray)
+        return gray
+
+
+def blend_band(frame, y1, y2, color, alpha):
+    """
+    ระบายสีทึบแสงทับแถบ frame[y1:y2] แบบ in-place (ไม่ copy ทั้งเฟรม)
+    เท่ากับ addWeighted(สีทึบ, alpha, frame, 1 - alpha) แต่ทำเฉพาะแถบนั้น
+    """
+    band = frame[y1:y2]
+    if np.ndim(color) == 0 or len(set(color)) == 1:
+        c = color if np.ndim(color) == 0 else color[0]
+        cv2.convertScaleAbs(band, dst=band, alpha=1 - alpha, beta=c * alpha)
+    else:
+        cv2.addWeighted(band, 1 - alpha, np.full_like(band, color), alpha, 0, dst=band)
+    return frame
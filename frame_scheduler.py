@@ -0,0 +1,77 @@
+import json
+import math
+import time
+
+
+class AdaptiveFrameScheduler:
+    """
+    ตัวเลือกความถี่การจดจำใบหน้าแบบปรับตัวเอง (แทน process_every_n_frames = 2 แบบตายตัว)
+    - ปกติ: ประมวลผลทุก N เฟรม โดย N คำนวณจาก Latency ของ _process_frame เทียบกับ FPS ที่ต้องการ
+    - ไม่เจอหน้านานเกิน idle_seconds: ถอยไปใช้ N สูงสุด (ประหยัด CPU)
+    - มีหน้าที่กำลังถือค้างอยู่: เร่งเป็นทุกเฟรม (N = 1) เพื่อยืนยันให้เร็วที่สุด
+    ทุกการตัดสินใจจะถูกบันทึกไว้ใน trace ของการสแกนแต่ละครั้ง
+    """
+
+    def __init__(
+        self,
+        target_fps: float,
+        min_every_n: int = 1,
+        max_every_n: int = 8,
+        idle_seconds: float = 3.0,
+        smoothing: float = 0.3,
+        clock=time.monotonic,
+    ):
+        self.target_fps = target_fps
+        self.min_every_n = min_every_n
+        self.max_every_n = max_every_n
+        self.idle_seconds = idle_seconds
+        self.smoothing = smoothing
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        """เริ่มการสแกนรอบใหม่"""
+        self.every_n = self.min_every_n
+        self.latency = None
+        self.reason = "start"
+        self.started_at = self.clock()
+        self.last_face_time = self.started_at
+        self.trace = []
+
+    def record(self, latency: float, face_seen: bool, candidate_held: bool):
+        """รับผลการประมวลผลล่าสุด แล้วคำนวณ N ใหม่"""
+        now = self.clock()
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+        if face_seen:
+            self.last_face_time = now
+
+        if candidate_held:
+            every_n, reason = 1, "hold"
+        elif now - self.last_face_time > self.idle_seconds:
+            every_n, reason = self.max_every_n, "idle"
+        else:
+            # ใช้เวลาประมวลผลกี่เฟรมของจอ ก็เว้นเท่านั้นเฟรม
+            every_n = math.ceil(self.latency * self.target_fps)
+            every_n, reason = min(max(every_n, self.min_every_n), self.max_every_n), "latency"
+
+        self.every_n = every_n
+        self.reason = reason
+        self.trace.append({
+            "t": round(now - self.started_at, 4),
+            "latency_ms": round(latency * 1000, 2),
+            "avg_latency_ms": round(self.latency * 1000, 2),
+            "face": face_seen,
+            "hold": candidate_held,
+            "every_n": every_n,
+            "reason": reason,
+        })
+        return every_n
+
+    def dump_trace(self, path: str, **extra):
+        """ต่อท้าย trace ของการสแกนนี้ลงไฟล์ JSON Lines (1 บรรทัดต่อ 1 การสแกน)"""
+        record = dict(extra, decisions=self.trace)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
@@ -0,0 +1,86 @@
+import time
+
+import cv2
+import numpy as np
+
+# จุด Landmark ของปลายนิ้ว / ข้อนิ้ว (ชี้ กลาง นาง ก้อย)
+FINGER_TIPS = (8, 12, 16, 20)
+FINGER_PIPS = (6, 10, 14, 18)
+
+
+class GestureDetector:
+    """
+    ตัวตรวจจับมือ (MediaPipe Hands) ตัวเดียวของทั้งโปรแกรม
+    - สร้างครั้งเดียวแล้วใช้ซ้ำทุกการลงทะเบียน (ไม่ต้องโหลดกราฟใหม่ทุกครั้ง)
+    - warm_up(): รันภาพเปล่าหนึ่งครั้งใน Warmup Thread ให้โมเดลพร้อมก่อนผู้ใช้กดปุ่ม
+    - process(): ย่อภาพก่อนส่งเข้า MediaPipe และจำกัดความถี่ (เฟรมที่ข้ามจะได้ผลล่าสุดกลับไป)
+    - close(): ปล่อยทรัพยากรของกราฟเมื่อปิดโปรแกรม
+    """
+
+    def __init__(
+        self,
+        max_hands: int = 1,
+        min_detection_confidence: float = 0.7,
+        min_tracking_confidence: float = 0.5,
+        process_width: int = 320,
+        max_rate: float = 10.0,
+        clock=time.monotonic,
+    ):
+        import mediapipe as mp
+
+        self._mp_hands = mp.solutions.hands
+        self._mp_draw = mp.solutions.drawing_utils
+        self._hands = self._mp_hands.Hands(
+            max_num_hands=max_hands,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence,
+        )
+        self.process_width = process_width
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.clock = clock
+        self._last_run = None
+        self._last_landmarks = []
+        self._small = None
+        self.closed = False
+
+    def warm_up(self):
+        self._hands.process(np.zeros((180, self.process_width, 3), np.uint8))
+        return self
+
+    def reset(self):
+        """เริ่มการลงทะเบียนใหม่: ลืมผลของครั้งก่อน"""
+        self._last_run = None
+        self._last_landmarks = []
+
+    def process(self, bgr_frame):
+        """คืน list ของ hand_landmarks (พิกัด normalized 0-1 ใช้วาดบนภาพเต็มได้เลย)"""
+        now = self.clock()
+        if self._last_run is not None and now - self._last_run < self.min_interval:
+            return self._last_landmarks
+        self._last_run = now
+
+        h, w = bgr_frame.shape[:2]
+        scale = min(1.0, self.process_width / w)
+        size = (int(w * scale), int(h * scale))
+        if self._small is None or self._small.shape[:2] != (size[1], size[0]):
+            self._small = np.empty((size[1], size[0], 3), np.uint8)
+        cv2.resize(bgr_frame, size, dst=self._small, interpolation=cv2.INTER_AREA)
+        rgb = cv2.cvtColor(self._small, cv2.COLOR_BGR2RGB)
+
+        results = self._hands.process(rgb)
+        self._last_landmarks = list(results.multi_hand_landmarks or [])
+        return self._last_landmarks
+
+    @staticmethod
+    def is_open_palm(hand_landmarks):
+        """นิ้วทั้ง 4 (ไม่นับโป้ง) ชี้ขึ้น = แบมือ"""
+        lm = hand_landmarks.landmark
+        return all(lm[tip].y < lm[pip].y for tip, pip in zip(FINGER_TIPS, FINGER_PIPS))
+
+    def draw(self, frame, hand_landmarks):
+        self._mp_draw.draw_landmarks(frame, hand_landmarks, self._mp_hands.HAND_CONNECTIONS)
+
+    def close(self):
+        if not self.closed:
+            self._hands.close()
+            self.closed = True
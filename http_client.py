@@ -0,0 +1,184 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+import config
+from metrics import get_metrics
+
+# ขอบบนของแต่ละช่อง Histogram (มิลลิวินาที)
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# ส่งซ้ำได้โดยไม่เกิดผลซ้ำ (POST เช่นเพิ่มแถวใน Sheet / LINE Push ไม่อยู่ในนี้)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+def _not_sent(exc):
+    """True ถ้าแน่ใจว่า Request ยังไม่ถึงเซิร์ฟเวอร์ (ต่อไม่ติด / หา Host ไม่เจอ) ส่งซ้ำได้แม้เป็น POST"""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    if isinstance(exc, requests.ConnectionError) and not isinstance(exc, requests.Timeout):
+        reason = getattr(exc.args[0], "reason", None) if exc.args else None
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+class LatencyHistogram:
+    """Histogram เวลาตอบกลับของ Endpoint หนึ่งๆ"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total_ms = 0.0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, error: bool = False):
+        ms = seconds * 1000
+        with self._lock:
+            for i, upper in enumerate(self.buckets):
+                if ms <= upper:
+                    self.counts[i] += 1
+                    break
+            self.count += 1
+            self.total_ms += ms
+            if error:
+                self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "errors": self.errors,
+                "avg_ms": self.total_ms / self.count if self.count else 0.0,
+                "buckets": {
+                    ("+Inf" if upper == float("inf") else str(upper)): n
+                    for upper, n in zip(self.buckets, self.counts)
+                },
+            }
+
+
+class OutboundClient:
+    """
+    ตัวส่ง HTTP กลางของทั้งระบบ (Sheets Web App / LINE Push)
+    - ใช้ requests.Session ตัวเดียว: Keep-alive + Connection Pool (ไม่ต้อง DNS/TLS ใหม่ทุกครั้ง)
+    - Timeout แยกตาม Host และ Retry แบบ Exponential Backoff + Jitter
+    - งานเบื้องหลังวิ่งบน Thread Pool จำกัดจำนวน (แทนการสร้าง Thread ใหม่ทุกครั้ง)
+    - เก็บ Histogram Latency แยกตาม Endpoint
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 4,
+        max_workers: int = 2,
+        host_timeouts: dict | None = None,
+        default_timeout: float = 5.0,
+        retries: int = 2,
+        backoff_base: float = 0.3,
+        backoff_max: float = 4.0,
+    ):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.host_timeouts = host_timeouts or {}
+        self.default_timeout = default_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="outbound")
+        self.histograms = {}
+        self._hist_lock = threading.Lock()
+
+    def _histogram(self, endpoint):
+        with self._hist_lock:
+            if endpoint not in self.histograms:
+                self.histograms[endpoint] = LatencyHistogram()
+            return self.histograms[endpoint]
+
+    def _backoff(self, attempt):
+        # Full jitter: สุ่มระหว่าง 0 ถึง base * 2^attempt (ไม่เกิน backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, url, endpoint=None, timeout=None, retries=None, **kwargs):
+        """
+        ส่ง Request พร้อม Retry (เฉพาะเน็ตหลุด / Timeout / 429 / 5xx)
+        Method ที่ไม่ Idempotent (POST) ลองใหม่เฉพาะกรณีที่ยังส่งไม่ถึงเซิร์ฟเวอร์ (ต่อไม่ติด) หรือ 429
+        เพราะ Read Timeout / 5xx อาจแปลว่าเซิร์ฟเวอร์เขียนแถวไปแล้ว ส่งซ้ำจะได้แถวซ้ำ
+        คืน Response ตัวสุดท้าย หรือโยน Exception ของความพยายามครั้งสุดท้าย
+        """
+        host = urlsplit(url).hostname or ""
+        endpoint = endpoint or host
+        if timeout is None:
+            timeout = self.host_timeouts.get(host, self.default_timeout)
+        if retries is None:
+            retries = self.retries
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        hist = self._histogram(endpoint)
+        metrics = get_metrics()
+
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                elapsed = time.perf_counter() - start
+                hist.observe(elapsed, error=True)
+                metrics.observe("http_request_seconds", elapsed, endpoint=endpoint)
+                metrics.inc("http_requests_total", endpoint=endpoint, status="error")
+                if attempt >= retries or not (idempotent or _not_sent(e)):
+                    raise
+            else:
+                retryable = response.status_code in RETRY_STATUS and (idempotent or response.status_code == 429)
+                elapsed = time.perf_counter() - start
+                hist.observe(elapsed, error=response.status_code >= 400)
+                metrics.observe("http_request_seconds", elapsed, endpoint=endpoint)
+                metrics.inc("http_requests_total", endpoint=endpoint, status=response.status_code)
+                if not retryable or attempt >= retries:
+                    return response
+            time.sleep(self._backoff(attempt))
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def submit(self, fn, *args, **kwargs):
+        """รันงานบน Thread Pool (จำกัดจำนวน) คืน Future"""
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def latency_snapshot(self):
+        with self._hist_lock:
+            endpoints = list(self.histograms.items())
+        return {name: hist.snapshot() for name, hist in endpoints}
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OutboundClient:
+    """คืน OutboundClient ตัวเดียวที่ใช้ร่วมกันทั้งโปรแกรม"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OutboundClient(
+                pool_size=config.HTTP_POOL_SIZE,
+                max_workers=config.HTTP_MAX_WORKERS,
+                host_timeouts=config.HTTP_HOST_TIMEOUTS,
+                retries=config.HTTP_RETRIES,
+                backoff_base=config.HTTP_BACKOFF_BASE,
+            )
+        return _client
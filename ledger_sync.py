@@ -0,0 +1,105 @@
+import threading
+
+from http_client import get_client
+from metrics import get_metrics
+
+
+class LedgerSync:
+    """
+    ซิงก์ Dose Ledger ขึ้น Google Sheet แบบส่งเฉพาะส่วนที่เพิ่ม (Delta)
+    - แต่ละแถวมี seq ต่อเครื่องที่เพิ่มขึ้นเรื่อยๆ ส่งเฉพาะ seq ที่มากกว่า High-water mark ล่าสุด
+    - ส่ง: {"sync": {"device": ..., "base": N, "entries": [{"seq", "key", "sheet", "at", "data"}, ...]}}
+      base = seq ที่เครื่องรู้ว่าขึ้น Sheet แล้ว (รวมแถวที่ส่งทางเดิมก่อนมีการซิงก์) เซิร์ฟเวอร์ไม่ขอให้ส่งย้อนต่ำกว่านี้
+    - ตอบ: {"status": "ok", "sync": true, "hwm": N}  เซิร์ฟเวอร์เขียนเฉพาะ seq > hwm เดิมของเครื่องนั้น
+      ส่งซ้ำ (เช่น Timeout แต่เซิร์ฟเวอร์เขียนไปแล้ว) จึงไม่เกิดแถวซ้ำ
+      แถวที่เขียนไม่ได้ (เช่นยังไม่มีชีต) ตอบ "blocked": {"seq", "message"} พร้อม hwm ของแถวก่อนหน้า
+    - key = "device:seq" (Dedup Key) ถูกเขียนลงคอลัมน์ "DedupKey" ถ้าชีตมีคอลัมน์นี้
+    push() คืน True = ซิงก์ครบ, False = ส่งไม่ได้ (ลองใหม่ทีหลัง), None = เซิร์ฟเวอร์ยังไม่รองรับ sync
+    """
+
+    def __init__(self, ledger, url, face_id: str = "", batch_size: int = 50, timeout: float = 10.0, post=None):
+        self.ledger = ledger
+        self.url = url
+        self.face_id = face_id
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.device = ledger.device_id()
+        self._post = post or (lambda url, **kw: get_client().post(url, endpoint="sheets_sync", **kw))
+        self._lock = threading.Lock()
+        self.metrics = get_metrics()
+        self.metrics.gauge_fn("sync_pending", ledger.pending_count)
+
+    def _entry(self, row):
+        return {
+            "seq": row["seq"],
+            "key": f"{self.device}:{row['seq']}",
+            "sheet": row["sheet"],
+            "at": row["taken_at"],
+            "data": {
+                "Name": row["patient"],
+                "FaceID": self.face_id,
+                "Status": "Verified",
+                "Note": row["note"] or "Face verified",
+                "DedupKey": f"{self.device}:{row['seq']}",
+            },
+        }
+
+    def push(self):
+        if not self.url:
+            return False
+        # มีอีกเธรดกำลังซิงก์อยู่ -> เธรดนั้นจะอ่านแถวใหม่ในรอบถัดไปเอง
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            return self._push_locked()
+        finally:
+            self._lock.release()
+
+    def _push_locked(self):
+        sent = 0
+        while True:
+            rows = self.ledger.unsynced(self.batch_size)
+            if not rows:
+                break
+            body = {"sync": {"device": self.device, "base": self.ledger.synced_seq, "entries": [self._entry(r) for r in rows]}}
+            try:
+                response = self._post(self.url, json=body, timeout=self.timeout)
+                if response.status_code != 200:
+                    raise RuntimeError(f"HTTP {response.status_code}")
+                result = response.json()
+            except Exception as e:
+                self.metrics.inc("sync_requests_total", status="error")
+                print(f"⚠️ ซิงก์ไม่สำเร็จ ({len(rows)} รายการค้าง): {e}")
+                return False
+
+            if not result.get("sync") and "No 'data' field" in str(result.get("message", "")):
+                # patient.gs รุ่นก่อนไม่รู้จัก "sync" (ตอบ error ไม่มี field "data" ยังไม่ได้เขียนอะไรลงชีต)
+                self.metrics.inc("sync_requests_total", status="unsupported")
+                return None
+            if result.get("status") != "ok" or not result.get("sync"):
+                # Error อื่น (เช่น waitLock หมดเวลา) ไม่ได้แปลว่าไม่รองรับ ไว้ลองใหม่รอบหน้า
+                self.metrics.inc("sync_requests_total", status="error")
+                print(f"⚠️ เซิร์ฟเวอร์ปฏิเสธการซิงก์: {result.get('message')}")
+                return False
+
+            hwm = int(result.get("hwm", 0))
+            self.metrics.inc("sync_requests_total", status="ok")
+            previous = self.ledger.synced_seq
+            self.ledger.mark_synced(hwm)
+            if hwm == previous:
+                # ไม่มีความคืบหน้า (เซิร์ฟเวอร์ไม่รับแถวที่ส่ง) หยุดไว้ก่อน กันวนไม่รู้จบ
+                blocked = result.get("blocked")
+                if blocked:
+                    # แถว seq นี้เขียนไม่ได้ (เช่นยังไม่มีชีต) ต้องแก้ที่ชีตก่อน แถวถัดไปจึงจะตามขึ้นไป
+                    print(f"⚠️ ซิงก์ติดที่ seq {blocked.get('seq')}: {blocked.get('message')}")
+                else:
+                    print(f"⚠️ เซิร์ฟเวอร์ไม่รับแถวใหม่ (hwm={hwm}) ไว้ลองใหม่รอบหน้า")
+                return False
+            if hwm < previous:
+                # เซิร์ฟเวอร์จำได้น้อยกว่าเรา (เช่นลำดับขาดช่วง) -> ส่งตั้งแต่ hwm + 1 ใหม่ตามที่เซิร์ฟเวอร์บอก
+                print(f"🔄 เซิร์ฟเวอร์ขอให้ส่งตั้งแต่ seq {hwm + 1} ใหม่")
+            sent += max(0, hwm - previous)
+
+        if sent:
+            print(f"☁️ ซิงก์ขึ้น Sheet {sent} รายการ (hwm={self.ledger.synced_seq})")
+        return True
@@ -0,0 +1,329 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+
+# ขอบบนของแต่ละช่อง Histogram (วินาที) ครอบคลุมตั้งแต่ resize (~ms) ถึง HTTP / จ่ายยา (~วินาที)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Histogram:
+    """
+    Histogram สะสม (แบบ Prometheus) + หน้าต่างค่าล่าสุด (rolling) ไว้คำนวณ p50/p95
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window: int = 500):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += value
+        self.recent.append(value)
+
+    def summary(self):
+        recent = sorted(self.recent)
+        n = len(recent)
+
+        def pct(p):
+            return recent[min(n - 1, int(p * n))] if n else 0.0
+
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": pct(0.50) * 1000,
+            "p95_ms": pct(0.95) * 1000,
+            "max_ms": recent[-1] * 1000 if n else 0.0,
+        }
+
+
+class _Timer:
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """
+    ที่เก็บ Metrics กลางของทั้งระบบ (Thread-safe)
+    - counter: นับสะสม เช่น scans_started_total
+    - gauge: ค่า ณ ขณะนั้น (ตั้งค่าเอง หรือให้ฟังก์ชันคำนวณตอน Export เช่นความยาวคิว Offline)
+    - histogram: เวลาแต่ละขั้น (วินาที) เช่น scan_stage_seconds{stage="detect"}
+    """
+
+    enabled = True
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._gauge_fns = {}
+        self._histograms = {}
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    # ---------- Record ----------
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def gauge_fn(self, name, fn):
+        """ลงทะเบียนฟังก์ชันที่คืนค่า Gauge (ถูกเรียกเฉพาะตอน Export เท่านั้น)"""
+        with self._lock:
+            self._gauge_fns[name] = fn
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(window=self.window)
+            hist.observe(seconds)
+
+    def timer(self, name, **labels):
+        """with metrics.timer("scan_stage_seconds", stage="detect"): ..."""
+        return _Timer(self, name, labels)
+
+    # ---------- Export ----------
+    def _collect_gauges(self):
+        with self._lock:
+            gauges = dict(self._gauges)
+            fns = list(self._gauge_fns.items())
+        for name, fn in fns:
+            try:
+                gauges[(name, ())] = fn()
+            except Exception:
+                pass
+        return gauges
+
+    def prometheus_text(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        gauges = self._collect_gauges()
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: (list(h.counts), h.count, h.total, h.buckets) for k, h in self._histograms.items()}
+
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name in seen:
+                return
+            seen.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, key), value in sorted(counters.items()):
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(key)} {value}")
+        for (name, key), value in sorted(gauges.items()):
+            header(name, "gauge")
+            lines.append(f"{name}{_format_labels(key)} {value}")
+        for (name, key), (counts, count, total, buckets) in sorted(histograms.items()):
+            header(name, "histogram")
+            cumulative = 0
+            for upper, n in zip(buckets, counts):
+                cumulative += n
+                le = "+Inf" if upper == float("inf") else repr(upper)
+                lines.append(f"{name}_bucket{_format_labels(key, ('le', le))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{name}_count{_format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """ข้อมูลแบบ JSON (ใช้ทั้ง Dump ไฟล์ และ /metrics.json)"""
+        gauges = self._collect_gauges()
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: h.summary() for k, h in self._histograms.items()}
+
+        def flat(name, key):
+            return name + _format_labels(key)
+
+        return {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "counters": {flat(*k): v for k, v in sorted(counters.items())},
+            "gauges": {flat(*k): v for k, v in sorted(gauges.items())},
+            "histograms": {flat(*k): v for k, v in sorted(histograms.items())},
+        }
+
+    def dump_json(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+class NullMetrics:
+    """ใช้แทน MetricsRegistry ตอนปิด Metrics: ทุกเมธอดไม่ทำอะไร (แทบไม่มี Overhead)"""
+
+    enabled = False
+    _null_timer = nullcontext()
+
+    def describe(self, name, text):
+        pass
+
+    def inc(self, name, value=1, **labels):
+        pass
+
+    def set_gauge(self, name, value, **labels):
+        pass
+
+    def gauge_fn(self, name, fn):
+        pass
+
+    def observe(self, name, seconds, **labels):
+        pass
+
+    def timer(self, name, **labels):
+        return self._null_timer
+
+    def prometheus_text(self):
+        return ""
+
+    def snapshot(self):
+        return {}
+
+
+class MetricsExporter:
+    """
+    - HTTP บน localhost: GET /metrics (Prometheus text) และ /metrics.json
+    - Dump ไฟล์ JSON ทุก dump_interval วินาที (เขียนแบบ atomic)
+    """
+
+    def __init__(self, registry, host="127.0.0.1", port=None, dump_path=None, dump_interval=30.0):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.server = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self.port is not None:
+            try:
+                self.server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+            except OSError as e:
+                print(f"⚠️ เปิด Metrics endpoint ที่พอร์ต {self.port} ไม่ได้: {e}")
+            else:
+                self.server.daemon_threads = True
+                threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+                print(f"📈 Metrics: http://{self.host}:{self.server.server_port}/metrics")
+        if self.dump_path:
+            threading.Thread(target=self._dump_loop, name="metrics-dump", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.dump_path:
+            self._dump()
+
+    def _dump(self):
+        try:
+            self.registry.dump_json(self.dump_path)
+        except OSError as e:
+            print(f"⚠️ บันทึก {self.dump_path} ไม่ได้: {e}")
+
+    def _dump_loop(self):
+        while not self._stop.wait(self.dump_interval):
+            self._dump()
+
+    def _make_handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.prometheus_text().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot(), ensure_ascii=False).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # ไม่พิมพ์ทุก Request ที่ Prometheus มาดึง
+
+        return Handler
+
+
+_metrics = None
+_exporter = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """คืน MetricsRegistry ตัวเดียวของทั้งโปรแกรม (หรือ NullMetrics ถ้า METRICS_ENABLED = False)"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry(window=config.METRICS_WINDOW) if config.METRICS_ENABLED else NullMetrics()
+        return _metrics
+
+
+def start_exporter():
+    """เปิด HTTP endpoint + Dump JSON ตาม config (เรียกครั้งเดียวตอนเปิดโปรแกรม)"""
+    global _exporter
+    metrics = get_metrics()
+    if not metrics.enabled or _exporter is not None:
+        return _exporter
+    _exporter = MetricsExporter(
+        metrics,
+        host=config.METRICS_HOST,
+        port=config.METRICS_PORT,
+        dump_path=config.METRICS_DUMP_FILE,
+        dump_interval=config.METRICS_DUMP_INTERVAL,
+    ).start()
+    return _exporter
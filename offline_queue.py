@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+
+
+class OfflineLogQueue:
+    """
+    คิว Log ตอนออฟไลน์ แบบ Append-only Journal (JSON Lines)
+    - append: เขียนต่อท้าย 1 บรรทัด O(1) ไม่ต้องอ่าน/เขียนไฟล์ทั้งก้อน
+    - ack: จำ Offset (byte) ของรายการที่ส่งสำเร็จแล้วไว้ในไฟล์ .ack
+    - compact: เมื่อส่วนที่ ack แล้วใหญ่พอ ค่อยเขียนไฟล์ใหม่เฉพาะส่วนที่เหลือ (atomic rename)
+    - ถ้าเครื่องดับกลางการเขียน บรรทัดสุดท้ายที่ไม่สมบูรณ์จะถูกตัดทิ้งตอนเปิดไฟล์
+    - ย้ายข้อมูลจาก offline_logs.json (แบบเก่า) ให้อัตโนมัติ
+
+    fsync_policy: "always" = fsync ทุกรายการ, "batch" = fsync ทุก fsync_every รายการ, "never" = ปล่อยให้ OS จัดการ
+    """
+
+    def __init__(
+        self,
+        path: str,
+        legacy_path: str | None = None,
+        fsync_policy: str = "always",
+        fsync_every: int = 10,
+        compact_bytes: int = 64 * 1024,
+    ):
+        self.path = path
+        self.ack_path = path + ".ack"
+        self.fsync_policy = fsync_policy
+        self.fsync_every = fsync_every
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        self._unsynced = 0
+
+        self._repair_tail()
+        self.acked_offset = self._read_ack()
+        # จำนวนรายการค้างส่ง นับครั้งเดียวตอนเปิดไฟล์ แล้วปรับตาม append / ack / compact
+        self._pending = self._count_lines(self.acked_offset, self._size())
+        if legacy_path and os.path.exists(legacy_path):
+            self._migrate_legacy(legacy_path)
+
+    # ---------- Offset / Recovery ----------
+    def _read_ack(self):
+        try:
+            with open(self.ack_path, "r", encoding="utf-8") as f:
+                offset = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            offset = 0
+        return min(offset, self._size())
+
+    def _write_ack(self, offset):
+        tmp_path = self.ack_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.ack_path)
+        self.acked_offset = offset
+
+    def _size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def _count_lines(self, start, end):
+        if end <= start:
+            return 0
+        count = 0
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0 and (chunk := f.read(min(remaining, 1 << 16))):
+                count += chunk.count(b"\n")
+                remaining -= len(chunk)
+        return count
+
+    def _repair_tail(self):
+        """ตัดบรรทัดสุดท้ายที่เขียนไม่จบ (ไม่มี \\n) ทิ้ง ไล่หา \\n ย้อนหลังทีละก้อนจนเจอ"""
+        size = self._size()
+        if size == 0:
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            keep, end = 0, size
+            while end > 0:
+                start = max(end - (1 << 16), 0)
+                f.seek(start)
+                cut = f.read(end - start).rfind(b"\n")
+                if cut >= 0:
+                    keep = start + cut + 1
+                    break
+                end = start
+            f.truncate(keep)
+        print(f"⚠️ พบ Log บรรทัดสุดท้ายไม่สมบูรณ์ ตัดทิ้งแล้ว ({self.path})")
+
+    def _migrate_legacy(self, legacy_path):
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                logs = json.load(f)
+        except (OSError, ValueError) as e:
+            # อ่านไม่ได้ -> เก็บไฟล์ไว้ข้างๆ ให้กู้คืนเองได้ ห้ามลบทิ้ง
+            corrupt_path = legacy_path + ".corrupt"
+            os.replace(legacy_path, corrupt_path)
+            print(f"⚠️ อ่าน Offline Log เดิมไม่ได้ ({e}) ย้ายไปไว้ที่ {corrupt_path}")
+            return
+        for payload in logs:
+            self.append(payload, sync=False)
+        self.flush()
+        os.remove(legacy_path)
+        print(f"📦 ย้าย Offline Log เดิม {len(logs)} รายการจาก {legacy_path} -> {self.path}")
+
+    # ---------- Public API ----------
+    def append(self, payload, sync: bool | None = None):
+        line = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.write(line)
+                self._unsynced += 1
+                self._pending += 1
+                if sync is None:
+                    sync = self.fsync_policy == "always" or (
+                        self.fsync_policy == "batch" and self._unsynced >= self.fsync_every
+                    )
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self._unsynced = 0
+
+    def flush(self):
+        """บังคับ fsync รายการที่ยังไม่ถูก sync"""
+        with self._lock:
+            if self._unsynced and os.path.exists(self.path):
+                with open(self.path, "ab") as f:
+                    os.fsync(f.fileno())
+            self._unsynced = 0
+
+    def pending(self, limit: int | None = None):
+        """คืน list ของ (end_offset, payload) ที่ยังไม่ถูก ack เรียงตามลำดับเวลา"""
+        entries = []
+        with self._lock:
+            if not os.path.exists(self.path):
+                return entries
+            with open(self.path, "rb") as f:
+                f.seek(self.acked_offset)
+                offset = self.acked_offset
+                for raw in f:
+                    offset += len(raw)
+                    try:
+                        entries.append((offset, json.loads(raw)))
+                    except ValueError:
+                        continue  # ข้ามบรรทัดเสีย แต่ยัง ack ผ่านไปได้
+                    if limit is not None and len(entries) >= limit:
+                        break
+        return entries
+
+    def __len__(self):
+        return self._pending
+
+    def ack(self, end_offset: int):
+        """ยืนยันว่าทุกรายการจนถึง end_offset ส่งสำเร็จแล้ว"""
+        with self._lock:
+            if end_offset <= self.acked_offset:
+                return
+            acked = self._count_lines(self.acked_offset, end_offset)
+            self._write_ack(end_offset)
+            self._pending = max(0, self._pending - acked)
+
+    def compact(self):
+        """
+        เรียกหลังส่งย้อนหลังเสร็จแต่ละรอบ (Offset จาก pending() เดิมจะใช้ไม่ได้หลัง Compact)
+        """
+        with self._lock:
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        size = self._size()
+        if size == 0:
+            return
+        if self.acked_offset >= size:
+            # ส่งหมดแล้ว ลบไฟล์ทิ้ง (เหมือนพฤติกรรมเดิม)
+            for p in (self.path, self.ack_path):
+                if os.path.exists(p):
+                    os.remove(p)
+            self.acked_offset = 0
+            self._pending = 0
+            return
+        if self.acked_offset < self.compact_bytes:
+            return
+
+        tmp_path = self.path + ".tmp"
+        with open(self.path, "rb") as src, open(tmp_path, "wb") as dst:
+            src.seek(self.acked_offset)
+            while chunk := src.read(1 << 16):
+                dst.write(chunk)
+            dst.flush()
+            os.fsync(dst.fileno())
+        # เขียน ack = 0 ก่อน rename: ถ้าดับระหว่างนี้ อย่างแย่คือส่งซ้ำ ไม่มีข้อมูลหาย
+        self._write_ack(0)
+        os.replace(tmp_path, self.path)
+        print(f"🧹 Compact Offline Log เรียบร้อย ({self.path})")
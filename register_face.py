@@ -1,32 +1,34 @@
 import cv2
-import face_recognition
-import mediapipe as mp
 import time
 import os
-import re
 
-# ฟังก์ชันสำหรับอัปเดตไฟล์ config.py (คงเดิม)
-def update_config(sheet_number):
-    config_path = "config.py"
+import config
+from camera_service import get_camera_service
+from enrollment import EnrollmentSession
+from face_detectors import create_face_detector
+from face_gallery import FaceGallery
+from gesture_detector import GestureDetector
+from state_store import get_state_store
+from ui_overlay import Layer, OverlayCache, Tint, render_sprite
+
+# ฟังก์ชันสำหรับบันทึกผู้ป่วยที่เลือก (เก็บใน State Store แทนการแก้ไฟล์ config.py)
+def update_patient_state(sheet_number, image_path, encodings=None):
     new_sheet_name = f"Patient{sheet_number}"
     new_known_name = f"Patient{sheet_number}"
     
     try:
-        with open(config_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-            
-        with open(config_path, "w", encoding="utf-8") as f:
-            for line in lines:
-                if line.strip().startswith("SHEET_NAME ="):
-                    f.write(f'SHEET_NAME = "{new_sheet_name}"      # อัปเดตอัตโนมัติจากหน้าลงทะเบียน\n')
-                elif line.strip().startswith("KNOWN_NAME ="):
-                    f.write(f'KNOWN_NAME = "{new_known_name}"      # อัปเดตอัตโนมัติจากหน้าลงทะเบียน\n')
-                else:
-                    f.write(line)
-        print(f"✅ อัปเดต config.py เรียบร้อย: Sheet -> {new_sheet_name}")
+        references = 0
+        if encodings is not None and len(encodings) > 0:
+            # เขียน Encoding หลายภาพลง Gallery ตรงๆ (ฝั่งสแกนไม่ต้องเข้ารหัสรูปใหม่)
+            gallery = FaceGallery(config.GALLERY_PATH)
+            gallery.set_patient(new_known_name, encodings)
+            gallery.save()
+            references = len(encodings)
+        get_state_store().register_patient(new_sheet_name, new_known_name, image_path, references=references)
+        print(f"✅ บันทึกผู้ป่วยใหม่เรียบร้อย: Sheet -> {new_sheet_name}")
         return new_sheet_name
     except Exception as e:
-        print(f"❌ ไม่สามารถแก้ไข config.py: {e}")
+        print(f"❌ ไม่สามารถบันทึกข้อมูลผู้ป่วย: {e}")
         return None
 
 # ==========================================
@@ -50,6 +52,25 @@ GAP = 20
 START_X = 440
 START_Y = 250  # ขยับลงมาหน่อยเพื่อให้มีที่แสดงผลด้านบน
 
+# Layer ของนิ่งที่วาดไว้แล้ว (สร้างใหม่เมื่อความละเอียด/ธีมเปลี่ยน)
+_overlays = OverlayCache(config.UI_THEME)
+
+# ตัวตรวจจับใบหน้าสำหรับลงทะเบียน (สร้างครั้งแรกที่ใช้ แล้วใช้ซ้ำ)
+_enroll_detector = None
+
+def _new_enrollment():
+    global _enroll_detector
+    if _enroll_detector is None:
+        _enroll_detector = create_face_detector(config.FACE_DETECTOR)
+    return EnrollmentSession(
+        _enroll_detector,
+        top_k=config.ENROLL_TOP_K,
+        min_distance=config.ENROLL_MIN_DISTANCE,
+        min_face_fraction=config.ENROLL_MIN_FACE_FRACTION,
+        max_yaw=config.ENROLL_MAX_YAW,
+        encoding_model=config.FACE_ENCODING_MODEL,
+    )
+
 def mouse_callback(event, x, y, flags, param):
     global selected_number, current_input_str
     
@@ -75,24 +96,51 @@ def mouse_callback(event, x, y, flags, param):
                         current_input_str += val
                 return
 
+def _build_numpad(width, height, theme):
+    """ของนิ่งของหน้า Numpad: หัวข้อ / กล่องแสดงผล / ปุ่มทั้งหมด (วาดครั้งเดียวต่อความละเอียด)"""
+    display_box_y = START_Y - 120
+
+    def draw(img, color):
+        # 2. หัวข้อ
+        cv2.putText(img, "Enter Patient ID", (width//2 - 200, 100), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.5, color(theme["text"]), 3)
+        
+        # 3. ช่องแสดงผลตัวเลข (Display Box)
+        cv2.rectangle(img, (START_X, display_box_y), 
+                      (START_X + (3*BTN_SIZE) + (2*GAP), display_box_y + 100), color(theme["text"]), -1)
+
+        # 4. วาดปุ่มกด
+        for btn in BUTTONS_LAYOUT:
+            label, val, r, c = btn
+            bx = START_X + (c * (BTN_SIZE + GAP))
+            by = START_Y + (r * (BTN_SIZE + GAP))
+            
+            # กำหนดสีปุ่ม
+            if val == 'ok':
+                btn_color = theme["ok"]       # สีเขียว
+            elif val == 'del':
+                btn_color = theme["delete"]   # สีแดงอ่อน/ส้ม
+            else:
+                btn_color = theme["accent"]   # สีธีมเดิม
+                
+            cv2.rectangle(img, (bx, by), (bx + BTN_SIZE, by + BTN_SIZE), color(btn_color), -1)
+            cv2.rectangle(img, (bx, by), (bx + BTN_SIZE, by + BTN_SIZE), color(theme["text"]), 2)
+            
+            # วาดตัวหนังสือบนปุ่ม
+            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 1.0, 2)[0]
+            tx = bx + (BTN_SIZE - label_size[0]) // 2
+            ty = by + (BTN_SIZE + label_size[1]) // 2
+            cv2.putText(img, label, (tx, ty), cv2.FONT_HERSHEY_SIMPLEX, 1.0, color(theme["text"]), 2)
+
+    # 1. พื้นหลังจางๆ สีดำ (ทั้งเฟรม)
+    return Layer(Tint(0, height, theme["ink"], theme["dim_alpha"]), render_sprite(width, height, draw))
+
 def draw_numpad(frame):
-    height, width, _ = frame.shape
-    overlay = frame.copy()
-    
-    # 1. พื้นหลังจางๆ สีดำ
-    cv2.rectangle(overlay, (0, 0), (width, height), (0, 0, 0), -1)
-    cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
-    
-    # 2. หัวข้อ
-    cv2.putText(frame, "Enter Patient ID", (width//2 - 200, 100), 
-                cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
-    
-    # 3. ช่องแสดงผลตัวเลข (Display Box)
+    theme = _overlays.theme
+    _overlays.draw(frame, "numpad", _build_numpad)
+
+    # ส่วนที่เปลี่ยนทุกเฟรม: ตัวเลขที่พิมพ์
     display_box_y = START_Y - 120
-    cv2.rectangle(frame, (START_X, display_box_y), 
-                  (START_X + (3*BTN_SIZE) + (2*GAP), display_box_y + 100), (255, 255, 255), -1)
-    
-    # แสดงตัวเลขที่พิมพ์
     display_text = current_input_str if current_input_str else "_"
     text_size = cv2.getTextSize(display_text, cv2.FONT_HERSHEY_SIMPLEX, 2, 4)[0]
     
@@ -102,42 +150,27 @@ def draw_numpad(frame):
     text_y = display_box_y + 70
     
     # สีตัวหนังสือ (ถ้ายังไม่พิมพ์เป็นสีเทา, พิมพ์แล้วเป็นสีดำ)
-    txt_color = (0, 0, 0) if current_input_str else (200, 200, 200)
+    txt_color = theme["ink"] if current_input_str else theme["placeholder"]
     cv2.putText(frame, display_text, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 2, txt_color, 4)
 
-    # 4. วาดปุ่มกด
-    for btn in BUTTONS_LAYOUT:
-        label, val, r, c = btn
-        bx = START_X + (c * (BTN_SIZE + GAP))
-        by = START_Y + (r * (BTN_SIZE + GAP))
-        
-        # กำหนดสีปุ่ม
-        if val == 'ok':
-            color = (100, 200, 100) # สีเขียว
-        elif val == 'del':
-            color = (100, 100, 200) # สีแดงอ่อน/ส้ม
-        else:
-            color = (161, 214, 162) # สีธีมเดิม
-            
-        cv2.rectangle(frame, (bx, by), (bx + BTN_SIZE, by + BTN_SIZE), color, -1)
-        cv2.rectangle(frame, (bx, by), (bx + BTN_SIZE, by + BTN_SIZE), (255, 255, 255), 2)
-        
-        # วาดตัวหนังสือบนปุ่ม
-        label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 1.0, 2)[0]
-        tx = bx + (BTN_SIZE - label_size[0]) // 2
-        ty = by + (BTN_SIZE + label_size[1]) // 2
-        cv2.putText(frame, label, (tx, ty), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
-
-
-def register_new_face(filename="patient.jpeg"):
-    # --- ตั้งค่า MediaPipe ---
-    mp_hands = mp.solutions.hands
-    hands = mp_hands.Hands(
-        max_num_hands=1,
+
+def create_gesture_detector():
+    """ตัวตรวจจับมือตามค่าใน config (Main สร้างครั้งเดียวใน Warmup แล้วส่งเข้ามาทุกครั้ง)"""
+    return GestureDetector(
+        max_hands=1,
         min_detection_confidence=0.7,
-        min_tracking_confidence=0.5
+        min_tracking_confidence=0.5,
+        process_width=config.GESTURE_PROCESS_WIDTH,
+        max_rate=config.GESTURE_MAX_RATE,
     )
-    mp_draw = mp.solutions.drawing_utils
+
+
+def register_new_face(filename="patient.jpeg", gesture_detector=None):
+    # --- ตั้งค่า MediaPipe (ใช้ตัวที่แอปเตรียมไว้ ถ้าไม่มีค่อยสร้างเองแล้วปิดตอนจบ) ---
+    owns_detector = gesture_detector is None
+    if owns_detector:
+        gesture_detector = create_gesture_detector()
+    gesture_detector.reset()
 
     # --- ตัวแปรระบบ ---
     is_counting_down = False 
@@ -146,10 +179,8 @@ def register_new_face(filename="patient.jpeg"):
     hand_hold_start_time = 0  
     REQUIRED_HOLD_TIME = 1.5  
 
-    cap = cv2.VideoCapture(0)
-    # ปรับความละเอียด
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+    # ยืมกล้องตัวเดียวกับหน้าสแกน (เปิดค้างไว้แล้ว ไม่ต้องรอกล้องปรับแสงใหม่)
+    cap = get_camera_service().acquire("register")
 
     window_name = "Register New Face"
     cv2.namedWindow(window_name, cv2.WND_PROP_FULLSCREEN)
@@ -163,6 +194,8 @@ def register_new_face(filename="patient.jpeg"):
     print("--------------------------------------------------")
 
     face_saved = False 
+    enrollment = None          # EnrollmentSession ระหว่างถ่ายต่อเนื่อง
+    enrolled_encodings = None  # Encoding ที่เลือกแล้ว (Top-K)
 
     # รีเซ็ตค่า Input ทุกครั้งที่เริ่มฟังก์ชันใหม่
     global selected_number, current_input_str
@@ -181,23 +214,13 @@ def register_new_face(filename="patient.jpeg"):
         if not face_saved:
             display_frame = frame.copy()
             height, width, _ = frame.shape
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
             if not is_counting_down:
-                results = hands.process(rgb_frame)
+                # ตรวจมือบนภาพย่อ + จำกัดความถี่ (เฟรมที่ข้ามใช้ผลล่าสุด) ภาพพรีวิวจึงลื่นเท่าเดิม
                 hand_detected_5_fingers = False
-                
-                if results.multi_hand_landmarks:
-                    for hand_landmarks in results.multi_hand_landmarks:
-                        mp_draw.draw_landmarks(display_frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-                        lm_list = hand_landmarks.landmark
-                        fingers_up = []
-                        tips_ids = [8, 12, 16, 20]
-                        pip_ids = [6, 10, 14, 18]
-                        for tip, pip in zip(tips_ids, pip_ids):
-                            if lm_list[tip].y < lm_list[pip].y: fingers_up.append(True)
-                            else: fingers_up.append(False)
-                        if fingers_up.count(True) == 4: hand_detected_5_fingers = True
+                for hand_landmarks in gesture_detector.process(frame):
+                    gesture_detector.draw(display_frame, hand_landmarks)
+                    if GestureDetector.is_open_palm(hand_landmarks): hand_detected_5_fingers = True
 
                 if hand_detected_5_fingers:
                     if hand_hold_start_time == 0: hand_hold_start_time = time.time()
@@ -223,17 +246,28 @@ def register_new_face(filename="patient.jpeg"):
                     text_size = cv2.getTextSize(str(seconds_display), cv2.FONT_HERSHEY_SIMPLEX, 10, 20)[0]
                     cv2.putText(display_frame, str(seconds_display), ((width - text_size[0]) // 2, (height + text_size[1]) // 2), cv2.FONT_HERSHEY_SIMPLEX, 10, (0, 255, 255), 20)
                 else:
-                    face_locations = face_recognition.face_locations(rgb_frame)
-                    if len(face_locations) > 0:
-                        cv2.imwrite(filename, frame)
-                        print(f"✅ บันทึกรูปภาพเรียบร้อย: {filename}")
-                        cv2.rectangle(display_frame, (0,0), (width, height), (255, 255, 255), -1)
-                        cv2.imshow(window_name, display_frame)
-                        cv2.waitKey(100)
-                        face_saved = True 
-                    else:
-                        print("⚠️ ไม่พบใบหน้า! ลองใหม่อีกครั้ง")
-                        is_counting_down = False
+                    # 📸 ถ่ายต่อเนื่อง ให้คะแนนทุกเฟรม แล้วเก็บ Top-K ที่ดีที่สุด
+                    if enrollment is None:
+                        enrollment = _new_enrollment()
+                    enrollment.add_frame(frame)
+                    captured = len(enrollment.candidates) + enrollment.rejected
+                    cv2.putText(display_frame, f"Hold still... {captured}/{config.ENROLL_BURST_FRAMES}", (width//2 - 150, 90), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+
+                    if captured >= config.ENROLL_BURST_FRAMES:
+                        chosen = enrollment.select()
+                        if chosen:
+                            cv2.imwrite(filename, chosen[0].frame)
+                            enrolled_encodings = enrollment.encodings_of(chosen)
+                            print(f"✅ บันทึกรูปภาพเรียบร้อย: {filename} (เก็บ {len(chosen)} ภาพอ้างอิง จาก {captured} เฟรม,"
+                                  f" คุณภาพสูงสุด {chosen[0].quality:.2f})")
+                            cv2.rectangle(display_frame, (0,0), (width, height), (255, 255, 255), -1)
+                            cv2.imshow(window_name, display_frame)
+                            cv2.waitKey(100)
+                            face_saved = True 
+                        else:
+                            print("⚠️ ไม่พบใบหน้าที่ชัดพอ! ลองใหม่อีกครั้ง")
+                            is_counting_down = False
+                        enrollment = None
             
             if not face_saved:
                 box_size = 400
@@ -254,8 +288,8 @@ def register_new_face(filename="patient.jpeg"):
                 print(f"🔢 Selected Patient ID: {selected_number}")
                 cv2.waitKey(500)
                 
-                # อัปเดตไฟล์ Config
-                update_config(selected_number)
+                # บันทึกผู้ป่วยใหม่ + Encoding หลายภาพ (ผู้ที่ subscribe ไว้ เช่น FaceVerifier จะได้รับแจ้งทันที)
+                update_patient_state(selected_number, filename, enrolled_encodings)
                 
                 cv2.waitKey(1000)
                 break 
@@ -266,6 +300,8 @@ def register_new_face(filename="patient.jpeg"):
     cap.release()
     cv2.destroyAllWindows()
     selected_number = None
+    if owns_detector:
+        gesture_detector.close()
 
 if __name__ == "__main__":
     register_new_face()
\ No newline at end of file
@@ -0,0 +1,106 @@
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+KEY_NONE = -1
+KEY_QUIT = ord('q')
+
+
+class CvWindowDisplay:
+    """หน้าจอสแกนแบบเดิม: หน้าต่าง OpenCV เต็มจอ (ใช้ตอนรัน Facescan.py เดี่ยวๆ)"""
+
+    def __init__(self, window_name: str = "Tuberbox Scan"):
+        self.window_name = window_name
+
+    def open(self):
+        cv2.namedWindow(self.window_name, cv2.WND_PROP_FULLSCREEN)
+        cv2.setWindowProperty(self.window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+
+    def show(self, frame):
+        cv2.imshow(self.window_name, frame)
+
+    def wait_key(self, ms: int) -> int:
+        return cv2.waitKey(ms) & 0xFF
+
+    def close(self):
+        cv2.destroyAllWindows()
+
+
+class TkScanView:
+    """
+    หน้าจอสแกนที่ฝังอยู่ใน Canvas เดิมของ Tk (ไม่สร้าง/ทำลายหน้าต่างใหม่)
+    - Worker Thread (FaceVerifier.run) เรียก show(): ย่อ + แปลงสีลง Buffer หลัง แล้วสลับเป็นเฟรมพร้อมแสดง
+    - เธรดหลักของ Tk: _pump() หยิบเฟรมล่าสุด (ช่องเดียว ไม่มีคิวค้าง) แล้ว paste ลง PhotoImage ตัวเดิม
+    - Buffer 3 ชุด (กำลังเขียน / พร้อมแสดง / กำลังแสดง) ทั้งสองเธรดไม่แตะ Array เดียวกันพร้อมกัน
+    ห้ามแตะ Tk จาก Worker Thread: ทุกอย่างที่เกี่ยวกับ Canvas ทำใน start() / stop() / _pump() เท่านั้น
+    """
+
+    def __init__(self, root, canvas, width: int, height: int, fps: float = 30.0):
+        self.root = root
+        self.canvas = canvas
+        self.width = width
+        self.height = height
+        self.interval_ms = max(1, int(1000 / fps))
+
+        self._buffers = [np.zeros((height, width, 3), np.uint8) for _ in range(3)]
+        self._back, self._ready, self._front = 0, 1, 2
+        self._scaled = None
+        self._fresh = False
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+
+        self.photo = ImageTk.PhotoImage(Image.new("RGB", (width, height)))
+        self.item = self.canvas.create_image(0, 0, image=self.photo, anchor="nw", state="hidden")
+        self.canvas.tag_bind(self.item, "<Button-1>", lambda event: self.cancel())
+        self._pump_id = None
+
+    # ---------- Worker Thread ----------
+    def open(self):
+        self._cancel.clear()
+
+    def show(self, frame):
+        back = self._buffers[self._back]
+        h, w = frame.shape[:2]
+        if (w, h) != (self.width, self.height):
+            if self._scaled is None:
+                self._scaled = np.empty((self.height, self.width, 3), np.uint8)
+            frame = cv2.resize(frame, (self.width, self.height), dst=self._scaled, interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=back)
+        with self._lock:
+            self._back, self._ready = self._ready, self._back
+            self._fresh = True
+
+    def wait_key(self, ms: int) -> int:
+        return KEY_QUIT if self._cancel.wait(ms / 1000.0) else KEY_NONE
+
+    def close(self):
+        pass
+
+    def cancel(self):
+        """ยกเลิกการสแกน (แตะภาพ / กด q) Worker จะเห็นผ่าน wait_key()"""
+        self._cancel.set()
+
+    # ---------- Tk Main Thread ----------
+    def start(self):
+        self._fresh = False
+        self.canvas.itemconfigure(self.item, state="normal")
+        self.canvas.tag_raise(self.item)
+        self._pump()
+
+    def stop(self):
+        if self._pump_id is not None:
+            self.root.after_cancel(self._pump_id)
+            self._pump_id = None
+        self.canvas.itemconfigure(self.item, state="hidden")
+
+    def _pump(self):
+        with self._lock:
+            fresh = self._fresh
+            if fresh:
+                self._front, self._ready = self._ready, self._front
+                self._fresh = False
+        if fresh:
+            self.photo.paste(Image.frombuffer("RGB", (self.width, self.height), self._buffers[self._front], "raw", "RGB", 0, 1))
+        self._pump_id = self.root.after(self.interval_ms, self._pump)
@@ -0,0 +1,207 @@
+"""
+บันทึก / เล่นซ้ำ Session ของกล้อง สำหรับวัดประสิทธิภาพโดยไม่ต้องมีเว็บแคมจริง
+
+รูปแบบไฟล์ (1 Session = 1 โฟลเดอร์):
+    frames.avi        วิดีโอ MJPG ทุกเฟรมที่อ่านจากกล้อง
+    timestamps.json   เวลาของแต่ละเฟรม (วินาทีนับจากเฟรมแรก)
+    meta.json         ความละเอียด / เวลาเริ่ม / expected (ชื่อผู้ป่วยที่ควรผ่าน หรือ null = ไม่ควรผ่าน)
+
+บันทึกจากกล้องโดยตรง:
+    python session_recorder.py recordings/patient3_day --seconds 15 --expected Patient3
+"""
+import argparse
+import json
+import os
+import time
+
+import cv2
+
+FRAMES_FILE = "frames.avi"
+TIMESTAMPS_FILE = "timestamps.json"
+META_FILE = "meta.json"
+
+
+class SessionRecorder:
+    """เขียนเฟรม + เวลาลงโฟลเดอร์ Session"""
+
+    def __init__(self, path: str, expected: str | None = None, fps_hint: float = 30.0, clock=time.monotonic):
+        self.path = path
+        self.expected = expected
+        self.fps_hint = fps_hint
+        self.clock = clock
+        self.writer = None
+        self.timestamps = []
+        self.size = None
+        self._t0 = None
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, frame):
+        now = self.clock()
+        if self.writer is None:
+            h, w = frame.shape[:2]
+            self.size = (w, h)
+            self._t0 = now
+            fourcc = cv2.VideoWriter_fourcc(*"MJPG")
+            self.writer = cv2.VideoWriter(os.path.join(self.path, FRAMES_FILE), fourcc, self.fps_hint, self.size)
+        self.writer.write(frame)
+        self.timestamps.append(round(now - self._t0, 4))
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.writer.release()
+        self.writer = None
+        with open(os.path.join(self.path, TIMESTAMPS_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.timestamps, f)
+        meta = {
+            "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "width": self.size[0],
+            "height": self.size[1],
+            "frames": len(self.timestamps),
+            "expected": self.expected,
+        }
+        with open(os.path.join(self.path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        print(f"🎞️ บันทึก Session {len(self.timestamps)} เฟรม -> {self.path}")
+
+
+class RecordingCapture:
+    """ครอบ cv2.VideoCapture: ใช้งานเหมือนเดิม แต่ทุกเฟรมที่อ่านจะถูกบันทึกลง Session ด้วย"""
+
+    def __init__(self, capture, recorder: SessionRecorder):
+        self.capture = capture
+        self.recorder = recorder
+
+    def read(self):
+        ret, frame = self.capture.read()
+        if ret:
+            self.recorder.write(frame)
+        return ret, frame
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def set(self, prop, value):
+        return self.capture.set(prop, value)
+
+    def get(self, prop):
+        return self.capture.get(prop)
+
+    def release(self):
+        self.recorder.close()
+        self.capture.release()
+
+
+class ReplayClock:
+    """
+    นาฬิกาเสมือนของการเล่นซ้ำ: เดินตามเวลาของเฟรมที่อ่านล่าสุด ไม่ใช่เวลาจริง
+    ใช้แทน time.time / time.monotonic เพื่อให้การนับถือค้าง / Re-verify ได้ผลเหมือนเดิมทุกครั้ง
+    """
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def advance_to(self, t: float):
+        self.now = max(self.now, t)
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+class ReplayCapture:
+    """
+    ใช้แทน cv2.VideoCapture โดยอ่านจากโฟลเดอร์ Session
+    ทุกครั้งที่ read() จะเลื่อน ReplayClock ไปยังเวลาของเฟรมนั้น (ถ้ามี clock)
+    """
+
+    def __init__(self, path: str, clock: ReplayClock | None = None):
+        self.path = path
+        self.clock = clock
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, TIMESTAMPS_FILE), "r", encoding="utf-8") as f:
+            self.timestamps = json.load(f)
+        self.capture = cv2.VideoCapture(os.path.join(path, FRAMES_FILE))
+        self.index = 0
+
+    @property
+    def expected(self):
+        return self.meta.get("expected")
+
+    def read(self):
+        if self.index >= len(self.timestamps):
+            return False, None
+        ret, frame = self.capture.read()
+        if not ret:
+            return False, None
+        if self.clock is not None:
+            self.clock.advance_to(self.timestamps[self.index])
+        self.index += 1
+        return True, frame
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def set(self, prop, value):
+        return False  # ความละเอียดถูกกำหนดไว้ตอนบันทึกแล้ว
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.meta["width"])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.meta["height"])
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.timestamps))
+        return self.capture.get(prop)
+
+    def release(self):
+        self.capture.release()
+
+
+def list_sessions(paths):
+    """คืนรายการโฟลเดอร์ Session ทั้งหมดใต้ paths (ค้นลึกลงไปในโฟลเดอร์ย่อย)"""
+    sessions = []
+    for root_path in paths:
+        for dirpath, _, filenames in os.walk(root_path):
+            if META_FILE in filenames and FRAMES_FILE in filenames:
+                sessions.append(dirpath)
+    return sorted(sessions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir")
+    parser.add_argument("--camera", type=int, default=0)
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--expected", default=None, help="ชื่อผู้ป่วยที่ควรสแกนผ่าน (ไม่ใส่ = ไม่ควรผ่าน)")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.camera)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, args.width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, args.height)
+    if not cap.isOpened():
+        raise SystemExit("❌ เปิดกล้องไม่ได้")
+
+    capture = RecordingCapture(cap, SessionRecorder(args.out_dir, expected=args.expected))
+    print(f"🔴 กำลังบันทึก {args.seconds:.0f} วินาที (กด q เพื่อหยุด)")
+    end = time.monotonic() + args.seconds
+    try:
+        while time.monotonic() < end:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            cv2.imshow("Recording", frame)
+            if cv2.waitKey(1) & 0xFF == ord("q"):
+                break
+    finally:
+        capture.release()
+        cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()
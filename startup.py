@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+import traceback
+
+
+class StartupProfiler:
+    """
+    จับเวลาการเปิดโปรแกรม
+    - first_paint: หน้าจอหลักของ Tk แสดงผลครั้งแรก
+    - scan_ready: โหลดโมเดล / กล้อง / Serial เสร็จ พร้อมสแกน
+    """
+
+    def __init__(self, t0: float | None = None):
+        self.t0 = t0 if t0 is not None else time.perf_counter()
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name: str):
+        with self._lock:
+            if name not in self.marks:
+                self.marks[name] = time.perf_counter() - self.t0
+        return self.marks[name]
+
+    def report(self, path: str | None = None):
+        with self._lock:
+            marks = dict(sorted(self.marks.items(), key=lambda kv: kv[1]))
+        print("⏱️ Startup profile:")
+        for name, t in marks.items():
+            print(f"   {name:<24} {t * 1000:8.1f} ms")
+        if path:
+            record = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "marks_ms": {k: round(v * 1000, 1) for k, v in marks.items()}}
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return marks
+
+
+class Warmup:
+    """
+    โหลดของหนัก (face_recognition, mediapipe, Serial) ใน Thread เบื้องหลัง
+    ให้หน้าจอ Tk ขึ้นก่อนทันที แล้วค่อยเปลี่ยนสถานะเป็น "ready" เมื่อทุกขั้นเสร็จ
+    steps: list ของ (ชื่อ, ฟังก์ชัน) ทำตามลำดับ ผลลัพธ์เก็บไว้ใน results[ชื่อ]
+    """
+
+    def __init__(self, steps, profiler: StartupProfiler | None = None):
+        self.steps = steps
+        self.profiler = profiler
+        self.state = "pending"        # pending / loading / ready / error
+        self.current_step = None
+        self.results = {}
+        self.error = None
+        self._done = threading.Event()
+
+    def start(self):
+        self.state = "loading"
+        threading.Thread(target=self._run, name="warmup", daemon=True).start()
+        return self
+
+    def _run(self):
+        try:
+            for name, fn in self.steps:
+                self.current_step = name
+                self.results[name] = fn()
+                if self.profiler:
+                    self.profiler.mark(f"warmup:{name}")
+            self.state = "ready"
+        except Exception as e:
+            self.error = e
+            self.state = "error"
+            traceback.print_exc()
+        finally:
+            self.current_step = None
+            self._done.set()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
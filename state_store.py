@@ -0,0 +1,179 @@
+import copy
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+SCHEMA_VERSION = 1
+
+
+class StateStore:
+    """
+    ที่เก็บสถานะที่เปลี่ยนระหว่างใช้งาน (แทนการเขียนทับ config.py)
+    - ไฟล์ JSON เขียนแบบ atomic (เขียนไฟล์ชั่วคราว + fsync + rename) ไฟดับกลางทางไฟล์เดิมไม่พัง
+    - ทุกครั้งที่บันทึก revision จะเพิ่มขึ้น 1
+    - แก้ไขหลายค่าพร้อมกันด้วย transaction() แล้วค่อยบันทึกครั้งเดียว
+    - subscribe(callback) เพื่อรับแจ้งเมื่อค่าเปลี่ยน: callback(changes) โดย changes = {key: (old, new)}
+    """
+
+    def __init__(self, path: str, defaults: dict):
+        self.path = path
+        self._lock = threading.RLock()
+        self._subscribers = []
+        self._data = self._load(defaults)
+
+    # ---------- Persistence ----------
+    def _load(self, defaults):
+        data = {"schema": SCHEMA_VERSION, "revision": 0, "patients": {}}
+        data.update(copy.deepcopy(defaults))
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data.update(json.load(f))
+        except FileNotFoundError:
+            print(f"📦 สร้างไฟล์สถานะใหม่ {self.path} จากค่าใน config.py")
+            self._write(data)
+        except (OSError, ValueError) as e:
+            print(f"❌ อ่าน {self.path} ไม่ได้ ใช้ค่าเริ่มต้นแทน: {e}")
+        return data
+
+    def _write(self, data):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    # ---------- Core API ----------
+    def get(self, key, default=None):
+        with self._lock:
+            return copy.deepcopy(self._data.get(key, default))
+
+    def snapshot(self):
+        with self._lock:
+            return copy.deepcopy(self._data)
+
+    @property
+    def revision(self):
+        with self._lock:
+            return self._data["revision"]
+
+    @contextmanager
+    def transaction(self):
+        """
+        with store.transaction() as state:
+            state["eat_days"] += 1
+        ถ้าเกิด Exception ในบล็อก จะไม่บันทึกอะไรเลย
+        """
+        with self._lock:
+            before = copy.deepcopy(self._data)
+            working = copy.deepcopy(self._data)
+            yield working
+            changes = {
+                k: (before.get(k), working.get(k))
+                for k in set(before) | set(working)
+                if k != "revision" and before.get(k) != working.get(k)
+            }
+            if not changes:
+                return
+            working["revision"] = before["revision"] + 1
+            self._write(working)
+            self._data = working
+        self._notify(changes)
+
+    def set(self, **values):
+        with self.transaction() as state:
+            state.update(values)
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback)
+
+    def _notify(self, changes):
+        for callback in list(self._subscribers):
+            try:
+                callback(changes)
+            except Exception as e:
+                print(f"❌ State subscriber error: {e}")
+
+    # ---------- Typed Accessors ----------
+    @property
+    def eat_days(self) -> int:
+        return int(self.get("eat_days", 0))
+
+    def increment_eat_days(self) -> int:
+        with self.transaction() as state:
+            days = int(state.get("eat_days", 0)) + 1
+            state["eat_days"] = days
+            patient = state["patients"].get(state["known_name"])
+            if patient is not None:
+                patient["eat_days"] = days
+                patient["last_dose"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        return days
+
+    @property
+    def doses_taken(self) -> list:
+        """รหัสรอบยาที่ทานแล้ว ("YYYY-MM-DD HH:MM") ใช้ให้ DoseScheduler ไม่เตือนซ้ำหลังเปิดเครื่องใหม่"""
+        return list(self.get("doses_taken", []))
+
+    def mark_dose_taken(self, slot_id: str, keep: int = 60):
+        with self.transaction() as state:
+            taken = [s for s in state.get("doses_taken", []) if s != slot_id]
+            state["doses_taken"] = sorted(taken + [slot_id])[-keep:]
+
+    @property
+    def sheet_name(self) -> str:
+        return str(self.get("sheet_name"))
+
+    @property
+    def known_name(self) -> str:
+        return str(self.get("known_name"))
+
+    @property
+    def known_image_path(self) -> str:
+        return str(self.get("known_image_path"))
+
+    def patient(self, name) -> dict | None:
+        return self.get("patients", {}).get(name)
+
+    def register_patient(self, sheet_name: str, known_name: str, image_path: str, references: int = 0):
+        """
+        ลงทะเบียน/สลับเป็นผู้ป่วยคนใหม่ (เริ่มนับวันใหม่จาก 0)
+        references: จำนวน Encoding อ้างอิงที่หน้าลงทะเบียนเขียนลง Gallery ไว้แล้ว (0 = ใช้รูป image_path)
+        """
+        registered_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        with self.transaction() as state:
+            state["sheet_name"] = sheet_name
+            state["known_name"] = known_name
+            state["known_image_path"] = image_path
+            state["eat_days"] = 0
+            # เปลี่ยนทุกครั้งที่ถ่ายรูปใหม่ แม้จะเป็นผู้ป่วยคนเดิม (ให้ผู้ติดตามโหลดใบหน้าใหม่)
+            state["registered_at"] = registered_at
+            state["patients"][known_name] = {
+                "sheet_name": sheet_name,
+                "image_path": image_path,
+                "registered_at": registered_at,
+                "references": references,
+                "eat_days": 0,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_state_store() -> StateStore:
+    """คืน StateStore ตัวเดียวที่ใช้ร่วมกันทั้งโปรแกรม (ค่าเริ่มต้นมาจาก config.py)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = StateStore(config.STATE_FILE, {
+                "eat_days": config.EAT_DAYS,
+                "sheet_name": config.SHEET_NAME,
+                "known_name": config.KNOWN_NAME,
+                "known_image_path": config.KNOWN_IMAGE_PATH,
+            })
+        return _store
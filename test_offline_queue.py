@@ -0,0 +1,50 @@
+"""
+ทดสอบการกู้คืน Journal ของ OfflineLogQueue ตอนเครื่องดับกลางการเขียน
+
+    python -m pytest -q test_offline_queue.py
+"""
+import json
+
+from offline_queue import OfflineLogQueue
+
+
+def write_lines(path, count):
+    with open(path, "wb") as f:
+        for i in range(count):
+            f.write(json.dumps({"data": {"Name": f"log{i}"}}).encode() + b"\n")
+
+
+def test_torn_line_longer_than_4kb_keeps_complete_lines(tmp_path):
+    path = str(tmp_path / "offline_logs.jsonl")
+    write_lines(path, 5)
+    with open(path, "ab") as f:
+        f.write(b'{"data": {"Note": "' + b"x" * 100_000)   # บรรทัดที่เขียนไม่จบ ยาวกว่าก้อนที่อ่านย้อนหลัง
+
+    queue = OfflineLogQueue(path, fsync_policy="never")
+
+    assert len(queue) == 5
+    assert [p["data"]["Name"] for _, p in queue.pending()] == [f"log{i}" for i in range(5)]
+
+
+def test_torn_file_without_newline_is_emptied(tmp_path):
+    path = str(tmp_path / "offline_logs.jsonl")
+    with open(path, "wb") as f:
+        f.write(b'{"data": ' + b"x" * 5000)
+
+    queue = OfflineLogQueue(path, fsync_policy="never")
+
+    assert len(queue) == 0
+    assert queue._size() == 0
+
+
+def test_complete_journal_is_untouched(tmp_path):
+    path = str(tmp_path / "offline_logs.jsonl")
+    write_lines(path, 3)
+    with open(path, "rb") as f:
+        before = f.read()
+
+    queue = OfflineLogQueue(path, fsync_policy="never")
+
+    assert len(queue) == 3
+    with open(path, "rb") as f:
+        assert f.read() == before
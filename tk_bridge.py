@@ -0,0 +1,58 @@
+import queue
+
+
+class TkBridge:
+    """
+    ส่งงานจากเธรดอื่น (Worker / asyncio) กลับมาทำบนเธรดหลักของ Tk
+    - post(fn, *args): เรียกได้จากทุกเธรด
+    - watch(future, callback): (เธรด Tk) เรียก callback(future) บนเธรด Tk เมื่อ Future เสร็จ
+    ตัวดึงงาน (_pump) ทำงานเฉพาะตอนมี Future ที่รออยู่เท่านั้น ตอนว่างไม่มีตัวจับเวลาค้าง
+    post() ที่เกิดตอนไม่มีใครรอ จะถูกทำตอน watch() ครั้งถัดไป / flush()
+    """
+
+    def __init__(self, root, interval_ms: int = 50):
+        self.root = root
+        self.interval_ms = interval_ms
+        self._calls = queue.SimpleQueue()
+        self._watched = []
+        self._pump_id = None
+
+    def post(self, fn, *args):
+        self._calls.put((fn, args))
+
+    def watch(self, future, callback):
+        self._watched.append((future, callback))
+        if self._pump_id is None:
+            self._pump_id = self.root.after(self.interval_ms, self._pump)
+
+    def flush(self):
+        while True:
+            try:
+                fn, args = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"❌ Tk callback error: {e}")
+
+    def _pump(self):
+        self._pump_id = None
+        self.flush()
+        watched, self._watched = self._watched, []
+        for future, callback in watched:
+            if not future.done():
+                self._watched.append((future, callback))
+                continue
+            try:
+                callback(future)  # อาจ watch() เพิ่ม -> ต่อท้าย self._watched
+            except Exception as e:
+                print(f"❌ Tk callback error: {e}")
+        self.flush()
+        if self._watched and self._pump_id is None:
+            self._pump_id = self.root.after(self.interval_ms, self._pump)
+
+    def cancel(self):
+        if self._pump_id is not None:
+            self.root.after_cancel(self._pump_id)
+            self._pump_id = None
@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+
+from frame_buffers import blend_band
+
+# ธีมสีของหน้าจอ OpenCV (BGR)
+THEMES = {
+    "tuberbox": {
+        "header": (30, 30, 30),
+        "header_alpha": 0.8,
+        "dim_alpha": 0.7,
+        "text": (255, 255, 255),
+        "accent": (161, 214, 162),     # Sage Green
+        "alert": (150, 150, 255),
+        "track": (100, 100, 100),
+        "countdown": (0, 255, 255),
+        "ok": (100, 200, 100),
+        "delete": (100, 100, 200),
+        "placeholder": (200, 200, 200),
+        "ink": (0, 0, 0),
+    },
+}
+
+
+class Tint:
+    """ระบายสีทึบแสงทับแถบแนวนอน frame[y1:y2] (in-place)"""
+
+    def __init__(self, y1, y2, color, alpha):
+        self.y1, self.y2 = y1, y2
+        self.color = color
+        self.alpha = alpha
+
+    def draw(self, frame):
+        blend_band(frame, self.y1, self.y2, self.color, self.alpha)
+
+
+class Sprite:
+    """
+    ภาพที่วาดไว้ล่วงหน้าบนพื้นดำ + Alpha (ความทึบของแต่ละพิกเซล) วางที่ตำแหน่ง (x, y)
+    - พิกเซลทึบ 100%: คัดลอกตรงๆ
+    - พิกเซลขอบตัวอักษร (Anti-alias): ผสมแบบ premultiplied  out = frame * (1 - a) + image
+    """
+
+    def __init__(self, image, alpha, x, y):
+        self.image = image
+        self.opaque = (alpha == 255).astype(np.uint8)
+        self.x, self.y = x, y
+        self.edge_ys, self.edge_xs = np.nonzero((alpha > 0) & (alpha < 255))
+        self.edge_keep = (1.0 - alpha[self.edge_ys, self.edge_xs] / 255.0)[:, None].astype(np.float32)
+        self.edge_color = image[self.edge_ys, self.edge_xs].astype(np.float32)
+
+    def draw(self, frame):
+        h, w = self.image.shape[:2]
+        roi = frame[self.y:self.y + h, self.x:self.x + w]
+        cv2.copyTo(self.image, self.opaque, roi)   # เขียนลง roi ตรงๆ (เร็วกว่า np.copyto(where=) มาก)
+        if len(self.edge_ys):
+            px = roi[self.edge_ys, self.edge_xs]
+            roi[self.edge_ys, self.edge_xs] = (px * self.edge_keep + self.edge_color + 0.5).astype(np.uint8)
+
+
+class Layer:
+    """กลุ่มของ Tint / Sprite ที่วาดตามลำดับ"""
+
+    def __init__(self, *parts):
+        self.parts = [p for p in parts if p is not None]
+
+    def draw(self, frame):
+        for part in self.parts:
+            part.draw(frame)
+
+
+def render_sprite(width, height, draw):
+    """
+    วาดของนิ่ง (ข้อความ / กล่อง / ปุ่ม) ครั้งเดียว
+    draw(img, color) ถูกเรียก 2 รอบ: รอบแรกบนภาพสี (พื้นดำ), รอบสองบน Alpha (color() คืน 255)
+    ตัดเก็บเฉพาะกรอบที่มีพิกเซลจริง คืน None ถ้าไม่มีอะไรถูกวาด
+    """
+    image = np.zeros((height, width, 3), np.uint8)
+    draw(image, lambda bgr: bgr)
+    alpha = np.zeros((height, width), np.uint8)
+    draw(alpha, lambda bgr: 255)
+
+    ys, xs = np.nonzero(alpha)
+    if len(ys) == 0:
+        return None
+    y1, y2, x1, x2 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+    return Sprite(image[y1:y2, x1:x2].copy(), alpha[y1:y2, x1:x2], int(x1), int(y1))
+
+
+class OverlayCache:
+    """
+    เก็บ Layer ของนิ่งที่สร้างแล้ว แยกตาม (ชื่อ, ความละเอียด)
+    สร้างใหม่เมื่อเปลี่ยนความละเอียด หรือเปลี่ยนธีม (set_theme ล้างแคชทั้งหมด)
+    """
+
+    def __init__(self, theme: str = "tuberbox"):
+        self.theme_name = theme
+        self.theme = THEMES[theme]
+        self._layers = {}
+
+    def set_theme(self, theme: str):
+        if theme != self.theme_name:
+            self.theme_name = theme
+            self.theme = THEMES[theme]
+            self._layers.clear()
+
+    def layer(self, name, size, builder):
+        """size = (width, height); builder(width, height, theme) -> Layer"""
+        key = (name, size)
+        layer = self._layers.get(key)
+        if layer is None:
+            layer = self._layers[key] = builder(size[0], size[1], self.theme)
+        return layer
+
+    def draw(self, frame, name, builder):
+        h, w = frame.shape[:2]
+        self.layer(name, (w, h), builder).draw(frame)
@@ -0,0 +1,198 @@
+"""
+Local stand-in ของ Google Apps Script Web App (GoogleAppScript/patient.gs) สำหรับทดสอบในเครื่อง
+
+    python webapp_stub.py [--port 8099] [--no-batch] [--no-sync] [--fail-rate 0.0] [--delay 0.0]
+
+แล้วตั้ง config.WEBAPP_URL = "http://127.0.0.1:8099/exec"
+- รองรับ payload แบบแถวเดียว {"sheet", "data"} และแบบ Batch {"rows": [...]}
+- รองรับ Delta Sync {"sync": {"device", "entries"}} พร้อม High-water mark ต่อเครื่อง (เหมือน handleSync)
+- --no-batch จำลองเซิร์ฟเวอร์รุ่นเก่าที่ยังไม่รองรับ Batch (และ Sync)
+- --no-sync จำลองเซิร์ฟเวอร์ที่รองรับ Batch แต่ยังไม่รองรับ Sync
+- --fail-rate จำลองเน็ตหลุด (ตอบ 503 ตามสัดส่วนที่กำหนด)
+- ชีตเก็บแถวว่างคั่นกลางได้ (seed) แล้วเติมจากบนลงล่างเหมือน appendRows
+- --delay หน่วงการตอบหลังเขียนแถวแล้ว (จำลอง Client Timeout ทั้งที่เซิร์ฟเวอร์เขียนไปแล้ว)
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SheetStore:
+    """เก็บแถวของแต่ละชีตไว้ในหน่วยความจำ"""
+
+    def __init__(self):
+        self.sheets = {}
+        self.requests = 0
+        self.rows_written = 0
+        self.hwm = {}   # device -> seq ล่าสุดที่เขียนแล้ว (แทน Script Properties)
+        self._lock = threading.Lock()
+
+    def seed(self, sheet, rows):
+        """ใส่แถวเริ่มต้น (แถวที่ไม่มี "Date" = แถวว่างที่มีข้อมูลผู้ป่วยรออยู่ทางขวา)"""
+        with self._lock:
+            self.sheets.setdefault(sheet, []).extend(dict(row) for row in rows)
+
+    def append_rows(self, sheet, rows, times=None):
+        """เหมือน appendRows: เติมแถวที่ "Date" ว่างจากบนลงล่างก่อน (เก็บข้อมูลเดิมในแถวนั้น) ที่เหลือต่อท้าย"""
+        now = time.localtime()
+        with self._lock:
+            table = self.sheets.setdefault(sheet, [])
+            targets = [i for i, row in enumerate(table) if not row.get("Date")][:len(rows)]
+            while len(targets) < len(rows):
+                table.append({})
+                targets.append(len(table) - 1)
+            for i, (index, data) in enumerate(zip(targets, rows)):
+                at = times[i] if times and times[i] else None
+                row = table[index]
+                row.update(data)
+                row["Date"] = at[:10] if at else time.strftime("%Y-%m-%d", now)
+                row["Time"] = at[11:] if at else time.strftime("%H:%M:%S", now)
+            self.rows_written += len(rows)
+            return [index + 2 for index in targets]  # แถวที่ 1 คือหัวตาราง
+
+    def rows(self, sheet):
+        with self._lock:
+            return [dict(row) for row in self.sheets.get(sheet, []) if row.get("Date")]
+
+
+class WebAppStub:
+    def __init__(self, host="127.0.0.1", port=0, batch=True, sync=True, fail_rate=0.0, delay=0.0):
+        self.store = SheetStore()
+        self.batch = batch
+        self.sync = sync and batch
+        self.fail_rate = fail_rate
+        self.delay = delay
+        self._sync_lock = threading.Lock()   # แทน LockService
+        self.missing_sheets = set()          # จำลองชีตที่ยังไม่ได้สร้าง
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/exec"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle_sync(self, sync):
+        device = sync["device"]
+        with self._sync_lock:
+            hwm = max(self.store.hwm.get(device, 0), int(sync.get("base") or 0))
+            self.store.hwm[device] = hwm
+            next_seq = hwm
+            runs = []  # ช่วงของแถวติดกันในชีตเดียวกัน ตามลำดับ seq
+            blocked = None
+            for entry in sorted(sync.get("entries", []), key=lambda e: e["seq"]):
+                if entry["seq"] <= next_seq:
+                    continue  # เขียนไปแล้ว (ส่งซ้ำ)
+                if entry["seq"] != next_seq + 1:
+                    break     # ลำดับขาดช่วง
+                sheet = entry.get("sheet") or "Sheet1"
+                if not entry.get("data") or sheet in self.missing_sheets:
+                    message = f"Sheet not found: {sheet}" if entry.get("data") else "No 'data' field"
+                    blocked = {"seq": entry["seq"], "message": message}
+                    break
+                if not runs or runs[-1]["sheet"] != sheet:
+                    runs.append({"sheet": sheet, "rows": [], "times": []})
+                runs[-1]["rows"].append(entry["data"])
+                runs[-1]["times"].append(entry.get("at"))
+                runs[-1]["last"] = next_seq = entry["seq"]
+            results = []
+            for run in runs:
+                results.append({"sheet": run["sheet"], "rows": self.store.append_rows(run["sheet"], run["rows"], run["times"])})
+                self.store.hwm[device] = run["last"]  # บันทึกหลังแต่ละช่วง เหมือน handleSync
+            saved = self.store.hwm.get(device, 0)
+        result = {"status": "ok", "sync": True, "device": device, "hwm": saved, "written": saved - hwm, "results": results}
+        if blocked:
+            result["blocked"] = blocked
+        return result
+
+    def handle_payload(self, payload):
+        if "sync" in payload and self.sync:
+            return self.handle_sync(payload["sync"])
+
+        if "rows" in payload:
+            if not self.batch:
+                # เหมือน patient.gs รุ่นเก่า: ไม่มี field "data"
+                return {"status": "error", "message": "No 'data' field in JSON payload"}
+            by_sheet = {}
+            for row in payload["rows"]:
+                by_sheet.setdefault(row.get("sheet", "Sheet1"), []).append(row["data"])
+            results = [
+                {"sheet": sheet, "rows": self.store.append_rows(sheet, rows)}
+                for sheet, rows in by_sheet.items()
+            ]
+            return {"status": "ok", "batch": True, "count": len(payload["rows"]), "results": results}
+
+        if not payload.get("data"):
+            return {"status": "error", "message": "No 'data' field in JSON payload"}
+        sheet = payload.get("sheet", "Sheet1")
+        row = self.store.append_rows(sheet, [payload["data"]])[0]
+        return {"status": "ok", "sheet": sheet, "row": row}
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                stub.store.requests += 1
+                if stub.fail_rate and random.random() < stub.fail_rate:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                    result = stub.handle_payload(payload)
+                except Exception as e:
+                    result = {"status": "error", "message": str(e)}
+                if stub.delay:
+                    time.sleep(stub.delay)
+                body = json.dumps(result, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Client หมดเวลารอไปก่อน (--delay) แถวถูกเขียนไปแล้ว
+
+            def log_message(self, fmt, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--no-batch", action="store_true")
+    parser.add_argument("--no-sync", action="store_true")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = WebAppStub(port=args.port, batch=not args.no_batch, sync=not args.no_sync, fail_rate=args.fail_rate, delay=args.delay)
+    print(f"🧪 Web App stand-in พร้อมที่ {stub.url} (batch={'on' if stub.batch else 'off'}, sync={'on' if stub.sync else 'off'})")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for sheet, rows in stub.store.sheets.items():
+            print(f"📄 {sheet}: {len(rows)} แถว")
+
+
+if __name__ == "__main__":
+    main()